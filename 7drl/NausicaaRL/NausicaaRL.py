@@ -18,7 +18,7 @@ class NausicaaRL(GameManager):
     root = tree.getroot()
     
     Display.init(root.find("display"))
-    Input.init(root.find("keyconfig"))
+    Input.init(Display, root.find("keyconfig"))
     
     InitGUI()
     
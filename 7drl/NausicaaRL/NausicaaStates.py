@@ -50,7 +50,7 @@ class TitleScreenState(GameState):
       
   def prepareWorld(self):
     """Creates a world"""
-    village = Village()
+    village = StreamingVillage()
     village.generateWorld()
     self._nextState = ExploringState(village)
   
@@ -96,33 +96,33 @@ class ExploringState(GameState):
     
     # dt = -1 # TODO implement this!
     
-    if Events.MOVE_UP in gameEvent.events:
+    if Events.MOVE_UP in gameEvent:
       self.heroMove( 0, -1)
-    elif Events.MOVE_UP_LEFT in gameEvent.events:
+    elif Events.MOVE_UP_LEFT in gameEvent:
       self.heroMove(-1, -1)
-    elif Events.MOVE_UP_RIGHT in gameEvent.events:
+    elif Events.MOVE_UP_RIGHT in gameEvent:
       self.heroMove( 1, -1)
-    elif Events.MOVE_LEFT in gameEvent.events:
+    elif Events.MOVE_LEFT in gameEvent:
       self.heroMove(-1,  0)
-    elif Events.MOVE_RIGHT in gameEvent.events:
+    elif Events.MOVE_RIGHT in gameEvent:
       self.heroMove( 1,  0)
-    elif Events.MOVE_DOWN in gameEvent.events:
+    elif Events.MOVE_DOWN in gameEvent:
       self.heroMove( 0,  1)
-    elif Events.MOVE_DOWN_LEFT in gameEvent.events:
+    elif Events.MOVE_DOWN_LEFT in gameEvent:
       self.heroMove(-1,  1)
-    elif Events.MOVE_DOWN_RIGHT in gameEvent.events:
+    elif Events.MOVE_DOWN_RIGHT in gameEvent:
       self.heroMove( 1,  1)
-    elif Events.PICKUP in gameEvent.events:
+    elif Events.PICKUP in gameEvent:
       self.addPickupMenu()
-    elif Events.DROP in gameEvent.events:
+    elif Events.DROP in gameEvent:
       self.addDropMenu()
-    elif Events.OPEN in gameEvent.events:
+    elif Events.OPEN in gameEvent:
       self.openAction(True)
-    elif Events.CLOSE in gameEvent.events:
+    elif Events.CLOSE in gameEvent:
       self.openAction(False)
-    elif Events.EQUIPMENT in gameEvent.events:
+    elif Events.EQUIPMENT in gameEvent:
       self.equipmentScreen()
-    elif Events.EXIT in gameEvent.events:
+    elif Events.EXIT in gameEvent:
       self.quitMenu()
   
   ############
@@ -136,6 +136,7 @@ class ExploringState(GameState):
   def heroMove(self, dx, dy):
     """Moves the hero and advances the world by the required amount."""
     dt = self._world.hero.step(dx, dy)
+    self._world.heroMoved()
     self._world.run(dt)
   
   def heroPickup(self, menu, items):
@@ -147,7 +148,7 @@ class ExploringState(GameState):
   def addPickupMenu(self):
     """Responds to pick up action. Creates a menu with items and waits for that
     input and sets its callback."""
-    items = self._world.hero.parent.getPickableItems()
+    items = self._world.hero.parent.contents.withCapability("pickable")
     menu = ListSelector(Display.MapW, 0,
                         Display.RIGHT_MENU_SIZE, 200,
                         "Pick up which items?",
@@ -185,11 +186,13 @@ class ExploringState(GameState):
     """The hero heroically opens something."""
     if len(items) > 0:
       self._world.hero.open(items[0])
+      self._world.contentsChanged(items[0].parent, items[0])
   
   def heroClose(self, items):
     """The hero heroically closes something."""
     if len(items) > 0:
       self._world.hero.close(items[0])
+      self._world.contentsChanged(items[0].parent, items[0])
   
   def openAction(self, isOpen):
     """First, requests a direction in which to open/close things. Should then
@@ -215,11 +218,11 @@ class ExploringState(GameState):
     openTile = self._world.getTile(heroX + direction[0], heroY + direction[1])
     
     if isOpen:
-      items = openTile.getOpenableItems()
+      items = openTile.contents.withCapability("openable")
       text = "Open what?"
       function = self.heroOpen
     else:
-      items = openTile.getClosableItems()
+      items = openTile.contents.withCapability("closable")
       text = "Close what?"
       function = self.heroClose
     
@@ -284,6 +287,7 @@ class ExploringState(GameState):
     if len(isQuit) == 0:
       isQuit.append(False)
     if isQuit[0]:
+      self._world.close()
       self.done = True
       self._nextState = TitleScreenState()
 
@@ -293,11 +297,17 @@ class ExploringState(GameState):
     
     
   def update(self, dt):
-    """Meant to update the world according to real-time. Here used for world."""
+    """Meant to update the world according to real-time. Here used for world.
+    Only tiles registered as active are updated; the rest of the map is
+    static. A tile whose update returns False has gone idle and is dropped."""
     # print(dt) # fps counter ish
-    for row in self._world.smap:
-      for tile in row:
-        tile.update(dt)
+    # Runs the ProcessManager.
+    GameState.update(self, dt)
+    self._world.streamAround(self._world.hero)
+    # Iterate over a copy, since updates may (de)activate tiles.
+    for tile in tuple(self._world.activeTiles):
+      if tile.update(dt) == False:
+        self._world.deactivate(tile)
     
     
     
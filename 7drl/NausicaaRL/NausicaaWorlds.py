@@ -1,10 +1,29 @@
+import tempfile
+
+import numpy
+
 from nEngine.model.World import World
 from nEngine.Rand import Rand
+from nEngine.Activation import Timeline
 from nEngine.EntityManager import EntityManager
+from nEngine.RLEngine.TileMap import TileMap
+from nEngine.RLEngine.FreeSpace import FreeSpace
+from nEngine.RLEngine.Chunks import ChunkedGenerator
+from nEngine.RLEngine.Streaming import StreamingMap, entityState, restoreEntityState
+from nEngine.RLEngine.FOV import FieldOfView
+from nEngine.RLEngine.Pathfinding import Pathfinder
+from nEngine.RLEngine.Contents import TileContents, blueprintName, blocksSight
+from NausicaaRL.VillageChunks import TERRAINS, generateChunk
 
 class Village(World):
   """Represents the hero's village!"""
   
+  # Things that need real-time updates.
+  ANIMATED = ["cereal", "windmill"]
+  
+  # How far the hero sees, in tiles.
+  HERO_SIGHT = 12
+  
 
   def generateWorld(self, WORLD_WIDTH = -1, WORLD_HEIGHT = -1):
     if WORLD_WIDTH == -1:
@@ -32,38 +51,254 @@ class Village(World):
     self.placeWindmill()
     print("Placing equipment")
     self.placeEquipment()
+  
+  def generateChunkedWorld(self, worldSeed, WORLD_WIDTH, WORLD_HEIGHT, chunkSize = 64, processes = None):
+    """Like generateWorld, but for big overworlds: terrain and scattered
+    content (rocks, pebbles, windmills) are generated chunk by chunk from
+    worldSeed, across a pool of processes, and stitched together. The hero, the
+    crop zone and the equipment are then placed once, seeded by worldSeed too,
+    so the same seed always gives the same world."""
+    self.WORLD_WIDTH = WORLD_WIDTH
+    self.WORLD_HEIGHT = WORLD_HEIGHT
+    
+    self.CROP_WIDTH = 10
+    self.CROP_HEIGHT = 5
+    
+    self.initMap()
+    print("Generating chunks")
+    self._chunks = ChunkedGenerator(generateChunk, WORLD_WIDTH, WORLD_HEIGHT, chunkSize, worldSeed)
+    placements = []
+    for result in self._chunks.generate(processes):
+      placements.extend(self.stitchChunk(result))
+    
+    self.freeSpace = FreeSpace(self.smap.passabilityMap())
+    for (_, x, y, w, h) in placements:
+      self.freeSpace.occupy(x, y, w, h)
+    
+    Rand.r.seed(worldSeed)
+    print("Placing hero")
+    self.placeActor()
+    print("Placing crops")
+    self.placeCropZone()
+    print("Placing equipment")
+    self.placeEquipment()
+  
+  def regenerateChunk(self, cx, cy):
+    """Throws away what the generator put in chunk (cx, cy) and generates it
+    again, exactly as it was first generated. Whatever came later, such as the
+    hero, the crops or dropped items, stays where it is."""
+    chunk = self._chunks.getChunk(cx, cy)
+    tiles = self.smap.getTiles()
+    kept = []
+    for x in range(chunk.x, chunk.x + chunk.w):
+      for y in range(chunk.y, chunk.y + chunk.h):
+        tile = tiles.get((x, y))
+        if tile == None:
+          continue
+        for item in list(tile.contents):
+          if item in self._generated:
+            del self._generated[item]
+            tile.removeContent(item)
+            item.parent = None
+            self.removeEntity(item)
+        if len(tile.contents) == 0:
+          self.destroyTile(tile)
+          self.smap.releaseTile(x, y)
+        else:
+          if not [item for item in tile.contents if blueprintName(item) in self.ANIMATED]:
+            self.deactivate(tile)
+          kept.append(tile)
+    # Footprints of what was removed no longer block; what's left blocks
+    # again below.
+    self.smap.clearFlags(chunk.x, chunk.y, chunk.w, chunk.h,
+                         TileMap.BLOCKED | TileMap.OPAQUE | TileMap.CONTENTS)
+    for tile in kept:
+      self.smap.refresh(tile.x, tile.y)
+    
+    self.stitchChunk(self._chunks.regenerate(cx, cy))
+    occupied = TileMap.BLOCKED | TileMap.CONTENTS | TileMap.ACTOR
+    window = (slice(chunk.y, chunk.y + chunk.h), slice(chunk.x, chunk.x + chunk.w))
+    self.freeSpace.reset(chunk.x, chunk.y,
+                         self.smap.passable[window] & (self.smap.flags[window] & occupied == 0))
+  
+  def stitchChunk(self, result):
+    """Copies a generated chunk into the map and builds what it placed.
+    Returns the placements."""
+    (chunk, terrain, placements) = result
+    self.smap.setTerrainIDs(chunk.x, chunk.y, terrain)
+    for (name, x, y, w, h) in placements:
+      self._generated[self.placeContent(name, x, y, w, h)] = True
+    return placements
+  
+  def placeContent(self, name, x, y, w = 1, h = 1):
+    """Builds an entity and puts it in the tile at (x, y). Things bigger than
+    a tile block the rest of their footprint too, and so does their sight if
+    they block it. Returns the entity."""
+    tile = self.getTile(x, y)
+    entity = EntityManager.construct(name, self)
+    tile.addContent(entity)
+    self.smap.refresh(x, y)
+    footprint = TileMap.BLOCKED
+    if blocksSight(entity):
+      footprint = footprint | TileMap.OPAQUE
+    for bx in range(x, x + w):
+      for by in range(y, y + h):
+        if bx != x or by != y:
+          self.smap.setFlag(bx, by, footprint)
+    if name in self.ANIMATED:
+      self.activate(tile)
+    return entity
     
   def initMap(self):
-    """Creates walls in the entire map."""
-    self.smap = []
-    for _ in range(self.WORLD_HEIGHT):
-      l = []
-      for _ in range(self.WORLD_WIDTH):
-        l.append(None)
-      self.smap.append(l)
+    """Creates the (array-backed) map. Tile entities are only built for cells
+    that get contents."""
+    # Tiles that need real-time updates, e.g. for growing crops or windmills.
+    # A dict used as an ordered set.
+    self.activeTiles = {}
+    self.timeline = Timeline()
+    # What chunk generators placed, as opposed to what came later. A dict used
+    # as an ordered set.
+    self._generated = {}
+    self.smap = TileMap(self.WORLD_WIDTH, self.WORLD_HEIGHT, self.createTile)
+    for (name, passable, roughness) in TERRAINS:
+      self.smap.defineTerrain(name, passable, roughness)
+    self.fov = FieldOfView(self.smap)
+    self.paths = Pathfinder(self.smap)
+  
+  def createTile(self, name, x, y):
+    """Builds the tile entity of a cell, the first time it is needed."""
+    tile = EntityManager.construct(name, self)
+    tile.x = x
+    tile.y = y
+    # Indexed, so that passability and menus don't scan the contents.
+    tile.contents = TileContents()
+    return tile
+  
+  def getTile(self, x, y):
+    return self.smap.getTile(x, y)
+  
+  def canPass(self, x, y):
+    """Checks passability straight from the map arrays, without building the
+    tile entity."""
+    return self.smap.canPass(x, y)
+  
+  def contentsChanged(self, tile, entity = None):
+    """To be called when something in the tile changed in a way that may
+    change what can pass or be seen through it, e.g. entity, a gate, was
+    opened."""
+    if entity != None:
+      tile.contents.reindex(entity)
+    self.smap.refresh(tile.x, tile.y)
+  
+  def heroSight(self):
+    """Returns the set of (x, y) cells the hero can see."""
+    (x, y) = self.hero.getPos()
+    return self.fov.compute(x, y, self.HERO_SIGHT)
+  
+  def sightOf(self, actors, radius):
+    """Returns a dict mapping each actor to the set of cells it sees, all
+    computed in one pass, e.g. for monsters."""
+    positions = [actor.getPos() for actor in actors]
+    visible = self.fov.computeMany(positions, radius)
+    return dict([(actor, visible[pos]) for (actor, pos) in zip(actors, positions)])
+  
+  def heroMoved(self):
+    """Moves the ACTOR flag along with the hero, freeing the cell it left for
+    placing things, and points the "hero" Dijkstra map at the new position.
+    The map is only recomputed once someone asks for a step."""
+    (x, y) = self.hero.getPos()
+    (oldX, oldY) = self._heroCell
+    if (x, y) != (oldX, oldY):
+      self.smap.setFlag(oldX, oldY, TileMap.ACTOR, False)
+      self.smap.setFlag(x, y, TileMap.ACTOR)
+      self._heroCell = (x, y)
+      free = self.freeSpace
+      if free.isFree(x, y):
+        free.occupy(x, y)
+      if 0 <= oldX < free.width and 0 <= oldY < free.height:
+        # Free again, unless something else is in it.
+        occupied = TileMap.BLOCKED | TileMap.CONTENTS | TileMap.ACTOR
+        free.reset(oldX, oldY, numpy.array([[self.smap.canPass(oldX, oldY) and
+                                             not self.smap.hasFlag(oldX, oldY, occupied)]]))
+    self.paths.setGoals("hero", [(x, y)])
+  
+  def stepToward(self, actor, goal):
+    """Returns the (dx, dy) step that takes actor closer to goal, the name of
+    a Dijkstra map such as "hero" or "crops"."""
+    (x, y) = actor.getPos()
+    return self.paths.step(goal, x, y)
+  
+  def run(self, dt):
+    """Advances game time by dt, e.g. what the hero's action took, running
+    whatever falls due on the way. Only due activations are looked at."""
+    self.timeline.run(dt)
+  
+  def schedule(self, delay, function, args = []):
+    """Schedules function to be called delay game time units from now. If it
+    returns a number, e.g. an actor's next action cost, it is called again
+    that much later. Returns the Activation, for timeline.cancel."""
+    return self.timeline.schedule(delay, function, args)
+  
+  def activate(self, tile):
+    """Registers a tile as needing real-time updates."""
+    self.activeTiles[tile] = True
+  
+  def deactivate(self, tile):
+    """The tile has gone idle and does not need updating anymore."""
+    self.activeTiles.pop(tile, None)
+  
+  def destroyTile(self, tile):
+    """Removes a tile and everything in it from the world for good, e.g. when
+    its part of the map goes away. With a pool set, they get reused."""
+    self.deactivate(tile)
+    for item in list(tile.contents):
+      tile.removeContent(item)
+      item.parent = None
+      self.removeEntity(item)
+    self.removeEntity(tile)
+  
+  def streamAround(self, actor):
+    """Makes sure the map around actor is loaded. This village is always
+    fully loaded."""
+    pass
   
   def generateMap(self):
     """Creates the village map."""
     
     # First initialise everything to grass.
-    for i in range(self.WORLD_WIDTH):
-      for j in range(self.WORLD_HEIGHT):
-        self.createTile("grass", i, j)
+    self.smap.fill("grass")
+    
+    # Everything placed from now on takes its spot from here.
+    self.freeSpace = FreeSpace(self.smap.passabilityMap())
+  
+  def findSpot(self, what, w = 1, h = 1):
+    """Picks a random free spot for a w by h thing and reserves it. Returns the
+    top-left (x, y), or None if the map has no room left."""
+    spot = self.freeSpace.sample(Rand.r, w, h)
+    if spot == None:
+      print("[ERROR] No room left to place " + what + ".")
+      return None
+    (x, y) = spot
+    self.freeSpace.occupy(x, y, w, h)
+    return spot
   
   def placeCropZone(self):
-    # Creates the crop zone.
-    self.generateCropZone(self.CROP_WIDTH, self.CROP_HEIGHT,
-                          Rand.r.randint(0, self.WORLD_WIDTH-self.CROP_WIDTH-2),
-                          Rand.r.randint(0, self.WORLD_HEIGHT-self.CROP_HEIGHT-2))
+    # Creates the crop zone, fences included.
+    spot = self.findSpot("the crop zone", self.CROP_WIDTH + 2, self.CROP_HEIGHT + 2)
+    if spot == None:
+      return
+    (x, y) = spot
+    self.generateCropZone(self.CROP_WIDTH, self.CROP_HEIGHT, x, y)
+    self.paths.setGoals("crops", [(x + 1 + i, y + 1 + j)
+                                  for i in range(self.CROP_WIDTH)
+                                  for j in range(self.CROP_HEIGHT)])
   
   def generateCropZone(self, w, h, x, y):
     """Creates a crop growing zone with the given size at the given location.
     Returns whether it succeeded or not."""
      
-    for i in [posX + x for posX in range(w+2)]:
-      for j in [posy + y for posy in range(h+2)]:
-        if not self.getTile(i, j).canPass():
-          return False
+    if not self.smap.canPassArea(x, y, w+2, h+2):
+      return False
     
     # All terrain is passable!
     
@@ -71,6 +306,8 @@ class Village(World):
       for j in [posy + y + 1 for posy in range(h)]:
         crop = EntityManager.construct("cereal", self)
         self.getTile(i, j).addContent(crop, True)
+        self.smap.refresh(i, j)
+        self.activate(self.getTile(i, j))
     
     # Create fences
     xts = [(posX + x, y) for posX in range(w+2)]
@@ -81,6 +318,7 @@ class Village(World):
     for row in toFence:
       for (fx, fy) in row:
         self.getTile(fx, fy).addContent(EntityManager.construct("fence", self))
+        self.smap.refresh(fx, fy)
     
     # To choose gate positions, remove corners.
     xts = xts[1:-1]
@@ -94,21 +332,27 @@ class Village(World):
     tile = self.getTile(gateX, gateY)
     tile.removeContent(tile.getEntity("fence"))
     tile.addContent(EntityManager.construct("fence gate", self))
+    self.smap.refresh(gateX, gateY)
     
 
   def placeActor(self):
     """Finds a passable place to put the character at."""
-    while(True):
-      x = Rand.r.randint(0, self.WORLD_WIDTH -1)
-      y = Rand.r.randint(0, self.WORLD_HEIGHT -1)
-      tile = self.getTile(x, y)
-      if(tile.canPass()):
-        break
-    
+    spot = self.findSpot("the hero")
+    if spot == None:
+      # Unlike scenery, the game can't go on without the hero.
+      raise RuntimeError("No free cell left on the map to place the hero.")
+    (x, y) = spot
+
+    tile = self.getTile(x, y)
     actor = EntityManager.construct("nausicaa", self)
     actor.parent = tile
     tile.contents[actor] = True
+    self.smap.setFlag(x, y, TileMap.ACTOR)
+    self.smap.refresh(x, y)
     self.hero = actor
+    # Where the ACTOR flag is, for heroMoved to move it.
+    self._heroCell = (x, y)
+    self.paths.setGoals("hero", [(x, y)])
     
   def placeEquipment(self):
     """Drops some equipment where the actor is."""
@@ -120,46 +364,142 @@ class Village(World):
   
   def placeRocks(self):
     for _ in range(5):
-      while(True):
-        x = Rand.r.randint(0, self.WORLD_WIDTH -1)
-        y = Rand.r.randint(0, self.WORLD_HEIGHT -1)
-        tile = self.getTile(x, y)
-        if(tile.canPass()):
-          break
+      spot = self.findSpot("a rock")
+      if spot == None:
+        return
     
+      (x, y) = spot
+      tile = self.getTile(x, y)
       rock = EntityManager.construct("rock", self)
       rock.parent = tile
       tile.contents[rock] = True
+      self.smap.refresh(x, y)
     
   def placePebbles(self):
     for _ in range(15):
-      while(True):
-        x = Rand.r.randint(0, self.WORLD_WIDTH -1)
-        y = Rand.r.randint(0, self.WORLD_HEIGHT -1)
-        tile = self.getTile(x, y)
-        if(tile.canPass()):
-          break
+      spot = self.findSpot("pebbles")
+      if spot == None:
+        return
     
+      (x, y) = spot
+      tile = self.getTile(x, y)
       rock = EntityManager.construct("pebble", self)
       rock.parent = tile
       tile.contents[rock] = True
       rock = EntityManager.construct("pebble", self)
       rock.parent = tile
       tile.contents[rock] = True
+      self.smap.refresh(x, y)
       
   def placeWindmill(self):
     for _ in range(10):
-      while(True):
-        x = Rand.r.randint(0, self.WORLD_WIDTH -2)
-        y = Rand.r.randint(0, self.WORLD_HEIGHT -2)
-        tile1 = self.getTile(x, y)
-        tile2 = self.getTile(x+1, y)
-        tile3 = self.getTile(x, y+1)
-        tile4 = self.getTile(x+1, y+1)
-        if(tile1.canPass() and tile2.canPass() and tile3.canPass() and tile4.canPass()):
-          break
+      spot = self.findSpot("a windmill", 2, 2)
+      if spot == None:
+        return
     
+      (x, y) = spot
+      tile1 = self.getTile(x, y)
       rock = EntityManager.construct("windmill", self)
       tile1.addContent(rock)
+      self.smap.refresh(x, y)
+      # The windmill stands on all four cells.
+      for (bx, by) in [(x+1, y), (x, y+1), (x+1, y+1)]:
+        self.smap.setFlag(bx, by, TileMap.BLOCKED | TileMap.OPAQUE)
+      self.activate(tile1)
       #break
-    
\ No newline at end of file
+
+
+
+class StreamingVillage(Village):
+  """A village with no borders. The map is made of chunks generated around
+  the hero as they explore, and those left far behind are evicted to a cache
+  on disk, so memory use doesn't depend on how big the world gets."""
+  
+  CHUNK_SIZE = 32
+  # Chunks generated or loaded per frame at most, besides the hero's own.
+  STREAM_BUDGET = 1
+  
+  def generateWorld(self, worldSeed = None, cacheDir = None):
+    """Only generates the chunk the hero starts in, so the game can start
+    straight away; the rest streams in while playing."""
+    if worldSeed == None:
+      worldSeed = Rand.r.randrange(2**32)
+    # A cache made up for this game is deleted along with it.
+    self._ownsCache = cacheDir == None
+    if cacheDir == None:
+      cacheDir = tempfile.mkdtemp(prefix = "nausicaa")
+    
+    self.CROP_WIDTH = 10
+    self.CROP_HEIGHT = 5
+    
+    self.activeTiles = {}
+    self.timeline = Timeline()
+    self.smap = StreamingMap(self.CHUNK_SIZE, worldSeed, generateChunk, TERRAINS,
+                             self.createTile, self, cacheDir)
+    self.fov = FieldOfView(self.smap)
+    # Pathfinding starts out over the first chunk alone, and takes in its
+    # neighbours once they have streamed in.
+    self._pathChunk = None
+    self.paths = Pathfinder(self.smap, *self.pathRegion(0, 0, 0))
+    
+    # The starting chunk is at the origin, so its local coordinates are also
+    # world coordinates.
+    (_, startMap) = self.smap.getChunkMap(0, 0)
+    self.freeSpace = FreeSpace(startMap.passabilityMap())
+    
+    Rand.r.seed(worldSeed)
+    print("Placing hero")
+    self.placeActor()
+    print("Placing crops")
+    self.placeCropZone()
+    print("Placing equipment")
+    self.placeEquipment()
+  
+  def pathRegion(self, cx, cy, radius = 1):
+    """The region pathfinding covers when the hero is in chunk (cx, cy): that
+    chunk and those within radius of it."""
+    size = (2 * radius + 1) * self.CHUNK_SIZE
+    return ((cx - radius) * self.CHUNK_SIZE, (cy - radius) * self.CHUNK_SIZE, size, size)
+  
+  def streamAround(self, actor):
+    (x, y) = actor.getPos()
+    self.smap.streamAround(x, y, self.STREAM_BUDGET)
+    (cx, cy) = self.smap.chunkOf(x, y)
+    if actor == self.hero and (cx, cy) != self._pathChunk:
+      # The Dijkstra maps follow the hero, once the chunks around it are in,
+      # so that moving them doesn't hold up a frame generating chunks.
+      for ny in range(cy - 1, cy + 2):
+        for nx in range(cx - 1, cx + 2):
+          if not self.smap.isLoaded(nx, ny):
+            return
+      self._pathChunk = (cx, cy)
+      self.paths.setRegion(*self.pathRegion(cx, cy))
+  
+  # StreamingMap listener
+  
+  def populateChunk(self, chunk, placements):
+    for (name, x, y, w, h) in placements:
+      self.placeContent(name, x, y, w, h)
+  
+  def saveTile(self, tile):
+    """Saves what is in the tile as it is now, e.g. how far crops have grown,
+    not just what it was made from."""
+    return [(blueprintName(item), entityState(item)) for item in tile.contents]
+  
+  def loadTile(self, x, y, data):
+    tile = self.getTile(x, y)
+    for (name, state) in data:
+      item = EntityManager.construct(name, self)
+      restoreEntityState(item, state)
+      tile.addContent(item)
+      if name in self.ANIMATED:
+        self.activate(tile)
+    self.smap.refresh(x, y)
+  
+  def unloadTile(self, tile):
+    self.destroyTile(tile)
+  
+  def close(self):
+    """Done with this village: unloads the map, and deletes its cache if it
+    was made up for this game."""
+    self.smap.close(self._ownsCache)
@@ -0,0 +1,78 @@
+"""Generation of a single Village chunk. Kept apart from NausicaaWorlds so that
+worker processes only import what they need. Chunks are generated as plain
+data (terrain ids and what to put where), which Village then stitches into its
+map and turns into entities."""
+import os
+import xml.etree.ElementTree as ElementTree
+from random import Random
+
+import numpy
+
+from nEngine.RLEngine.FreeSpace import FreeSpace
+
+# The tile blueprints, which terrain types are read from.
+ENTITIES_FILE = os.path.join(os.path.dirname(__file__), "data", "entities.xml")
+
+# Terrain types, in id order.
+TERRAIN_NAMES = ["grass", "dirt road", "wall"]
+
+
+def loadTerrains(file, names):
+  """Returns (name, passable, roughness) for each of the named tile blueprints,
+  in order, so that path costs come from the tiles themselves. What a tile
+  leaves out comes from the tiles' <default>. Read straight from the XML, as
+  worker processes have no entity manager."""
+  tilesRoot = ElementTree.parse(file).getroot().find("tiles")
+  defaults = dict([(prop.tag, prop.text) for prop in tilesRoot.find("default")])
+  tiles = {}
+  for entityRoot in tilesRoot.findall("entity"):
+    values = dict(defaults)
+    for prop in entityRoot:
+      values[prop.tag] = prop.text
+    tiles[values["name"]] = values
+  terrains = []
+  for name in names:
+    values = tiles[name]
+    terrains.append((name, values["passable"].strip() == "True",
+                     float(values.get("roughness", 1.0))))
+  return terrains
+
+# Terrain types, in id order: (name, passable, roughness).
+TERRAINS = loadTerrains(ENTITIES_FILE, TERRAIN_NAMES)
+
+GRASS = 0
+
+# What gets scattered, as the village map always had it: (name, how many
+# spots per SCATTER_AREA cells, w, h, how many go on each spot). Chunks get
+# their share by area, so big and small chunks are as dense.
+SCATTER_AREA = 32 * 32
+SCATTER = [("rock", 5, 1, 1, 1),
+           ("pebble", 15, 1, 1, 2),
+           ("windmill", 10, 2, 2, 1)]
+
+
+def generateChunk(chunk):
+  """Returns (chunk, terrain, placements): terrain is an array of terrain ids
+  indexed [y, x] within the chunk, and placements a list of
+  (name, x, y, w, h) in map coordinates."""
+  r = Random(chunk.seed)
+  terrain = numpy.full((chunk.h, chunk.w), GRASS, numpy.uint8)
+  
+  passable = numpy.array([passable for (_, passable, _) in TERRAINS])[terrain]
+  freeSpace = FreeSpace(passable)
+  placements = []
+  for (name, spots, w, h, perSpot) in SCATTER:
+    share = spots * chunk.w * chunk.h / float(SCATTER_AREA)
+    # The fraction left over is placed or not at random, so it averages out.
+    count = int(share)
+    if r.random() < share - count:
+      count = count + 1
+    for _ in range(count):
+      spot = freeSpace.sample(r, w, h)
+      if spot == None:
+        break
+      (x, y) = spot
+      freeSpace.occupy(x, y, w, h)
+      placements.extend([(name, chunk.x + x, chunk.y + y, w, h)] * perSpot)
+  
+  return (chunk, terrain, placements)
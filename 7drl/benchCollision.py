@@ -0,0 +1,71 @@
+"""Times a BulletCollisionSystem tick for growing numbers of entities, half
+units and half bullets, spread over a battlefield of constant density. Units
+walk at random through a MovementSystem, a frame's worth before the hash update
+is timed, so some of them actually change cell, as in a game. Bullets stand
+still, so only the units the MovementSystem moved are rehashed."""
+from math import sqrt
+from random import Random
+from time import time
+
+from nEngine.Entities import Entity, World
+from nEngine.common.Components import PositionComponent, VelocityComponent, HPComponent
+from nEngine.common.Systems import MovementSystem
+from planet5521.Components import DamageComponent, BulletCollisionComponent
+from planet5521.Systems import TargetSystem, BulletCollisionSystem
+
+
+def spawn(world, r, side, components):
+  entity = Entity(world)
+  position = PositionComponent(entity)
+  position.x = r.uniform(0, side)
+  position.y = r.uniform(0, side)
+  entity.addComponents([position] + [component(entity) for component in components])
+  return entity
+
+def setUp(count, r):
+  world = World()
+  movement = MovementSystem(world)
+  world.addSystem(movement)
+  targets = TargetSystem(world)
+  targets.watch(movement)
+  world.addSystem(targets)
+  world.addSystem(BulletCollisionSystem(world))
+  # Roughly one unit per 32x32 pixels, whatever the count.
+  side = sqrt(count / 2) * 32
+  for _ in range(count // 2):
+    unit = spawn(world, r, side, [VelocityComponent, HPComponent])
+    unit.getComponent(HPComponent).HP = 10
+    # Up to 120 px/s in each direction.
+    velocity = unit.getComponent(VelocityComponent)
+    velocity.vx = r.uniform(-120, 120)
+    velocity.vy = r.uniform(-120, 120)
+  for _ in range(count // 2):
+    bullet = spawn(world, r, side, [DamageComponent, BulletCollisionComponent])
+    bullet.getComponent(DamageComponent).damage = 5
+  return world
+
+def bench(count, r):
+  """Returns the time to update the hash after the units moved, how many of
+  them changed cell, the time to find the hits, and to run a whole collision
+  tick (which finds the hits again and applies the damage)."""
+  world = setUp(count, r)
+  targets = world.getSystem(TargetSystem)
+  bullets = world.getSystem(BulletCollisionSystem)
+  world.getSystem(MovementSystem).tick(1.0 / 60)
+  startTime = time()
+  targets.tick(0)
+  update = time() - startTime
+  startTime = time()
+  hits = bullets.findHits()
+  query = time() - startTime
+  startTime = time()
+  bullets.tick(0)
+  tick = time() - startTime
+  return (update, targets.moved, query, tick, len(hits))
+
+r = Random(5521)
+print("entities  update(ms)  moved  query(ms)  tick(ms)  us/entity  hits")
+for count in [100, 1000, 5000, 10000, 50000]:
+  (update, moved, query, tick, hits) = bench(count, r)
+  print("%8d  %10.2f  %5d  %9.2f  %8.2f  %9.2f  %4d" % (count, update * 1000, moved,
+        query * 1000, tick * 1000, (update + tick) * 1e6 / count, hits))
@@ -0,0 +1,74 @@
+"""Measures EventManager throughput in events per second, against a copy of the
+dispatch loop it used to have (a clock read and a dict lookup per event, and
+plain attribute-bag events)."""
+import sys
+from collections import deque
+from time import time, perf_counter
+
+from nEngine.Events import EventManager
+from nEngine.RLEngine.Events import EntityMovedEvent
+
+
+class OldEntityMovedEvent:
+  def __init__(self, entity, origin, destination):
+    self.type = EntityMovedEvent.type
+    self.entity = entity
+    self.origin = origin
+    self.destination = destination
+
+class OldEventManager:
+  def __init__(self):
+    self._callbacks = {}
+    self._eventQueue = deque()
+  
+  def registerListener(self, eventType, callback):
+    if not eventType in self._callbacks:
+      self._callbacks[eventType] = []
+    self._callbacks[eventType].append(callback)
+  
+  def queueEvent(self, event):
+    self._eventQueue.append(event)
+  
+  def handleEvent(self, event):
+    callbacks  = self._callbacks[event.type]
+    for callback in callbacks:
+      callback(event)
+  
+  def handleEvents(self, maxTime = sys.maxsize):
+    startTime = time()
+    while len(self._eventQueue) > 0 and time() - startTime < maxTime:
+      event = self._eventQueue.popleft()
+      self.handleEvent(event)
+
+
+def bench(em, eventClass, n):
+  """Returns (events/s to create and queue, events/s to handle)."""
+  startTime = perf_counter()
+  for i in range(n):
+    em.queueEvent(eventClass(i, (0, 0), (0, 1)))
+  queued = perf_counter() - startTime
+  startTime = perf_counter()
+  em.handleEvents()
+  handled = perf_counter() - startTime
+  return (n / queued, n / handled)
+
+def listener(event):
+  pass
+
+def batchListener(events):
+  pass
+
+N = 200000
+old = OldEventManager()
+old.registerListener(EntityMovedEvent.type, listener)
+new = EventManager()
+new.registerListener(EntityMovedEvent.type, listener)
+batch = EventManager()
+batch.registerBatchListener(EntityMovedEvent.type, batchListener)
+
+print("%-22s %14s %14s" % ("", "queue (ev/s)", "handle (ev/s)"))
+for name, em, eventClass in [("before", old, OldEntityMovedEvent),
+                             ("after", new, EntityMovedEvent),
+                             ("after, batch listener", batch, EntityMovedEvent)]:
+  (queued, handled) = bench(em, eventClass, N)
+  print("%-22s %14.0f %14.0f" % (name, queued, handled))
@@ -1,3 +1,6 @@
+import heapq
+
+
 class Activation:
   """Represents something that should be activated at some point."""
   
@@ -13,10 +16,13 @@ class Activation:
     self.time = time
     self.function = function
     self.args = args
+    self.cancelled = False
+    # Whether it is waiting in a Timeline.
+    self.pending = False
     
   def activate(self):
-    """Calls the function."""
-    self.function(*self.args)
+    """Calls the function, returning whatever it returns."""
+    return self.function(*self.args)
     
   def __eq__(self, other):
     if other == None:
@@ -29,4 +35,99 @@ class Activation:
     elif self.time > other.time:
       return False
     # They are equal
-    return self.id < other.id
\ No newline at end of file
+    return self.id < other.id
+    
+class Timeline:
+  """Schedules Activations in a binary heap, so that advancing time only costs
+  the activations that are actually due, however many are waiting.
+  
+  Actors can schedule their turn and return the time their action took (their
+  energy cost, if you like) from the activated function: the same activation
+  is then rescheduled that much later. Returning None ends it."""
+  
+  def __init__(self, now = 0):
+    self.now = now
+    self._heap = []
+    self._cancelled = 0
+  
+  def __len__(self):
+    """Number of live activations."""
+    return len(self._heap) - self._cancelled
+  
+  def schedule(self, delay, function, args = []):
+    """Schedules function to be called delay time units from now. Returns the
+    Activation, which can be used to cancel or reschedule it."""
+    activation = Activation(self.now + delay, function, args)
+    self._push(activation)
+    return activation
+  
+  def _push(self, activation):
+    activation.pending = True
+    heapq.heappush(self._heap, activation)
+  
+  def _pop(self):
+    activation = heapq.heappop(self._heap)
+    activation.pending = False
+    return activation
+  
+  def cancel(self, activation):
+    """Cancels an activation. It stays in the heap and is skipped when it comes
+    up; the heap is only rebuilt once most of it is cancelled."""
+    if activation.cancelled:
+      return
+    activation.cancelled = True
+    if not activation.pending:
+      return
+    self._cancelled = self._cancelled + 1
+    if self._cancelled > 32 and self._cancelled * 2 > len(self._heap):
+      self._heap = [a for a in self._heap if not a.cancelled]
+      heapq.heapify(self._heap)
+      self._cancelled = 0
+  
+  def reschedule(self, activation, delay):
+    """Moves an activation to delay time units from now. Returns the new
+    Activation that replaces it."""
+    self.cancel(activation)
+    return self.schedule(delay, activation.function, activation.args)
+  
+  def peek(self):
+    """Returns the next live activation without running it, or None."""
+    heap = self._heap
+    while len(heap) > 0 and heap[0].cancelled:
+      self._pop()
+      self._cancelled = self._cancelled - 1
+    if len(heap) == 0:
+      return None
+    return heap[0]
+  
+  def _activate(self, activation):
+    """Runs an activation that was just popped, rescheduling it if asked."""
+    self.now = activation.time
+    delay = activation.activate()
+    if delay != None and not activation.cancelled:
+      activation.time = self.now + delay
+      self._push(activation)
+  
+  def next(self):
+    """Advances time to the next due activation and runs it. Returns it, or
+    None if nothing is scheduled."""
+    activation = self.peek()
+    if activation == None:
+      return None
+    self._pop()
+    self._activate(activation)
+    return activation
+  
+  def runUntil(self, time):
+    """Runs, in order, every activation due up to and including time, then
+    leaves the clock at time."""
+    activation = self.peek()
+    while activation != None and activation.time <= time:
+      self._pop()
+      self._activate(activation)
+      activation = self.peek()
+    self.now = max(self.now, time)
+  
+  def run(self, dt):
+    """Advances time by dt, running whatever falls due on the way."""
+    self.runUntil(self.now + dt)
@@ -0,0 +1,143 @@
+"""Structure-of-arrays storage for component data. Systems that need to crunch
+the same few numbers for thousands of entities keep them in NumPy arrays, one
+array per attribute, instead of chasing them through each component."""
+import numpy
+
+
+class Column:
+  """Declares a numeric component attribute that can be kept in a ColumnStore.
+  While no store holds the component, the value lives on the instance like any
+  other attribute. Once a store adopts the component, reads and writes go
+  straight to the store's array."""
+  
+  # Maps component class to the list of its Columns.
+  _cache = {}
+  
+  def __init__(self, default = 0.0):
+    self.default = default
+  
+  def __set_name__(self, owner, name):
+    self.name = name
+    self._attr = "_" + name
+  
+  def __get__(self, component, owner = None):
+    if component == None:
+      return self
+    if component._store == None:
+      return component.__dict__.get(self._attr)
+    return float(component._store.columns[self.name][component._row])
+  
+  def __set__(self, component, value):
+    if component._store == None:
+      component.__dict__[self._attr] = value
+    else:
+      if value == None:
+        value = self.default
+      component._store.columns[self.name][component._row] = value
+  
+  def getLocal(self, component):
+    """Returns the value stored on the instance, or the default."""
+    value = component.__dict__.get(self._attr)
+    if value == None:
+      return self.default
+    return value
+  
+  @staticmethod
+  def of(componentClass):
+    """Returns the list of Columns declared by a component class, including
+    those inherited."""
+    columns = Column._cache.get(componentClass)
+    if columns == None:
+      columns = []
+      for klass in reversed(componentClass.__mro__):
+        for value in vars(klass).values():
+          if isinstance(value, Column):
+            columns.append(value)
+      Column._cache[componentClass] = columns
+    return columns
+
+
+class ColumnStore:
+  """One NumPy array per column, one row per entity. Rows are kept packed, so
+  columns[name][:size] is the data for every entity held. Removing an entity
+  moves the last row into the hole."""
+  
+  def __init__(self, columns, scratch = (), capacity = 64):
+    """Columns is a list of Column descriptors. Scratch is a list of names for
+    extra arrays systems can use as temporaries, to avoid allocating."""
+    self._defaults = {}
+    for column in columns:
+      self._defaults[column.name] = column.default
+    for name in scratch:
+      self._defaults[name] = 0.0
+  
+    self.size = 0
+    self.capacity = capacity
+    self.columns = {}
+    for name in self._defaults:
+      self.columns[name] = numpy.zeros(capacity)
+  
+    self.entities = []
+    self._components = [] # Per row, the components bound to it.
+    self._rows = {} # Maps entity to row.
+  
+  def __len__(self):
+    return self.size
+  
+  def view(self, name):
+    """Returns the used part of a column. Views are invalidated when the store
+    grows, so get them again every tick."""
+    return self.columns[name][:self.size]
+  
+  def _grow(self):
+    """Doubles the capacity of every column."""
+    self.capacity = self.capacity * 2
+    for name, array in self.columns.items():
+      grown = numpy.zeros(self.capacity)
+      grown[:self.size] = array[:self.size]
+      self.columns[name] = grown
+  
+  def add(self, entity, components):
+    """Appends a row for the entity, copying the column values out of the given
+    components and binding them to the store."""
+    if self.size == self.capacity:
+      self._grow()
+    row = self.size
+    self.size = self.size + 1
+  
+    for name, default in self._defaults.items():
+      self.columns[name][row] = default
+    for component in components:
+      for column in Column.of(type(component)):
+        self.columns[column.name][row] = column.getLocal(component)
+      component._store = self
+      component._row = row
+  
+    self.entities.append(entity)
+    self._components.append(components)
+    self._rows[entity] = row
+  
+  def remove(self, entity):
+    """Removes the entity's row, copying the values back into its components
+    so they keep working without the store."""
+    row = self._rows.pop(entity)
+    for component in self._components[row]:
+      for column in Column.of(type(component)):
+        component.__dict__[column._attr] = float(self.columns[column.name][row])
+      component._store = None
+      component._row = None
+  
+    last = self.size - 1
+    if row != last:
+      for array in self.columns.values():
+        array[row] = array[last]
+      moved = self.entities[last]
+      self.entities[row] = moved
+      self._components[row] = self._components[last]
+      for component in self._components[row]:
+        component._row = row
+      self._rows[moved] = row
+  
+    self.entities.pop()
+    self._components.pop()
+    self.size = last
@@ -29,18 +29,118 @@ class EntityFactory:
   def readFromXML(self, XMLRoot):
     for entityRoot in XMLRoot:
       entityName = entityRoot.attrib["name"]
-      self._map[entityName] = entityRoot
+      self._map[entityName] = Blueprint(entityName, entityRoot, self._componentBuilder)
       
   def produce(self, world, entityName):
-    entity = Entity(world)
-    entityRoot = self._map[entityName]
-    for componentRoot in entityRoot:
-      component = self._componentBuilder[componentRoot.tag](entity)
-      entity.addComponent(component)
-    for component in entity._components.values():
+    """Creates an entity from the named blueprint and returns it. If the world
+    has a pool with a spare entity of that blueprint, it is reused instead."""
+    blueprint = self._map[entityName]
+    pooled = None
+    if world.pool != None:
+      pooled = world.pool.acquire(blueprint)
+    
+    components = []
+    if pooled == None:
+      entity = Entity(world)
+      entity.blueprint = blueprint
+      for componentClass, values in blueprint.components:
+        component = componentClass(entity)
+        component.init(values)
+        components.append(component)
+    else:
+      (entity, spares) = pooled
+      world.addEntity(entity)
+      for componentClass, values in blueprint.components:
+        component = spares.get(componentClass)
+        if component == None:
+          component = componentClass(entity)
+          component.init(values)
+        else:
+          component.reset(values)
+        components.append(component)
+    
+    entity.addComponents(components)
+    for component in components:
       component.postInit()
+    return entity
+  
+  def produceMany(self, world, entityName, n):
+    """Creates n entities from the named blueprint, e.g. for a wave of enemies,
+    and returns them in a list."""
+    produce = self.produce
+    return [produce(world, entityName) for _ in range(n)]
       
       
+class Blueprint:
+  """Compiled form of an <entity> node. The XML is only walked once, when the
+  file is read: each component's class is looked up and its properties are
+  converted up front, so producing an entity just copies them."""
+  
+  def __init__(self, name, entityRoot, componentBuilder):
+    self.name = name
+    # List of (component class, compiled values) in XML order.
+    self.components = []
+    for componentRoot in entityRoot:
+      componentClass = componentBuilder[componentRoot.tag]
+      self.components.append((componentClass, componentClass.compile(componentRoot)))
+
+
+
+class EntityPool:
+  """Keeps entities removed from a world, sorted by blueprint, so that
+  EntityFactory.produce can bring them back instead of allocating new ones.
+  Reused entities keep their id but get a new generation, so handles taken
+  before they died no longer resolve."""
+  
+  def __init__(self, maxFree = None):
+    """maxFree limits how many spare entities are kept per blueprint."""
+    self.maxFree = maxFree
+    self._free = {} # Maps blueprint to a list of (entity, components dict).
+    self.hits = 0
+    self.misses = 0
+    self.released = 0
+  
+  def release(self, entity, components):
+    """Takes in a removed entity and its components, mapped by class."""
+    free = self._free.get(entity.blueprint)
+    if free == None:
+      free = []
+      self._free[entity.blueprint] = free
+    if self.maxFree != None and len(free) >= self.maxFree:
+      return
+    free.append((entity, components))
+    self.released = self.released + 1
+  
+  def acquire(self, blueprint):
+    """Returns a spare (entity, components dict) for the blueprint, or None if
+    there isn't one."""
+    free = self._free.get(blueprint)
+    if not free:
+      self.misses = self.misses + 1
+      return None
+    self.hits = self.hits + 1
+    (entity, components) = free.pop()
+    entity.generation = entity.generation + 1
+    entity.parent = None
+    entity.children = []
+    return (entity, components)
+  
+  def hitRate(self):
+    """Fraction of requests that were served from the pool."""
+    requests = self.hits + self.misses
+    if requests == 0:
+      return 0.0
+    return self.hits / requests
+  
+  def getStats(self):
+    """Returns a dict with the pool counters, and how many spare entities there
+    are per blueprint name."""
+    return {"hits": self.hits,
+            "misses": self.misses,
+            "released": self.released,
+            "hitRate": self.hitRate(),
+            "free": {blueprint.name: len(free) for blueprint, free in self._free.items()}}
+
 
 class Entity:
   
@@ -49,28 +149,55 @@ class Entity:
   def __init__(self, world):
     self.id = Entity.IDCounter
     Entity.IDCounter = Entity.IDCounter + 1
+    # Bumped every time a pool reuses this entity (and therefore its id).
+    self.generation = 0
     
     # Public
     self.parent = None
     self.children = []
+    self.blueprint = None
     
-    self._components = {}
+    # Components live in the world's archetype tables. These say where.
+    self._archetype = None
+    self._row = None
     self._world = world
     self._world.addEntity(self)
   
   def addComponent(self, component):
     """Adds component to component map..."""
-    self._components[type(component)] = component
+    self._world.addComponents(self, [component])
+  
+  def addComponents(self, components):
+    """Adds several components in one go, moving the entity between archetypes
+    only once."""
+    self._world.addComponents(self, components)
+  
+  def removeComponent(self, componentClass):
+    """Removes the component of the given class."""
+    self._world.removeComponent(self, componentClass)
   
+  def handle(self):
+    """Returns an (id, generation) pair to refer to this entity. Unlike the
+    entity itself, it stops resolving once the entity is removed or reused."""
+    return (self.id, self.generation)
   
   def run(self, dt):
     """Time has passed. Work!"""
-    for component in self._components:
+    for component in self.getComponents():
       component.run(dt)
   
   def getComponent(self, componentClass):
     """Gets a component based on class."""
-    return self._components[componentClass]
+    return self._archetype.columns[componentClass][self._row]
+  
+  def hasComponent(self, componentClass):
+    """Checks whether the entity has a component of the given class."""
+    return componentClass in self._archetype.columns
+  
+  def getComponents(self):
+    """Returns a list with all of the entity's components."""
+    row = self._row
+    return [column[row] for column in self._archetype.columns.values()]
   
   
 class Component:
@@ -80,69 +207,304 @@ class Component:
   concrete health and ammo pickups is the same. This way you can search for the
   pickup component ID."""
   
+  # Maps component class to the bit representing it in signature masks.
+  _bits = {}
+  
+  # Set by systems that keep this component's Columns in a ColumnStore.
+  _store = None
+  _row = None
+  
+  # What having this component lets an entity do, as tile contents index it,
+  # e.g. ("pickable",).
+  capabilities = ()
+  
   def __init__(self, entity):
     self._entity = entity
   
-  def init(self, XMLRoot=None):
-    """Initialisation is called before populating with XML data. The basic
-    implementation simply dynamically assigns variable names and their values,
+  @classmethod
+  def getBit(cls):
+    """Returns the bit that stands for this component class in signature
+    masks. Bits are handed out the first time a class asks for one."""
+    bit = Component._bits.get(cls)
+    if bit == None:
+      bit = 1 << len(Component._bits)
+      Component._bits[cls] = bit
+    return bit
+  
+  @classmethod
+  def compile(cls, XMLRoot):
+    """Turns the component's XML into whatever init() will be given, once per
+    blueprint. The basic implementation maps each property name to its value,
     converted to the most sane type found. Reimplement as necessary."""
-    if XMLRoot != None:
-      for prop in XMLRoot:
-        setattr(self, prop.tag, Utility.convert(prop.text))
+    values = {}
+    for prop in XMLRoot:
+      values[prop.tag] = Utility.convert(prop.text)
+    return values
+  
+  def init(self, values=None):
+    """Initialisation is called with the values compiled from XML. The basic
+    implementation simply dynamically assigns variable names and their values.
+    Lists are copied so entities don't share them. Reimplement as necessary."""
+    if values != None:
+      for name, value in values.items():
+        if type(value) == list:
+          value = list(value)
+        setattr(self, name, value)
   
   def postInit(self):
     """Called after all of the actor components have been populated."""
     pass
+  
+  def reset(self, values):
+    """Puts a pooled component back the way a fresh one would be, given the
+    same values init() gets. The basic implementation simply runs __init__ and
+    init again on this object. Reimplement if that is not enough."""
+    type(self).__init__(self, self._entity)
+    self.init(values)
+  
+  def onRemove(self):
+    """Called when the entity is removed from the world, pooled or not.
+    Reimplement to let go of what the component holds, e.g. other entities."""
+    pass
 
 
 class System:
-  """Systems work on entities with a specific combination of components."""
+  """Systems work on entities with a specific combination of components.
+  Subclasses list the component classes they need in components, and those
+  that rule an entity out in excluded. The world keeps the entity set up to
+  date as components come and go."""
+  
+  components = ()
+  excluded = ()
+  
   def __init__(self, world):
     self._world = world
-    self._entities = []
+    # Dict used as an ordered set, so removal is O(1).
+    self._entities = {}
+    self.mask = 0
+    for componentClass in self.components:
+      self.mask = self.mask | componentClass.getBit()
+    self.excludedMask = 0
+    for componentClass in self.excluded:
+      self.excludedMask = self.excludedMask | componentClass.getBit()
     
   def addEntity(self, entity):
-    self._entities.append(entity)
+    self._entities[entity] = True
   
   def removeEntity(self, entity):
-    self._entities.remove(entity)
+    del self._entities[entity]
+  
+  def matches(self, mask):
+    """Checks whether a signature mask has all of the components needed, and
+    none of the excluded ones."""
+    return mask & self.mask == self.mask and not mask & self.excludedMask
   
   def applicable(self, entity):
-    """This checks whether this system is applicable to the given entity.
-    Can be anything you want. Implement it!"""
-    print("[ERROR] System.applicable(entity) not implemented.")
-    return False
+    """This checks whether this system is applicable to the given entity."""
+    return self.matches(entity._archetype.mask)
   
   def tick(self, dt):
     """Runs the system, with dt time having passed. Implement it!"""
     print("[ERROR] System.run(dt) not implemented.")
 
   
+class Archetype:
+  """Table holding every entity that has exactly the same set of component
+  classes (its signature). Each component class gets its own column, a plain
+  list, and all of an entity's components sit at the same row in every column.
+  Systems can therefore walk the columns side by side instead of asking each
+  entity for its components."""
+  
+  def __init__(self, signature):
+    self.signature = signature
+    self.entities = []
+    self.columns = {}
+    self.mask = 0
+    for componentClass in signature:
+      self.columns[componentClass] = []
+      self.mask = self.mask | componentClass.getBit()
+    
+    # Systems interested in this archetype, and the systems to leave and join
+    # when moving to another archetype (cached per destination).
+    self.systems = []
+    self._transitions = {}
+  
+  def __len__(self):
+    return len(self.entities)
+  
+  def getColumn(self, componentClass):
+    """Returns the list of components of the given class, one per row."""
+    return self.columns[componentClass]
+  
+  def add(self, entity, components):
+    """Appends the entity to the table. Components maps each component class
+    of the signature to the entity's component."""
+    entity._archetype = self
+    entity._row = len(self.entities)
+    self.entities.append(entity)
+    for componentClass, column in self.columns.items():
+      column.append(components[componentClass])
+  
+  def remove(self, entity):
+    """Removes the entity from the table by moving the last row into its
+    place, so nothing needs to be shifted."""
+    row = entity._row
+    last = self.entities.pop()
+    if last is not entity:
+      self.entities[row] = last
+      last._row = row
+      for column in self.columns.values():
+        column[row] = column.pop()
+    else:
+      for column in self.columns.values():
+        column.pop()
+    entity._archetype = None
+    entity._row = None
+  
+  def getComponents(self, entity):
+    """Returns a dict mapping component class to the entity's component."""
+    row = entity._row
+    return {componentClass: column[row]
+            for componentClass, column in self.columns.items()}
+
+
 class World:
   def __init__(self):
     self._em = EventManager()
-    self._entities = []
-    self._systems = {} # Maps system type to system itself.  
+    self._entities = {} # Maps entity id to entity.
+    self._systems = {} # Maps system type to system itself.
+    self._archetypes = {} # Maps signature (frozenset of classes) to archetype.
+    self._queries = {} # Maps frozenset of classes to list of archetypes.
+    # If set to an EntityPool, removed entities with a blueprint go there.
+    self.pool = None
   
-  def addEntity(self, entity):
-    self._entities.append(entity)
-    for _, system in self._systems.items():
-      if system.check(entity):
+  def _getArchetype(self, signature):
+    """Returns the archetype for the signature, creating it if necessary."""
+    archetype = self._archetypes.get(signature)
+    if archetype == None:
+      archetype = Archetype(signature)
+      archetype.systems = [system for system in self._systems.values()
+                           if system.matches(archetype.mask)]
+      self._archetypes[signature] = archetype
+      # Keep the cached queries up to date, so they never need rebuilding.
+      for required, archetypes in self._queries.items():
+        if required <= signature:
+          archetypes.append(archetype)
+    return archetype
+  
+  def _getTransition(self, origin, destination):
+    """Returns the systems an entity leaves and joins when moving from origin
+    to destination. Only computed once per pair of archetypes."""
+    transition = origin._transitions.get(destination)
+    if transition == None:
+      leaving = [system for system in origin.systems
+                 if not system in destination.systems]
+      joining = [system for system in destination.systems
+                 if not system in origin.systems]
+      transition = (leaving, joining)
+      origin._transitions[destination] = transition
+    return transition
+  
+  def _moveEntity(self, entity, components):
+    """Moves the entity to the archetype matching the given components, and
+    updates the systems whose interest changed."""
+    archetype = self._getArchetype(frozenset(components))
+    origin = entity._archetype
+    if origin == None:
+      archetype.add(entity, components)
+      for system in archetype.systems:
         system.addEntity(entity)
+      return
+    
+    origin.remove(entity)
+    archetype.add(entity, components)
+    (leaving, joining) = self._getTransition(origin, archetype)
+    for system in leaving:
+      system.removeEntity(entity)
+    for system in joining:
+      system.addEntity(entity)
+  
+  def addEntity(self, entity):
+    self._entities[entity.id] = entity
+    self._moveEntity(entity, {})
   
   def removeEntity(self, entity):
-    self._entities.remove(entity)
-    for _, system in self._systems.items():
-      if system.check(entity):
-        system.removeEntity(entity)
+    del self._entities[entity.id]
+    for system in entity._archetype.systems:
+      system.removeEntity(entity)
+    components = entity._archetype.getComponents(entity)
+    for component in components.values():
+      component.onRemove()
+    if self.pool != None and entity.blueprint != None:
+      self.pool.release(entity, components)
+    entity._archetype.remove(entity)
+  
+  def getEntity(self, handle):
+    """Returns the entity for an (id, generation) handle, or None if that
+    entity has since been removed or reused."""
+    (entityID, generation) = handle
+    entity = self._entities.get(entityID)
+    if entity == None or entity.generation != generation:
+      return None
+    return entity
+  
+  def addComponents(self, entity, components):
+    """Adds the components to the entity, moving it to its new archetype."""
+    allComponents = entity._archetype.getComponents(entity)
+    for component in components:
+      allComponents[type(component)] = component
+    self._moveEntity(entity, allComponents)
+  
+  def removeComponent(self, entity, componentClass):
+    """Removes the component of the given class from the entity."""
+    allComponents = entity._archetype.getComponents(entity)
+    del allComponents[componentClass]
+    self._moveEntity(entity, allComponents)
+  
+  def query(self, *componentClasses):
+    """Returns the list of archetypes whose entities have all of the given
+    component classes. The list is cached and kept up to date as archetypes
+    are created, so it can be iterated every tick without allocating:
+    
+      for archetype in world.query(PositionComponent, VelocityComponent):
+        positions = archetype.columns[PositionComponent]
+        velocities = archetype.columns[VelocityComponent]
+        for i in range(len(archetype)):
+          ...
+    """
+    required = frozenset(componentClasses)
+    archetypes = self._queries.get(required)
+    if archetypes == None:
+      archetypes = [archetype for signature, archetype in self._archetypes.items()
+                    if required <= signature]
+      self._queries[required] = archetypes
+    return archetypes
+  
+  def _clearTransitions(self):
+    """Forgets cached transitions, as the set of systems changed."""
+    for archetype in self._archetypes.values():
+      archetype._transitions = {}
   
   def addSystem(self, system):
     self._systems[type(system)] = system
+    for archetype in self._archetypes.values():
+      if system.matches(archetype.mask):
+        archetype.systems.append(system)
+        for entity in archetype.entities:
+          system.addEntity(entity)
+    self._clearTransitions()
+  
+  def getSystem(self, systemClass):
+    """Gets a system based on class."""
+    return self._systems[systemClass]
   
   def removeSystem(self, system):
     del self._systems[type(system)]
+    for archetype in self._archetypes.values():
+      if system in archetype.systems:
+        archetype.systems.remove(system)
+    self._clearTransitions()
   
   def tick(self, dt):
-    for system in self._systems:
+    for system in self._systems.values():
       system.tick(dt)
@@ -1,47 +1,76 @@
 import sys
 from collections import deque
-from time import time
+from time import perf_counter
 
 class Event:
-  """This class represents an event"""
+  """This class represents an event. Subclasses set type, the channel they
+  are dispatched on, and list their attributes in __slots__ to keep them small
+  and quick to build."""
+  
+  __slots__ = ("timestamp",)
   
   # Bogus event type just so we define the variable.
   NO_EVENT = -1
+  type = NO_EVENT
   
-  def __init__(self, timestamp):
-    """Defines a default event type and the event timestamp."""
-    self.type = Event.NO_EVENT
+  def __init__(self, timestamp = None):
+    """Sets the event timestamp."""
     self.timestamp = timestamp
   
   #TODO: will need to serialise, to be sent over the interwebs
   
 class EventManager:
   """Has a global object, but can also be instantiated. Propagates events to
-  registered event listeners."""
+  registered event listeners.
+  
+  Listeners for each type are kept in tuples that are only rebuilt when
+  someone registers or deregisters, so dispatching is a dict lookup and a loop.
+  Batch listeners get, once per handleEvents call, a list with all the events
+  of their type that were handled, instead of one call per event."""
   
   _singleton = 0
   
+  # handleEvents only checks the clock every this many events.
+  checkInterval = 32
+  
   def __init__(self):
     """Sets up all the listener information."""
     self._callbacks = {}
+    self._batchCallbacks = {}
+    self._dispatch = {} # Maps event type to a tuple of callbacks.
+    self._batchDispatch = {} # Same, for batch callbacks.
     self._eventQueue = deque()
     
     
-  def _initialiseEventType(self, eventType):
-    """Internal function to initialise the lists for specific event types."""
-    self._callbacks[eventType] = []
+  def _rebuild(self, eventType):
+    """Internal function to refresh the dispatch tuples of an event type."""
+    self._dispatch[eventType] = tuple(self._callbacks.get(eventType, ()))
+    batchCallbacks = self._batchCallbacks.get(eventType)
+    if batchCallbacks:
+      self._batchDispatch[eventType] = tuple(batchCallbacks)
+    elif eventType in self._batchDispatch:
+      del self._batchDispatch[eventType]
     
   def registerListener(self, eventType, callback):
     """Registers a new listener. Whenever a new event of this type occurs, all
     callbacks from the respective list are called."""
-    if not eventType in self._callbacks:
-      self._initialiseEventType(eventType)
-    
-    self._callbacks[eventType].append(callback)
+    self._callbacks.setdefault(eventType, []).append(callback)
+    self._rebuild(eventType)
     
   def deregisterListener(self, eventType, callback):
     """Does what it says on the box!"""
     self._callbacks[eventType].remove(callback)
+    self._rebuild(eventType)
+  
+  def registerBatchListener(self, eventType, callback):
+    """Registers a listener that is called with a list of all the events of
+    this type handled by handleEvents, rather than with each of them."""
+    self._batchCallbacks.setdefault(eventType, []).append(callback)
+    self._rebuild(eventType)
+  
+  def deregisterBatchListener(self, eventType, callback):
+    self._batchCallbacks[eventType].remove(callback)
+    self._rebuild(eventType)
     
   def queueEvent(self, event):
     """Queues an event to be handled later, in order."""
@@ -54,17 +83,43 @@ class EventManager:
   def handleEvent(self, event):
     """Processes all callbacks related to this event. This will be instant!
     Normally, queueEvent should be called, and EventManager.handleEvents will
-    eventually take care of it."""
-    callbacks  = self._callbacks[event.type]
-    for callback in callbacks:
+    eventually take care of it. Events nobody listens to are ignored."""
+    for callback in self._dispatch.get(event.type, ()):
       callback(event)
+    for callback in self._batchDispatch.get(event.type, ()):
+      callback([event])
   
   def handleEvents(self, maxTime = sys.maxsize):
-    """Processes the event queue, until maxTime is reached."""
-    startTime = time()
-    while len(self._eventQueue) > 0 and time() - startTime < maxTime:
-      event = self._eventQueue.popleft()
-      self.handleEvent(event)
+    """Processes the event queue, until maxTime is reached. The clock is only
+    checked every checkInterval events, so it may run a little over."""
+    queue = self._eventQueue
+    dispatch = self._dispatch
+    batchDispatch = self._batchDispatch
+    batches = {}
+    
+    deadline = perf_counter() + maxTime
+    count = 0
+    while queue:
+      event = queue.popleft()
+      eventType = event.type
+      for callback in dispatch.get(eventType, ()):
+        callback(event)
+      if eventType in batchDispatch:
+        batch = batches.get(eventType)
+        if batch == None:
+          batch = []
+          batches[eventType] = batch
+        batch.append(event)
+      
+      count = count + 1
+      if count == self.checkInterval:
+        count = 0
+        if perf_counter() >= deadline:
+          break
+    
+    for eventType, events in batches.items():
+      for callback in batchDispatch.get(eventType, ()):
+        callback(events)
       
   @staticmethod
   def getEM():
@@ -1,4 +1,4 @@
-from time import time
+from time import perf_counter, sleep
 from nEngine.Processes import ProcessManager
 from nEngine.Events import EventManager
 
@@ -29,7 +29,21 @@ class GameManager:
 
 class GameState:
   """This class contains a generic game state. States switch between each other
-  on occasion."""
+  on occasion.
+  
+  The main loop runs the simulation in fixed steps of timestep seconds, however
+  fast frames come, and draws at most renderRate frames per second, sleeping in
+  between when it is ahead. States can change these to suit themselves."""
+  
+  # Seconds of game time per simulation step.
+  timestep = 1.0 / 60
+  # Frames drawn per second at most. None draws every loop, e.g. to let vsync
+  # pace the window.
+  renderRate = 60
+  # Real time accounted for in one loop at most. If the game falls further
+  # behind than this (a hitch, a breakpoint...), the extra time is dropped rather
+  # than simulated, so it can't spiral into ever longer catch-ups.
+  maxFrameTime = 0.25
   
   def __init__(self):
     self._nextState = None
@@ -49,15 +63,49 @@ class GameState:
     """By default returns no next state."""
     return self._nextState
   
+  def update(self, dt):
+    """Advances the simulation by one step of dt seconds. By default runs the
+    ProcessManager."""
+    self._pm.run(dt)
+  
+  def render(self, alpha):
+    """Draws a frame. alpha, between 0 and 1, is how far real time has gone
+    from the last simulation step towards the next, for interpolating between
+    them. Reimplement."""
+    pass
+  
   def run(self):
     """Execute this state's main loop."""
     self.done = False
+    self.alpha = 0.0
     
-    oldTime = time()
+    accumulator = 0.0
+    oldTime = perf_counter()
+    nextRender = oldTime
     while not self.done:
-      currentTime = time()
-      self._pm.run(currentTime - oldTime)
-      oldTime = time()
+      currentTime = perf_counter()
+      accumulator = accumulator + min(currentTime - oldTime, self.maxFrameTime)
+      oldTime = currentTime
+      
+      while accumulator >= self.timestep and not self.done:
+        self.update(self.timestep)
+        accumulator = accumulator - self.timestep
+      self.alpha = accumulator / self.timestep
+      
+      if self.renderRate == None:
+        self.render(self.alpha)
+        continue
+      if currentTime >= nextRender:
+        self.render(self.alpha)
+        # Don't try to make up for missed frames, just draw the next on time.
+        nextRender = nextRender + 1.0 / self.renderRate
+        if nextRender < currentTime:
+          nextRender = currentTime + 1.0 / self.renderRate
+      
+      # Ahead of both the simulation and the frame rate: give the core back.
+      wait = min(self.timestep - accumulator, nextRender - currentTime)
+      if wait > 0.001:
+        sleep(wait)
       
       
     
@@ -1,15 +1,26 @@
-from sfml.window import Keyboard, Mouse, KeyEvent, MouseEvent, MouseWheelEvent, MouseButtonEvent, MouseMoveEvent
+from sfml.window import Keyboard, Mouse, KeyEvent, MouseEvent, MouseWheelEvent, MouseButtonEvent, MouseMoveEvent, ResizeEvent
 
 
 class GameEvent:
   """This class represents all the events that might be fired once a key is
   pressed. It also contains information about whether the event has already
   been consumed or not. It's up to the classes that might use events to decide
-  if the input is consumed or not."""
+  if the input is consumed or not.
+  
+  Besides the list of events, it keeps them as a bitmask, so asking whether
+  it holds an event (Events.OPEN in gameEvent) is a single bit test."""
 
-  def __init__(self, events):
+  def __init__(self, events, mask = None):
     self.events = events
+    if mask == None:
+      mask = 0
+      for event in events:
+        mask = mask | (1 << event)
+    self.mask = mask
     self.consumed = False
+  
+  def __contains__(self, event):
+    return (self.mask >> event) & 1 == 1
 
 class MouseEvent:
   def __init__(self, position):
@@ -22,6 +33,8 @@ class Events:
   @staticmethod
   def init():
     Events.types = {}
+    # Maps type to the bitmask of its events.
+    Events.typeMasks = {}
   
   @staticmethod
   def getTypeList(eventType):
@@ -29,11 +42,24 @@ class Events:
     initialises it."""
     if not eventType in Events.types:
       Events.types[eventType] = []
+      Events.typeMasks[eventType] = 0
     return Events.types[eventType]
+  
+  @staticmethod
+  def addToType(eventType, event):
+    Events.getTypeList(eventType).append(event)
+    Events.typeMasks[eventType] = Events.typeMasks[eventType] | (1 << event)
     
 class Input:
+  """Turns window events into game events for the view.
+  
+  Mouse moves come in bursts, many a frame, and each sends the view through
+  the GUI, so the moves of a frame are sent as one, from where the mouse was
+  to where it ended up. Anything else is sent in the order it came, after the
+  moves before it."""
+  
   @staticmethod
-  def init(view):
+  def init(view, keyconfig = None):
     """Given the root of the keyconfig ElementTree, parses it and configures
     all the keys."""
     
@@ -46,16 +72,30 @@ class Input:
     # Set initial mouse position
     Input.oldMousePosition = (0, 0)
     
+    # Indexed by key code: the bitmask and the list of each key's events,
+    # 0 and None for keys doing nothing.
+    Input.keyMasks = []
+    Input.keyEvents = []
+    
+    # Counters for the last processInput(), for profiling.
+    Input.stats = {"events": 0, "mouseMoves": 0, "mouseMovesSent": 0}
+    
+    if keyconfig != None:
+      Input.loadKeyConfig(keyconfig)
+  
+  @staticmethod
+  def loadKeyConfig(root):
+    """Reads the events of a keyconfig, numbering them in order as Events
+    attributes, and compiles which keys fire them into a table by key
+    code."""
     # Counter will be used to set "enum" values
     counter = 0
     
     # Dictionary to store key-to-event/function
-    Input.KeyToEvent = {}
+    keyToEvent = {}
     
     # For each game function
-    """for child in root:
-      print("Parsing " + child.find("description").text + "...")
-      
+    for child in root:
       # Obtain the variable names in string form
       nameStr = child.find("name").text
       keyStrs = child.find("keys").text.split(",")
@@ -67,27 +107,34 @@ class Input:
       
       # Go through all keys and associate them to this function
       for keyStr in keyStrs:
-        KEY = getattr(Keyboard, keyStr) # Get PyGame key constant
-        if not KEY in Input.KeyToEvent:
-          Input.KeyToEvent[KEY] = []
+        KEY = getattr(Keyboard, keyStr)
+        if not KEY in keyToEvent:
+          keyToEvent[KEY] = []
         
-        Input.KeyToEvent[KEY].append(getattr(Events, nameStr))
+        keyToEvent[KEY].append(getattr(Events, nameStr))
       
       # If this event has a type, add it to the respective list
       typeElem = child.find("type")
       if typeElem != None:
-        eventType = typeElem.text
-        Events.getTypeList(eventType).append(getattr(Events, nameStr))
-      """
-        
+        Events.addToType(typeElem.text, getattr(Events, nameStr))
     
+    size = max([key for key in keyToEvent] + [-1]) + 1
+    Input.keyMasks = [0] * size
+    Input.keyEvents = [None] * size
+    for key, events in keyToEvent.items():
+      if key < 0:
+        continue
+      Input.keyEvents[key] = events
+      Input.keyMasks[key] = GameEvent(events).mask
   
   @staticmethod
   def containsEventOfType(gameEvent, eventType):
     """Checks whether the game event contains any selection event."""
-    typeList = Events.getTypeList(eventType)
+    mask = gameEvent.mask & Events.typeMasks.get(eventType, 0)
+    if mask == 0:
+      return None
     for event in gameEvent.events:
-      if event in typeList:
+      if (mask >> event) & 1:
         return event
     return None
     
@@ -101,18 +148,39 @@ class Input:
   @staticmethod
   def isEvent(key):
     """Checks whether this key generates any events"""
-    return key in Input.KeyToEvent
+    return 0 <= key < len(Input.keyMasks) and Input.keyMasks[key] != 0
   
   @staticmethod
   def generateGameEvent(key):
     """Returns events associated with this key"""
-    return GameEvent(Input.KeyToEvent[key])
+    return GameEvent(Input.keyEvents[key], Input.keyMasks[key])
+  
+  @staticmethod
+  def _sendMouseMove(position):
+    gameEvent = MouseEvent(position)
+    gameEvent.oldPosition = Input.oldMousePosition
+    Input.view.onMouseMoveEvent(gameEvent)
+    Input.oldMousePosition = position
+    Input.stats["mouseMovesSent"] = Input.stats["mouseMovesSent"] + 1
   
   @staticmethod
   def processInput():
     """Processes PyGame input and pushes events onto the input stack"""
     # pygame.event.wait() <--- THIS WILL WAIT FOR AN EVENT! HUZZAH!
+    stats = {"events": 0, "mouseMoves": 0, "mouseMovesSent": 0}
+    Input.stats = stats
+    # Where the mouse has moved to, not yet sent.
+    movedTo = None
     for event in Input.view._window.events:
+      stats["events"] = stats["events"] + 1
+      if event == MouseMoveEvent:
+        stats["mouseMoves"] = stats["mouseMoves"] + 1
+        movedTo = event.position
+        continue
+      if movedTo != None:
+        Input._sendMouseMove(movedTo)
+        movedTo = None
+      
       if event == KeyEvent and Input.isEvent(event.code):
         gameEvent = Input.generateGameEvent(event.code)
         Input.view.onKeyboardEvent(gameEvent)
@@ -130,10 +198,8 @@ class Input:
         gameEvent.pressed = event.pressed
         gameEvent.button = event.button
         Input.view.onMouseButtonEvent(gameEvent)
-      elif event == MouseMoveEvent:
-        gameEvent = MouseEvent(event.position)
-        gameEvent.oldPosition = Input.oldMousePosition
-        Input.view.onMouseMoveEvent(gameEvent)
-        Input.oldMousePosition = event.position
-
-      
\ No newline at end of file
+      elif event == ResizeEvent:
+        Input.view.onResizeEvent(event.size)
+    
+    if movedTo != None:
+      Input._sendMouseMove(movedTo)
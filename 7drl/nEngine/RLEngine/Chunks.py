@@ -0,0 +1,72 @@
+"""Chunked world generation. The map is cut into square chunks, each generated
+on its own from a seed derived from the world seed and the chunk's position.
+Chunks don't depend on each other, so they can be generated in parallel, in
+any order, and any one of them can be generated again with the same result."""
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+
+
+def chunkSeed(worldSeed, cx, cy):
+  """Derives the seed of chunk (cx, cy). Stable across runs and processes,
+  unlike hash()."""
+  key = ("%s:%d:%d" % (worldSeed, cx, cy)).encode()
+  return int.from_bytes(hashlib.sha256(key).digest()[:8], "little")
+
+
+class Chunk:
+  """Describes one chunk: its position in chunks (cx, cy), the cells it
+  covers (x, y, w, h), and its seed. This is what generators get."""
+  
+  def __init__(self, cx, cy, x, y, w, h, seed):
+    self.cx = cx
+    self.cy = cy
+    self.x = x
+    self.y = y
+    self.w = w
+    self.h = h
+    self.seed = seed
+
+
+class ChunkedGenerator:
+  """Runs a generator function over every chunk of a width by height map.
+  The function is called with a Chunk and should only use random numbers from
+  a Random(chunk.seed). It runs in other processes, so it must be a module
+  level function and return something picklable, e.g. NumPy arrays and lists."""
+  
+  def __init__(self, function, width, height, chunkSize, worldSeed):
+    self.function = function
+    self.width = width
+    self.height = height
+    self.chunkSize = chunkSize
+    self.worldSeed = worldSeed
+    self.chunksX = (width + chunkSize - 1) // chunkSize
+    self.chunksY = (height + chunkSize - 1) // chunkSize
+  
+  def getChunk(self, cx, cy):
+    """Returns the Chunk at chunk coordinates (cx, cy). Edge chunks are cut to
+    fit the map."""
+    x = cx * self.chunkSize
+    y = cy * self.chunkSize
+    return Chunk(cx, cy, x, y,
+                 min(self.chunkSize, self.width - x),
+                 min(self.chunkSize, self.height - y),
+                 chunkSeed(self.worldSeed, cx, cy))
+  
+  def getChunks(self):
+    """Returns every Chunk, row by row."""
+    return [self.getChunk(cx, cy)
+            for cy in range(self.chunksY) for cx in range(self.chunksX)]
+  
+  def generate(self, processes = None):
+    """Generates every chunk and returns the results, in getChunks() order.
+    processes is the size of the process pool (None for one per core); with 1,
+    chunks are simply generated here, one after the other."""
+    chunks = self.getChunks()
+    if processes == 1 or len(chunks) == 1:
+      return [self.function(chunk) for chunk in chunks]
+    with ProcessPoolExecutor(processes) as pool:
+      return list(pool.map(self.function, chunks, chunksize = 4))
+  
+  def regenerate(self, cx, cy):
+    """Generates a single chunk again. Same seed, same result."""
+    return self.function(self.getChunk(cx, cy))
@@ -1,4 +1,5 @@
 from nEngine.Entities import Component
+from nEngine.RLEngine.Contents import TileContents
 
 # The variables indicated in the  components' __init__() functions indicate
 # what variables are "expected" in the XML
@@ -7,18 +8,44 @@ from nEngine.Entities import Component
 class TileComponent(Component):
   def __init__(self, entity):
     Component.__init__(self, entity)
-    self.contents = []
+    self.contents = TileContents()
     self.roughness = None
   
   def postInit(self):
     pass
-
+  
+  def addContent(self, entity):
+    self.contents.add(entity)
+  
+  def removeContent(self, entity):
+    self.contents.remove(entity)
+  
+  def getEntity(self, name):
+    return self.contents.getEntity(name)
+  
+  def getPickableItems(self):
+    return self.contents.withCapability("pickable")
+  
+  def getOpenableItems(self):
+    return self.contents.withCapability("openable")
+  
+  def getClosableItems(self):
+    return self.contents.withCapability("closable")
+  
+  def canPass(self):
+    return self.contents.passable
+  
     
 class BodyComponent(Component):
   def __init__(self, entity):
     Component.__init__(self, entity)
     self.parts = []
-
+  
+  @classmethod
+  def compile(cls, XMLRoot):
+    """The parts are built from the XML itself, so keep it."""
+    return XMLRoot
+  
   def init(self, XMLRoot):
     """Since this is hierarchical stuff, reimplementation is necessary."""
     partNodes = XMLRoot.findAll("PartComponent")
@@ -30,7 +57,7 @@ class BodyComponent(Component):
   def postInit(self):
     for part in self.parts:
       part.postInit()
-
+  
   def addPart(self, part):
     self.parts.append(part)
 
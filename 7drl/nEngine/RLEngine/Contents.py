@@ -0,0 +1,180 @@
+"""What a tile holds. Tiles get asked about their contents all the time (can
+this be walked into? what can be picked up here? is there a fence?), so the
+contents are indexed by blueprint name and by capability as they come and go,
+instead of being scanned for every question."""
+
+
+def blueprintName(entity):
+  """The name of the blueprint an entity was made from. RLEngine entities
+  keep their blueprint in bp, nEngine ones in blueprint."""
+  blueprint = getattr(entity, "blueprint", None)
+  if blueprint == None:
+    blueprint = getattr(entity, "bp", None)
+  if blueprint == None:
+    return None
+  return blueprint.name
+
+
+def _components(entity):
+  """The components of an nEngine entity, or () for anything else."""
+  if getattr(entity, "_archetype", None) == None:
+    return ()
+  return entity.getComponents()
+
+
+def _flag(entity, name, default = False):
+  """An entity property, such as passable: on the entity itself for RLEngine
+  entities, on whichever component holds it for nEngine ones."""
+  value = getattr(entity, name, None)
+  if value == None:
+    for component in _components(entity):
+      value = getattr(component, name, None)
+      if value != None:
+        break
+  if value == None:
+    return default
+  return bool(value)
+
+
+def blocksSight(entity):
+  """Whether an entity blocks sight. Its opaque property says so; without
+  one, whatever blocks movement blocks sight too, e.g. a closed gate."""
+  return _flag(entity, "opaque", not _flag(entity, "passable", True))
+
+
+class TileContents:
+  """The entities in a tile, in the order they were added. Behaves like the
+  dict of entity to True tiles used to hold, so tile.contents[entity] = True,
+  del tile.contents[entity] and iterating still work.
+  
+  Capabilities are tested once per entity, when it is added. Besides the
+  tests in CAPABILITIES, an nEngine entity has those its component classes
+  list in their capabilities. Something whose capabilities change while it is
+  in the tile, like a gate being opened, must be reindexed."""
+  
+  # Maps capability name to the test telling whether an entity has it.
+  CAPABILITIES = {
+    "pickable": lambda entity: _flag(entity, "pickup"),
+    "blocking": lambda entity: not _flag(entity, "passable", True),
+    "opaque": lambda entity: blocksSight(entity),
+    "openable": lambda entity: _flag(entity, "openable") and not _flag(entity, "isOpen"),
+    "closable": lambda entity: _flag(entity, "openable") and _flag(entity, "isOpen"),
+    }
+  
+  def __init__(self, capabilities = None):
+    if capabilities == None:
+      capabilities = TileContents.CAPABILITIES
+    self._capabilities = capabilities
+    # Maps entity to (name, capabilities it has). Dicts are used as ordered
+    # sets throughout, so removal is O(1).
+    self._entities = {}
+    self._byName = {}
+    self._byCapability = {}
+    for capability in capabilities:
+      self._byCapability[capability] = {}
+  
+  def add(self, entity):
+    if entity in self._entities:
+      return
+    name = blueprintName(entity)
+    capabilities = [capability for capability, test in self._capabilities.items()
+                    if test(entity)]
+    for component in _components(entity):
+      for capability in type(component).capabilities:
+        if capability in self._byCapability and capability not in capabilities:
+          capabilities.append(capability)
+    self._entities[entity] = (name, capabilities)
+    self._byName.setdefault(name, {})[entity] = True
+    for capability in capabilities:
+      self._byCapability[capability][entity] = True
+  
+  def remove(self, entity):
+    (name, capabilities) = self._entities.pop(entity)
+    sameName = self._byName[name]
+    del sameName[entity]
+    if len(sameName) == 0:
+      del self._byName[name]
+    for capability in capabilities:
+      del self._byCapability[capability][entity]
+  
+  def reindex(self, entity):
+    """Tests the entity's capabilities again, after they changed."""
+    self.remove(entity)
+    self.add(entity)
+  
+  # QUERIES
+  
+  def getEntity(self, name):
+    """Returns the first entity made from the named blueprint, or None."""
+    for entity in self._byName.get(name, ()):
+      return entity
+    return None
+  
+  def getEntities(self, name):
+    """Returns the list of entities made from the named blueprint."""
+    return list(self._byName.get(name, ()))
+  
+  def count(self, name):
+    return len(self._byName.get(name, ()))
+  
+  def withCapability(self, capability):
+    """Returns the list of entities having the capability, e.g. "pickable"."""
+    return list(self._byCapability[capability])
+  
+  def has(self, capability):
+    """Whether anything has the capability."""
+    return len(self._byCapability[capability]) > 0
+  
+  @property
+  def passable(self):
+    """Whether nothing in the tile blocks movement."""
+    return len(self._byCapability["blocking"]) == 0
+  
+  @property
+  def opaque(self):
+    """Whether anything in the tile blocks sight."""
+    return len(self._byCapability["opaque"]) > 0
+  
+  # DICT INTERFACE
+  
+  def __setitem__(self, entity, value):
+    self.add(entity)
+  
+  def __delitem__(self, entity):
+    self.remove(entity)
+  
+  def __contains__(self, entity):
+    return entity in self._entities
+  
+  def __iter__(self):
+    return iter(self._entities)
+  
+  def __len__(self):
+    return len(self._entities)
+  
+  def __getitem__(self, entity):
+    if entity not in self._entities:
+      raise KeyError(entity)
+    return True
+  
+  def get(self, entity, default = None):
+    if entity in self._entities:
+      return True
+    return default
+  
+  def pop(self, entity, *default):
+    if entity not in self._entities:
+      if len(default) > 0:
+        return default[0]
+      raise KeyError(entity)
+    self.remove(entity)
+    return True
+  
+  def keys(self):
+    return self._entities.keys()
+  
+  def values(self):
+    return [True] * len(self._entities)
+  
+  def items(self):
+    return [(entity, True) for entity in self._entities]
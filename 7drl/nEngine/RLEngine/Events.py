@@ -1,14 +1,22 @@
 from nEngine.Events import Event
 
 class EntityCreatedEvent(Event):
-  def __init__(self, entity):
+  __slots__ = ("entity",)
+  type = "ENTITY_CREATED"
+  
+  def __init__(self, entity, timestamp = None):
+    Event.__init__(self, timestamp)
     self.entity = entity
   
   def getClass(self):
     return type(self.entity)
 
 class EntityMovedEvent(Event):
-  def __init__(self, entity, origin, destination):
+  __slots__ = ("entity", "origin", "destination")
+  type = "ENTITY_MOVED"
+  
+  def __init__(self, entity, origin, destination, timestamp = None):
+    Event.__init__(self, timestamp)
     self.entity = entity
     self.origin = origin
-    self.destination = destination
\ No newline at end of file
+    self.destination = destination
@@ -0,0 +1,171 @@
+"""Field of view, by recursive shadowcasting. What blocks sight is read from
+the map in one go, as a window of its arrays around the viewer, and results are
+cached until something that blocks sight changes close enough to matter."""
+from collections import OrderedDict
+
+# Transforms from the first octant to each of the eight: (xx, xy, yx, yy).
+_OCTANTS = [(1, 0, 0, 1), (0, 1, 1, 0), (0, -1, 1, 0), (-1, 0, 0, 1),
+            (-1, 0, 0, -1), (0, -1, -1, 0), (0, 1, -1, 0), (1, 0, 0, -1)]
+
+
+def _castLight(opaque, cx, cy, row, start, end, radius, xx, xy, yx, yy, visible):
+  """Scans one octant of opaque (rows of booleans) from (cx, cy), row by row,
+  between slopes start and end. Walls split the scan into narrower ones.
+  Visible cells are added to visible, in window coordinates."""
+  if start < end:
+    return
+  radius2 = radius * radius
+  newStart = 0.0
+  for j in range(row, radius + 1):
+    dx = -j - 1
+    dy = -j
+    blocked = False
+    while dx <= 0:
+      dx = dx + 1
+      leftSlope = (dx - 0.5) / (dy + 0.5)
+      rightSlope = (dx + 0.5) / (dy - 0.5)
+      if start < rightSlope:
+        continue
+      if end > leftSlope:
+        break
+      X = cx + dx * xx + dy * xy
+      Y = cy + dx * yx + dy * yy
+      if dx * dx + dy * dy <= radius2:
+        visible.append((X, Y))
+      if blocked:
+        if opaque[Y][X]:
+          newStart = rightSlope
+        else:
+          blocked = False
+          start = newStart
+      elif opaque[Y][X] and j < radius:
+        blocked = True
+        _castLight(opaque, cx, cy, j + 1, start, leftSlope, radius,
+                   xx, xy, yx, yy, visible)
+        newStart = rightSlope
+    if blocked:
+      break
+
+
+def shadowcast(opaque, cx, cy, radius):
+  """Returns the cells visible from (cx, cy) as a list of (x, y), in the
+  coordinates of opaque. opaque is indexed [y][x] and must cover radius cells
+  around the origin in every direction."""
+  visible = [(cx, cy)]
+  for (xx, xy, yx, yy) in _OCTANTS:
+    _castLight(opaque, cx, cy, 1, 1.0, 0.0, radius, xx, xy, yx, yy, visible)
+  return visible
+
+
+class FieldOfView:
+  """Computes and caches what can be seen from where. The map must provide
+  opacityWindow(x, y, w, h), returning a boolean array of the cells that block
+  sight, and listeners, a list of objects told through
+  cellsChanged(x, y, w, h, sight) when cells change.
+  
+  Results are frozensets of the (x, y) cells visible from an origin, cached per
+  (origin, radius). A change only drops the results it could affect, those
+  whose origin is within radius of it, so a fence gate opening at one end of
+  the map leaves sight at the other end cached."""
+  
+  def __init__(self, smap, maxCached = 256):
+    self._map = smap
+    self.maxCached = maxCached
+    # Maps (x, y, radius) to the visible cells, least recently used first.
+    self._cache = OrderedDict()
+    self.hits = 0
+    self.misses = 0
+    smap.listeners.append(self)
+  
+  def _store(self, key, visible):
+    self._cache[key] = visible
+    while len(self._cache) > self.maxCached:
+      self._cache.popitem(last = False)
+  
+  def _cached(self, key):
+    visible = self._cache.get(key)
+    if visible != None:
+      self._cache.move_to_end(key)
+      self.hits = self.hits + 1
+    else:
+      self.misses = self.misses + 1
+    return visible
+  
+  def _cast(self, opaque, left, top, x, y, radius):
+    """Shadowcasts in a window whose top-left is at map cell (left, top) and
+    returns the visible cells in map coordinates."""
+    cells = shadowcast(opaque, x - left, y - top, radius)
+    return frozenset([(cx + left, cy + top) for (cx, cy) in cells])
+  
+  def compute(self, x, y, radius):
+    """Returns the frozenset of cells visible from (x, y) within radius."""
+    visible = self._cached((x, y, radius))
+    if visible == None:
+      visible = self._computeAlone(x, y, radius)
+    return visible
+  
+  def _computeAlone(self, x, y, radius):
+    size = 2 * radius + 1
+    opaque = self._map.opacityWindow(x - radius, y - radius, size, size).tolist()
+    visible = self._cast(opaque, x - radius, y - radius, x, y, radius)
+    self._store((x, y, radius), visible)
+    return visible
+  
+  def computeMany(self, origins, radius):
+    """Computes the sight of many viewers at once, e.g. every monster on
+    screen. Returns a dict mapping each (x, y) origin to its visible cells.
+  
+    Origins not cached are cast against a single window of the map covering
+    all of them, read once, unless they are spread out so much that separate
+    windows cost less."""
+    result = {}
+    missing = []
+    for (x, y) in origins:
+      visible = self._cached((x, y, radius))
+      if visible != None:
+        result[(x, y)] = visible
+      elif (x, y) not in result:
+        missing.append((x, y))
+        result[(x, y)] = None
+    if len(missing) == 0:
+      return result
+  
+    size = 2 * radius + 1
+    left = min([x for (x, _) in missing]) - radius
+    top = min([y for (_, y) in missing]) - radius
+    w = max([x for (x, _) in missing]) + radius + 1 - left
+    h = max([y for (_, y) in missing]) + radius + 1 - top
+    if w * h > len(missing) * size * size:
+      for (x, y) in missing:
+        result[(x, y)] = self._computeAlone(x, y, radius)
+      return result
+  
+    opaque = self._map.opacityWindow(left, top, w, h).tolist()
+    for (x, y) in missing:
+      visible = self._cast(opaque, left, top, x, y, radius)
+      self._store((x, y, radius), visible)
+      result[(x, y)] = visible
+    return result
+  
+  def isVisible(self, fromX, fromY, toX, toY, radius):
+    """Whether (toX, toY) can be seen from (fromX, fromY)."""
+    if max(abs(toX - fromX), abs(toY - fromY)) > radius:
+      return False
+    return (toX, toY) in self.compute(fromX, fromY, radius)
+  
+  def cellsChanged(self, x, y, w = 1, h = 1, sight = True):
+    """Drops the cached results that the rectangle may be part of, if what
+    blocks sight changed there."""
+    if not sight:
+      return
+    stale = []
+    for key in self._cache:
+      (ox, oy, radius) = key
+      if (x - radius <= ox < x + w + radius and
+          y - radius <= oy < y + h + radius):
+        stale.append(key)
+    for key in stale:
+      del self._cache[key]
+  
+  def clear(self):
+    self._cache.clear()
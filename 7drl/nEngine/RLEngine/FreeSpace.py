@@ -0,0 +1,114 @@
+"""Index of the free space on a map, for placing things during world
+generation. Instead of picking random cells until one happens to be free, the
+generator samples straight from the positions that are known to fit."""
+import numpy
+
+
+class _PositionSet:
+  """Set of flat cell indices supporting O(1) removal and random choice:
+  a list of the members, plus where in the list each cell is."""
+  
+  def __init__(self, members, size):
+    self.members = list(members)
+    self._where = numpy.full(size, -1, numpy.int64)
+    self._where[self.members] = numpy.arange(len(self.members))
+  
+  def __len__(self):
+    return len(self.members)
+  
+  def remove(self, index):
+    where = self._where[index]
+    if where < 0:
+      return
+    last = self.members.pop()
+    if last != index:
+      self.members[where] = last
+      self._where[last] = where
+    self._where[index] = -1
+  
+  def add(self, index):
+    if self._where[index] >= 0:
+      return
+    self._where[index] = len(self.members)
+    self.members.append(index)
+  
+  def choose(self, rand):
+    return self.members[rand.randrange(len(self.members))]
+
+
+class FreeSpace:
+  """Keeps, for every footprint size asked for, the set of top-left positions
+  where a rectangle of that size only covers free cells. A footprint's set is
+  built once from a summed-area table of the free cells, then kept up to date
+  as cells are occupied, so sampling a valid position is O(1) and a full map
+  is reported rather than looped on."""
+  
+  def __init__(self, free):
+    """free is a boolean array, indexed [y, x], of the cells that can hold
+    something."""
+    self.height, self.width = free.shape
+    self._free = free.copy()
+    self._footprints = {} # Maps (w, h) to the _PositionSet of top-lefts.
+  
+  def isFree(self, x, y, w = 1, h = 1):
+    """Whether the whole rectangle is free."""
+    if x < 0 or y < 0 or x + w > self.width or y + h > self.height:
+      return False
+    return bool(self._free[y:y+h, x:x+w].all())
+  
+  def _build(self, w, h):
+    """Finds every top-left where a w by h rectangle fits, using a summed-area
+    table so each candidate costs O(1) however big the footprint."""
+    table = numpy.zeros((self.height + 1, self.width + 1), numpy.int64)
+    table[1:, 1:] = self._free.cumsum(0).cumsum(1)
+    rows = self.height - h + 1
+    cols = self.width - w + 1
+    if rows <= 0 or cols <= 0:
+      return _PositionSet([], self.width * self.height)
+    sums = (table[h:, w:] - table[:rows, w:] - table[h:, :cols] + table[:rows, :cols])
+    ys, xs = numpy.nonzero(sums == w * h)
+    return _PositionSet((ys * self.width + xs).tolist(), self.width * self.height)
+  
+  def _getFootprint(self, w, h):
+    footprint = self._footprints.get((w, h))
+    if footprint == None:
+      footprint = self._build(w, h)
+      self._footprints[(w, h)] = footprint
+    return footprint
+  
+  def count(self, w = 1, h = 1):
+    """Number of positions where a w by h rectangle fits."""
+    return len(self._getFootprint(w, h))
+  
+  def sample(self, rand, w = 1, h = 1):
+    """Returns a random (x, y) top-left where a w by h rectangle only covers
+    free cells, or None if there is no such place. rand is a random.Random,
+    such as Rand.r."""
+    footprint = self._getFootprint(w, h)
+    if len(footprint) == 0:
+      return None
+    index = footprint.choose(rand)
+    return (index % self.width, index // self.width)
+  
+  def occupy(self, x, y, w = 1, h = 1):
+    """Marks a rectangle as taken. Every footprint position overlapping it is
+    dropped from the sets built so far."""
+    self._free[y:y+h, x:x+w] = False
+    for (fw, fh), footprint in self._footprints.items():
+      for ty in range(max(0, y - fh + 1), y + h):
+        for tx in range(max(0, x - fw + 1), x + w):
+          footprint.remove(ty * self.width + tx)
+  
+  def reset(self, x, y, free):
+    """Replaces the free cells of the rectangle at (x, y) with free, a boolean
+    array the size of the rectangle, e.g. after part of the map was generated
+    again. Only footprint positions overlapping the rectangle are looked at."""
+    (h, w) = free.shape
+    self._free[y:y+h, x:x+w] = free
+    for (fw, fh), footprint in self._footprints.items():
+      for ty in range(max(0, y - fh + 1), min(y + h, self.height - fh + 1)):
+        for tx in range(max(0, x - fw + 1), min(x + w, self.width - fw + 1)):
+          if self._free[ty:ty+fh, tx:tx+fw].all():
+            footprint.add(ty * self.width + tx)
+          else:
+            footprint.remove(ty * self.width + tx)
@@ -0,0 +1,308 @@
+"""Pathfinding. Crowds follow Dijkstra maps: for a set of goals, the cost of
+reaching the nearest one from every cell, computed for the whole region with
+array operations. Each actor then just steps to its cheapest neighbour, which
+is looked up in a precomputed flow field, so moving a thousand monsters costs
+a thousand lookups. One-off routes between two cells use A*, cached."""
+import heapq
+from collections import OrderedDict
+
+import numpy
+
+# The eight steps an actor can take, then staying put.
+STEPS = [(-1, -1), (0, -1), (1, -1), (-1, 0), (1, 0), (-1, 1), (0, 1), (1, 1),
+         (0, 0)]
+STAY = 8
+_STEP_DX = numpy.array([dx for (dx, _) in STEPS], numpy.int64)
+_STEP_DY = numpy.array([dy for (_, dy) in STEPS], numpy.int64)
+
+
+class DijkstraMap:
+  """The cost of reaching the nearest goal from every cell of a Pathfinder's
+  region, and the step to take from each cell to get there. Kept up to date
+  lazily: changes are noted as they come and only applied when the map is
+  next used."""
+  
+  def __init__(self, pathfinder, goals):
+    self._pathfinder = pathfinder
+    self.dist = None
+    self.flow = None
+    self.setGoals(goals)
+  
+  def setGoals(self, goals):
+    """goals is a list of (x, y) map cells. Those outside the region are
+    ignored until the region moves over them."""
+    p = self._pathfinder
+    self.goals = list(goals)
+    inside = [(x, y) for (x, y) in goals if p.contains(x, y)]
+    self._goals = (numpy.array([y - p.top for (_, y) in inside], numpy.int64),
+                   numpy.array([x - p.left for (x, _) in inside], numpy.int64))
+    self.reset()
+  
+  def reset(self):
+    """Throws away the distances, to be recomputed from scratch."""
+    self.dist = None
+    self._raised = []
+  
+  def costRaised(self, cells):
+    """Some cells, given as region (row array, column array), became more
+    expensive or impassable. The distances that may have gone through them
+    are dropped, the rest stay exact."""
+    if self.dist is not None:
+      self._raised.append(cells)
+  
+  def costLowered(self):
+    """Some cells became cheaper. Current distances are still upper bounds,
+    so relaxing them again is enough."""
+    if self.dist is not None:
+      self._dirty = True
+  
+  def _update(self):
+    p = self._pathfinder
+    if self.dist is None:
+      self.dist = numpy.full((p.height, p.width), numpy.inf, numpy.float32)
+      self._raised = []
+      self._dirty = True
+    for (rows, cols) in self._raised:
+      # Only paths to the goal costing at least as much as from a changed cell
+      # can go through it.
+      threshold = self.dist[rows, cols].min()
+      self.dist[self.dist >= threshold] = numpy.inf
+      self._dirty = True
+    self._raised = []
+    if self._dirty:
+      self._relax()
+      self._dirty = False
+  
+  def _relax(self):
+    """Relaxes every cell from its eight neighbours, all at once, until
+    nothing improves, then builds the flow field."""
+    p = self._pathfinder
+    (h, w) = (p.height, p.width)
+    cost = p.cost
+    dist = self.dist
+    dist[self._goals] = 0
+    impassable = ~numpy.isfinite(cost)
+    # Padded with infinity, so stepping off the region is never cheapest.
+    through = numpy.full((h + 2, w + 2), numpy.inf, numpy.float32)
+    throughDiagonal = numpy.full((h + 2, w + 2), numpy.inf, numpy.float32)
+    candidates = numpy.empty((len(STEPS), h, w), numpy.float32)
+    candidates[STAY] = numpy.inf
+    while True:
+      # Cost of reaching the goal by walking into each cell.
+      numpy.add(dist, cost, out = through[1:-1, 1:-1])
+      numpy.add(dist, cost * p.diagonalCost, out = throughDiagonal[1:-1, 1:-1])
+      for i in range(STAY):
+        (dx, dy) = STEPS[i]
+        source = throughDiagonal if dx != 0 and dy != 0 else through
+        candidates[i] = source[1+dy:1+dy+h, 1+dx:1+dx+w]
+      best = candidates.min(0)
+      best[impassable] = numpy.inf
+      best[self._goals] = 0
+      improved = best < dist
+      if not improved.any():
+        break
+      numpy.minimum(dist, best, out = dist)
+  
+    self.flow = candidates.argmin(0).astype(numpy.int8)
+    # Stay put at the goals, and where they can't be reached from.
+    self.flow[self._goals] = STAY
+    self.flow[dist == numpy.inf] = STAY
+  
+  def distance(self, x, y):
+    """The cost of reaching the nearest goal from map cell (x, y), infinite
+    if it can't be reached."""
+    p = self._pathfinder
+    if not p.contains(x, y):
+      return numpy.inf
+    self._update()
+    return float(self.dist[y - p.top, x - p.left])
+  
+  def step(self, x, y):
+    """Returns the (dx, dy) step toward the nearest goal from map cell (x, y),
+    (0, 0) if there is none to take."""
+    p = self._pathfinder
+    if not p.contains(x, y):
+      return (0, 0)
+    self._update()
+    return STEPS[self.flow[y - p.top, x - p.left]]
+  
+  def steps(self, xs, ys):
+    """Like step for many actors at once: xs and ys are arrays of map
+    coordinates, and arrays of dx and dy are returned."""
+    p = self._pathfinder
+    self._update()
+    xs = numpy.asarray(xs) - p.left
+    ys = numpy.asarray(ys) - p.top
+    inside = (xs >= 0) & (xs < p.width) & (ys >= 0) & (ys < p.height)
+    flow = numpy.full(len(xs), STAY, numpy.int8)
+    flow[inside] = self.flow[ys[inside], xs[inside]]
+    return (_STEP_DX[flow], _STEP_DY[flow])
+
+
+class Pathfinder:
+  """The pathfinding service of a map, over a rectangular region of it (the
+  whole of a TileMap, or the part of a streamed map around the hero). The map
+  must provide costWindow(x, y, w, h), as TileMap does, and listeners, through
+  which the Pathfinder learns about cells changing.
+  
+  Dijkstra maps are kept by name, e.g. "hero" or "crops", and shared by every
+  actor heading the same way."""
+  
+  def __init__(self, smap, left = 0, top = 0, width = None, height = None,
+               diagonalCost = 1.0, maxCached = 256):
+    """diagonalCost multiplies the cost of diagonal steps. Roguelike moves
+    all take as long, so it is 1 by default."""
+    self._map = smap
+    self.diagonalCost = diagonalCost
+    self.maxCached = maxCached
+    self._maps = {}
+    # Maps (start, goal) to the path found by A*, least recently used first.
+    self._paths = OrderedDict()
+    self.hits = 0
+    self.misses = 0
+    if width == None:
+      width = smap.width
+    if height == None:
+      height = smap.height
+    self.setRegion(left, top, width, height)
+    smap.listeners.append(self)
+  
+  def setRegion(self, left, top, width, height):
+    """Moves the region pathfinding happens in. Every Dijkstra map is
+    recomputed when next used, from those of its goals in the new region."""
+    # Read before switching over: reading may load chunks, whose changes are
+    # reported for the old region meanwhile.
+    cost = self._map.costWindow(left, top, width, height)
+    self.left = left
+    self.top = top
+    self.width = width
+    self.height = height
+    self.cost = cost
+    self._minCost = self._lowestCost()
+    for dijkstraMap in self._maps.values():
+      dijkstraMap.setGoals(dijkstraMap.goals)
+    self._paths.clear()
+  
+  def _lowestCost(self):
+    finite = self.cost[numpy.isfinite(self.cost)]
+    if len(finite) == 0:
+      return 1.0
+    return float(finite.min())
+  
+  def contains(self, x, y):
+    return (self.left <= x < self.left + self.width and
+            self.top <= y < self.top + self.height)
+  
+  def cellsChanged(self, x, y, w = 1, h = 1, sight = True):
+    """Rereads the cost of the changed cells and lets the Dijkstra maps and
+    the cached paths know what got cheaper or dearer. Whether sight changed
+    doesn't matter here."""
+    x0 = max(x, self.left)
+    y0 = max(y, self.top)
+    x1 = min(x + w, self.left + self.width)
+    y1 = min(y + h, self.top + self.height)
+    if x0 >= x1 or y0 >= y1:
+      return
+    window = (slice(y0 - self.top, y1 - self.top), slice(x0 - self.left, x1 - self.left))
+    old = self.cost[window].copy()
+    new = self._map.costWindow(x0, y0, x1 - x0, y1 - y0)
+    self.cost[window] = new
+  
+    (rows, cols) = numpy.nonzero(new > old)
+    if len(rows) > 0:
+      raised = (rows + window[0].start, cols + window[1].start)
+      for dijkstraMap in self._maps.values():
+        dijkstraMap.costRaised(raised)
+      changed = set(zip((cols + x0).tolist(), (rows + y0).tolist()))
+      for key in [key for key, path in self._paths.items()
+                  if path != None and not changed.isdisjoint(path)]:
+        del self._paths[key]
+    if (new < old).any():
+      for dijkstraMap in self._maps.values():
+        dijkstraMap.costLowered()
+      # Any path may have a new shortcut.
+      self._paths.clear()
+      self._minCost = min(self._minCost, float(new.min()))
+  
+  # DIJKSTRA MAPS
+  
+  def setGoals(self, name, goals):
+    """Makes the Dijkstra map called name lead to goals, a list of (x, y)."""
+    dijkstraMap = self._maps.get(name)
+    if dijkstraMap == None:
+      self._maps[name] = DijkstraMap(self, goals)
+    else:
+      dijkstraMap.setGoals(goals)
+  
+  def getMap(self, name):
+    return self._maps.get(name)
+  
+  def removeMap(self, name):
+    self._maps.pop(name, None)
+  
+  def step(self, name, x, y):
+    """Returns the (dx, dy) step from (x, y) toward the goals of the Dijkstra
+    map called name."""
+    return self._maps[name].step(x, y)
+  
+  def distance(self, name, x, y):
+    return self._maps[name].distance(x, y)
+  
+  # A*
+  
+  def findPath(self, start, goal):
+    """Returns the cheapest path from start to goal, both (x, y) map cells, as
+    the list of cells to walk into, or None if goal can't be reached. Paths
+    are cached until a cell on them gets dearer, or any cell cheaper."""
+    key = (start, goal)
+    if key in self._paths:
+      self._paths.move_to_end(key)
+      self.hits = self.hits + 1
+      return self._paths[key]
+    self.misses = self.misses + 1
+    path = self._astar(start, goal)
+    self._paths[key] = path
+    while len(self._paths) > self.maxCached:
+      self._paths.popitem(last = False)
+    return path
+  
+  def _astar(self, start, goal):
+    if not self.contains(*start) or not self.contains(*goal):
+      return None
+    cost = self.cost
+    diagonalCost = self.diagonalCost
+    minCost = self._minCost * min(1.0, diagonalCost)
+    (gx, gy) = goal
+    frontier = [(0.0, 0.0, start)]
+    cameFrom = {start: None}
+    spent = {start: 0.0}
+    while len(frontier) > 0:
+      (_, sofar, cell) = heapq.heappop(frontier)
+      if cell == goal:
+        path = []
+        while cell != start:
+          path.append(cell)
+          cell = cameFrom[cell]
+        path.reverse()
+        return path
+      if sofar > spent[cell]:
+        continue
+      (x, y) = cell
+      for (dx, dy) in STEPS[:STAY]:
+        nx = x + dx
+        ny = y + dy
+        if not self.contains(nx, ny):
+          continue
+        step = cost[ny - self.top, nx - self.left]
+        if step == numpy.inf:
+          continue
+        if dx != 0 and dy != 0:
+          step = step * diagonalCost
+        total = sofar + float(step)
+        neighbour = (nx, ny)
+        if total < spent.get(neighbour, numpy.inf):
+          spent[neighbour] = total
+          cameFrom[neighbour] = cell
+          estimate = total + max(abs(gx - nx), abs(gy - ny)) * minCost
+          heapq.heappush(frontier, (estimate, total, neighbour))
+    return None
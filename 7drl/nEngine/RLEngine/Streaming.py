@@ -0,0 +1,298 @@
+"""Unbounded, streamed maps. Only the chunks around the point of interest (the
+hero, usually) are kept in memory. Chunks are generated the first time they are
+needed, and the least recently used ones are written to a compact on-disk cache
+when too many are loaded, to be read back when needed again."""
+import os
+import pickle
+import shutil
+import zlib
+from collections import OrderedDict
+
+from nEngine.RLEngine.Chunks import Chunk, chunkSeed
+import numpy
+
+from nEngine.RLEngine.TileMap import TileMap
+
+
+# Attributes that tie an entity to the rest of the game rather than describe it,
+# so aren't saved with it.
+_LINKS = {"parent", "children", "contents", "bp", "blueprint", "world", "id",
+          "generation", "_world", "_entity", "_archetype", "_row", "_store"}
+
+def _isPlain(value):
+  """Whether a value is plain data, that can be saved and mean the same once
+  loaded back."""
+  if value == None or type(value) in (bool, int, float, str):
+    return True
+  if type(value) in (list, tuple):
+    return all([_isPlain(item) for item in value])
+  if type(value) == dict:
+    return all([_isPlain(key) and _isPlain(item) for key, item in value.items()])
+  return False
+
+
+def _plainAttributes(obj):
+  return dict([(name, value) for name, value in vars(obj).items()
+               if name not in _LINKS and _isPlain(value)])
+
+
+def entityState(entity):
+  """Returns the plain data an entity holds, for saving with its chunk: its
+  own attributes, and those of each of its components, if it has any, by
+  component class name. Links to other objects are left out."""
+  state = {"attributes": _plainAttributes(entity), "components": {}}
+  if hasattr(entity, "getComponents") and getattr(entity, "_archetype", None) != None:
+    for component in entity.getComponents():
+      state["components"][type(component).__name__] = _plainAttributes(component)
+  return state
+
+
+def restoreEntityState(entity, state):
+  """Puts the data from entityState back into an entity freshly built from the
+  same blueprint."""
+  for name, value in state["attributes"].items():
+    setattr(entity, name, value)
+  if len(state["components"]) > 0:
+    for component in entity.getComponents():
+      for name, value in state["components"].get(type(component).__name__, {}).items():
+        setattr(component, name, value)
+
+
+class _ChunkListener:
+  """Passes on a chunk TileMap's cell changes in world coordinates."""
+  
+  def __init__(self, streamingMap, chunk):
+    self._map = streamingMap
+    self._chunk = chunk
+  
+  def cellsChanged(self, x, y, w = 1, h = 1, sight = True):
+    self._map._cellsChanged(self._chunk.x + x, self._chunk.y + y, w, h, sight)
+
+
+class StreamingMap:
+  """Answers the same cell queries as TileMap, over any coordinates. Each
+  loaded chunk is a small TileMap of its own.
+  
+  The listener is told about what happens to chunks, so entities can follow:
+    populateChunk(chunk, placements): a chunk was generated, with what the
+      generator wants placed in it.
+    saveTile(tile): returns picklable data describing a tile's contents, when
+      its chunk is evicted.
+    loadTile(x, y, data): rebuilds a tile's contents from that data.
+    unloadTile(tile): the tile is going away with its chunk."""
+  
+  def __init__(self, chunkSize, worldSeed, generator, terrains, tileFactory,
+               listener, cacheDir, radius = 2, maxChunks = 49):
+    """generator is called with a Chunk and returns (chunk, terrain ids,
+    placements), like the functions used by ChunkedGenerator. terrains is the
+    list of (name, passable, roughness), in id order. Chunks within radius
+    chunks of the point of interest are kept loaded; at most maxChunks are."""
+    self.chunkSize = chunkSize
+    self.worldSeed = worldSeed
+    self.radius = radius
+    self.maxChunks = max(maxChunks, (2 * radius + 1) ** 2)
+    self._generator = generator
+    self._terrains = terrains
+    self._tileFactory = tileFactory
+    self._listener = listener
+    self._cacheDir = cacheDir
+    os.makedirs(cacheDir, exist_ok = True)
+  
+    # Maps (cx, cy) to (Chunk, TileMap), least recently used first.
+    self._loaded = OrderedDict()
+    self.generated = 0
+    self.loads = 0
+    self.evictions = 0
+  
+    # As in TileMap.
+    self.listeners = []
+  
+  # CHUNKS
+  
+  def chunkOf(self, x, y):
+    """Returns the chunk coordinates of cell (x, y)."""
+    return (x // self.chunkSize, y // self.chunkSize)
+  
+  def isLoaded(self, cx, cy):
+    return (cx, cy) in self._loaded
+  
+  def _cacheFile(self, cx, cy):
+    return os.path.join(self._cacheDir, "%d_%d.chunk" % (cx, cy))
+  
+  def _newTileMap(self, chunk):
+    """A TileMap for the chunk, whose tiles get built at world coordinates."""
+    tileMap = TileMap(chunk.w, chunk.h,
+                      lambda name, x, y: self._tileFactory(name, chunk.x + x, chunk.y + y))
+    for (name, passable, roughness) in self._terrains:
+      tileMap.defineTerrain(name, passable, roughness)
+    tileMap.listeners.append(_ChunkListener(self, chunk))
+    return tileMap
+  
+  def _getChunk(self, cx, cy):
+    """Returns the loaded (Chunk, TileMap) at (cx, cy), loading or generating
+    it if necessary, and marks it as recently used."""
+    loaded = self._loaded.get((cx, cy))
+    if loaded != None:
+      self._loaded.move_to_end((cx, cy))
+      return loaded
+  
+    chunk = Chunk(cx, cy, cx * self.chunkSize, cy * self.chunkSize,
+                  self.chunkSize, self.chunkSize, chunkSeed(self.worldSeed, cx, cy))
+    tileMap = self._newTileMap(chunk)
+    loaded = (chunk, tileMap)
+    # Register first: populating the chunk asks it for tiles.
+    self._loaded[(cx, cy)] = loaded
+  
+    cacheFile = self._cacheFile(cx, cy)
+    if os.path.exists(cacheFile):
+      self._read(chunk, tileMap, cacheFile)
+      self.loads = self.loads + 1
+    else:
+      (_, terrain, placements) = self._generator(chunk)
+      tileMap.setTerrainIDs(0, 0, terrain)
+      self._listener.populateChunk(chunk, placements)
+      self.generated = self.generated + 1
+  
+    self._evict()
+    return loaded
+  
+  def _read(self, chunk, tileMap, cacheFile):
+    with open(cacheFile, "rb") as f:
+      data = pickle.loads(zlib.decompress(f.read()))
+    tileMap.setTerrainIDs(0, 0, data["terrain"])
+    tileMap.flags[:] = data["flags"]
+    for (x, y, tileData) in data["tiles"]:
+      self._listener.loadTile(x, y, tileData)
+  
+  def _write(self, chunk, tileMap):
+    tiles = []
+    for (x, y), tile in tileMap.getTiles().items():
+      tiles.append((chunk.x + x, chunk.y + y, self._listener.saveTile(tile)))
+      self._listener.unloadTile(tile)
+    # Actors aren't saved with the chunk, so neither are the cells they stood in.
+    flags = tileMap.flags & (~TileMap.ACTOR & 0xFF)
+    data = {"terrain": tileMap.terrain, "flags": flags, "tiles": tiles}
+    with open(self._cacheFile(chunk.cx, chunk.cy), "wb") as f:
+      f.write(zlib.compress(pickle.dumps(data, pickle.HIGHEST_PROTOCOL)))
+  
+  def _evict(self):
+    """Writes the least recently used chunks to disk until few enough are
+    loaded."""
+    while len(self._loaded) > self.maxChunks:
+      (_, (chunk, tileMap)) = self._loaded.popitem(last = False)
+      self._write(chunk, tileMap)
+      self.evictions = self.evictions + 1
+  
+  def streamAround(self, x, y, budget = None):
+    """Makes sure the chunks around cell (x, y) are loaded, the closest first.
+    The chunk containing (x, y) is always loaded; of the others, at most budget
+    are loaded or generated in this call, so the work can be spread over
+    frames. Returns how many are still missing."""
+    (ccx, ccy) = self.chunkOf(x, y)
+    self._getChunk(ccx, ccy)
+    missing = []
+    for cy in range(ccy - self.radius, ccy + self.radius + 1):
+      for cx in range(ccx - self.radius, ccx + self.radius + 1):
+        if (cx, cy) in self._loaded:
+          self._loaded.move_to_end((cx, cy))
+        else:
+          missing.append((max(abs(cx - ccx), abs(cy - ccy)), cx, cy))
+    missing.sort()
+    if budget != None:
+      toLoad = missing[:budget]
+    else:
+      toLoad = missing
+    for (_, cx, cy) in toLoad:
+      self._getChunk(cx, cy)
+    # The chunk of interest stays the most recently used.
+    self._loaded.move_to_end((ccx, ccy))
+    return len(missing) - len(toLoad)
+  
+  def flush(self):
+    """Writes every loaded chunk to disk and unloads it."""
+    while len(self._loaded) > 0:
+      (_, (chunk, tileMap)) = self._loaded.popitem(last = False)
+      self._write(chunk, tileMap)
+  
+  def close(self, removeCache = False):
+    """Unloads every chunk, telling the listener, and deletes the cache on
+    disk if removeCache, e.g. when it was only made for this game."""
+    if removeCache:
+      while len(self._loaded) > 0:
+        (_, (chunk, tileMap)) = self._loaded.popitem(last = False)
+        for tile in tileMap.getTiles().values():
+          self._listener.unloadTile(tile)
+      shutil.rmtree(self._cacheDir, ignore_errors = True)
+    else:
+      self.flush()
+  
+  # CELL QUERIES, as in TileMap
+  
+  def _locate(self, x, y):
+    """Returns (TileMap, local x, local y) for a cell."""
+    (chunk, tileMap) = self._getChunk(x // self.chunkSize, y // self.chunkSize)
+    return (tileMap, x - chunk.x, y - chunk.y)
+  
+  def getTile(self, x, y):
+    (tileMap, lx, ly) = self._locate(x, y)
+    return tileMap.getTile(lx, ly)
+  
+  def getTerrainName(self, x, y):
+    (tileMap, lx, ly) = self._locate(x, y)
+    return tileMap.getTerrainName(lx, ly)
+  
+  def canPass(self, x, y):
+    (tileMap, lx, ly) = self._locate(x, y)
+    return tileMap.canPass(lx, ly)
+  
+  def setFlag(self, x, y, flag, value = True):
+    (tileMap, lx, ly) = self._locate(x, y)
+    tileMap.setFlag(lx, ly, flag, value)
+  
+  def hasFlag(self, x, y, flag):
+    (tileMap, lx, ly) = self._locate(x, y)
+    return tileMap.hasFlag(lx, ly, flag)
+  
+  def refresh(self, x, y):
+    (tileMap, lx, ly) = self._locate(x, y)
+    tileMap.refresh(lx, ly)
+  
+  def inBounds(self, x, y):
+    return True
+  
+  def _cellsChanged(self, x, y, w = 1, h = 1, sight = True):
+    for listener in self.listeners:
+      listener.cellsChanged(x, y, w, h, sight)
+  
+  def blocksSight(self, x, y):
+    (tileMap, lx, ly) = self._locate(x, y)
+    return tileMap.blocksSight(lx, ly)
+  
+  def _stitch(self, x, y, w, h, window, read):
+    """Fills window with read(tileMap, x, y, w, h) of every chunk the
+    rectangle overlaps."""
+    size = self.chunkSize
+    for cy in range(y // size, (y + h - 1) // size + 1):
+      for cx in range(x // size, (x + w - 1) // size + 1):
+        (chunk, tileMap) = self._getChunk(cx, cy)
+        x0 = max(x, chunk.x)
+        y0 = max(y, chunk.y)
+        x1 = min(x + w, chunk.x + chunk.w)
+        y1 = min(y + h, chunk.y + chunk.h)
+        window[y0-y:y1-y, x0-x:x1-x] = read(tileMap, x0 - chunk.x, y0 - chunk.y,
+                                            x1 - x0, y1 - y0)
+    return window
+  
+  def opacityWindow(self, x, y, w, h):
+    """As in TileMap, stitched from every chunk the rectangle overlaps."""
+    return self._stitch(x, y, w, h, numpy.empty((h, w), numpy.bool_),
+                        TileMap.opacityWindow)
+  
+  def costWindow(self, x, y, w, h):
+    """As in TileMap, stitched from every chunk the rectangle overlaps."""
+    return self._stitch(x, y, w, h, numpy.empty((h, w), numpy.float32),
+                        TileMap.costWindow)
+  
+  def getChunkMap(self, cx, cy):
+    """Returns (Chunk, TileMap) of a chunk, loading it if needed."""
+    return self._getChunk(cx, cy)
@@ -0,0 +1,189 @@
+"""Compact tile map. Terrain, passability, roughness and occupancy are kept in
+NumPy arrays, one cell per element, so the map costs a few bytes per cell and
+whole-map questions are array operations. Tile entities are only built for the
+cells that actually need one, e.g. because something was put there."""
+import numpy
+
+
+class TileMap:
+  """Arrays are indexed [y, x], like rows of tiles."""
+  
+  # Occupancy flags.
+  BLOCKED = 1   # Something in the cell stops movement.
+  CONTENTS = 2  # The cell holds at least one entity.
+  ACTOR = 4     # An actor is standing in the cell.
+  OPAQUE = 8    # Something in the cell blocks sight.
+  
+  def __init__(self, width, height, tileFactory):
+    """tileFactory(terrainName, x, y) builds the tile entity of a cell, when
+    one is first asked for. Its contents must be a TileContents."""
+    self.width = width
+    self.height = height
+    self._tileFactory = tileFactory
+  
+    self.terrain = numpy.zeros((height, width), numpy.uint8)
+    self.passable = numpy.zeros((height, width), numpy.bool_)
+    self.roughness = numpy.zeros((height, width), numpy.float32)
+    self.flags = numpy.zeros((height, width), numpy.uint8)
+  
+    # Terrain types, by id (the values in terrain) and by name.
+    self._terrainNames = []
+    self._terrainIDs = {}
+    self._terrainPassable = []
+    self._terrainRoughness = []
+  
+    self._tiles = {} # Maps (x, y) to materialised tile entities.
+  
+    # Told through cellsChanged(x, y, w, h, sight) when cells change what can
+    # pass or see through them, e.g. a FieldOfView or a Pathfinder. sight is
+    # False if only what can pass changed.
+    self.listeners = []
+  
+  def defineTerrain(self, name, passable = True, roughness = 1.0):
+    """Adds a terrain type and returns its id."""
+    terrainID = len(self._terrainNames)
+    self._terrainNames.append(name)
+    self._terrainIDs[name] = terrainID
+    self._terrainPassable.append(passable)
+    self._terrainRoughness.append(roughness)
+    return terrainID
+  
+  def fill(self, name, x = 0, y = 0, w = None, h = None):
+    """Sets the terrain of a rectangle, the whole map by default."""
+    if w == None:
+      w = self.width - x
+    if h == None:
+      h = self.height - y
+    terrainID = self._terrainIDs[name]
+    self.terrain[y:y+h, x:x+w] = terrainID
+    self.passable[y:y+h, x:x+w] = self._terrainPassable[terrainID]
+    self.roughness[y:y+h, x:x+w] = self._terrainRoughness[terrainID]
+    self._cellsChanged(x, y, w, h)
+  
+  def setTerrain(self, x, y, name):
+    self.fill(name, x, y, 1, 1)
+  
+  def setTerrainIDs(self, x, y, ids):
+    """Copies an array of terrain ids into the map with its top-left at
+    (x, y), e.g. to stitch in a generated chunk."""
+    (h, w) = ids.shape
+    self.terrain[y:y+h, x:x+w] = ids
+    self.passable[y:y+h, x:x+w] = numpy.array(self._terrainPassable, numpy.bool_)[ids]
+    self.roughness[y:y+h, x:x+w] = numpy.array(self._terrainRoughness, numpy.float32)[ids]
+    self._cellsChanged(x, y, w, h)
+  
+  def getTerrainName(self, x, y):
+    return self._terrainNames[self.terrain[y, x]]
+  
+  def inBounds(self, x, y):
+    return 0 <= x < self.width and 0 <= y < self.height
+  
+  # OCCUPANCY
+  
+  def _setFlags(self, x, y, flags):
+    old = self.flags[y, x]
+    self.flags[y, x] = flags
+    changed = old ^ flags
+    if changed & (TileMap.BLOCKED | TileMap.OPAQUE):
+      self._cellsChanged(x, y, sight = bool(changed & TileMap.OPAQUE))
+  
+  def setFlag(self, x, y, flag, value = True):
+    if value:
+      self._setFlags(x, y, self.flags[y, x] | flag)
+    else:
+      self._setFlags(x, y, self.flags[y, x] & (~flag & 0xFF))
+  
+  def clearFlags(self, x, y, w, h, flags):
+    """Clears the given flags over a rectangle."""
+    self.flags[y:y+h, x:x+w] &= ~flags & 0xFF
+    self._cellsChanged(x, y, w, h, bool(flags & TileMap.OPAQUE))
+  
+  def hasFlag(self, x, y, flag):
+    return bool(self.flags[y, x] & flag)
+  
+  def canPass(self, x, y):
+    """Whether the terrain is passable and nothing in the cell blocks."""
+    return bool(self.passable[y, x]) and not self.flags[y, x] & TileMap.BLOCKED
+  
+  def passabilityMap(self):
+    """Returns a boolean array of every cell that can be walked into."""
+    return self.passable & (self.flags & TileMap.BLOCKED == 0)
+  
+  def canPassArea(self, x, y, w, h):
+    """Whether every cell of the rectangle can be walked into."""
+    if x < 0 or y < 0 or x + w > self.width or y + h > self.height:
+      return False
+    area = self.passable[y:y+h, x:x+w] & (self.flags[y:y+h, x:x+w] & TileMap.BLOCKED == 0)
+    return bool(area.all())
+  
+  def _cellsChanged(self, x, y, w = 1, h = 1, sight = True):
+    for listener in self.listeners:
+      listener.cellsChanged(x, y, w, h, sight)
+  
+  def costWindow(self, x, y, w, h):
+    """Returns a float array, indexed [y, x], of the cost of walking into each
+    cell of the rectangle: its roughness, or infinity if it can't be walked
+    into. Cells outside the map can't."""
+    window = numpy.full((h, w), numpy.inf, numpy.float32)
+    x0 = max(x, 0)
+    y0 = max(y, 0)
+    x1 = min(x + w, self.width)
+    y1 = min(y + h, self.height)
+    if x0 < x1 and y0 < y1:
+      passable = self.passable[y0:y1, x0:x1] & (self.flags[y0:y1, x0:x1] & TileMap.BLOCKED == 0)
+      window[y0-y:y1-y, x0-x:x1-x] = numpy.where(passable, self.roughness[y0:y1, x0:x1], numpy.inf)
+    return window
+  
+  # SIGHT
+  
+  def blocksSight(self, x, y):
+    return not self.passable[y, x] or bool(self.flags[y, x] & TileMap.OPAQUE)
+  
+  def opacityWindow(self, x, y, w, h):
+    """Returns a boolean array, indexed [y, x], of the cells of the rectangle
+    that block sight: impassable terrain and opaque contents. Cells outside
+    the map block sight."""
+    window = numpy.ones((h, w), numpy.bool_)
+    x0 = max(x, 0)
+    y0 = max(y, 0)
+    x1 = min(x + w, self.width)
+    y1 = min(y + h, self.height)
+    if x0 < x1 and y0 < y1:
+      window[y0-y:y1-y, x0-x:x1-x] = (~self.passable[y0:y1, x0:x1] |
+                                      (self.flags[y0:y1, x0:x1] & TileMap.OPAQUE != 0))
+    return window
+  
+  # TILE ENTITIES
+  
+  def getTile(self, x, y):
+    """Returns the tile entity of the cell, building it if there is none yet."""
+    tile = self._tiles.get((x, y))
+    if tile == None:
+      tile = self._tileFactory(self.getTerrainName(x, y), x, y)
+      self._tiles[(x, y)] = tile
+    return tile
+  
+  def hasTile(self, x, y):
+    """Whether the cell's tile entity has been built."""
+    return (x, y) in self._tiles
+  
+  def getTiles(self):
+    """Returns a dict mapping (x, y) to every tile entity built so far."""
+    return self._tiles
+  
+  def releaseTile(self, x, y):
+    """Forgets a cell's tile entity, e.g. once it is empty again. It will be
+    rebuilt if asked for."""
+    self._tiles.pop((x, y), None)
+  
+  def refresh(self, x, y):
+    """Updates the BLOCKED, OPAQUE and CONTENTS flags of a cell from its tile
+    entity, after its contents changed."""
+    tile = self._tiles.get((x, y))
+    if tile == None:
+      self._setFlags(x, y, self.flags[y, x] & (~(TileMap.BLOCKED | TileMap.OPAQUE | TileMap.CONTENTS) & 0xFF))
+      return
+    contents = tile.contents
+    self.setFlag(x, y, TileMap.BLOCKED, not contents.passable)
+    self.setFlag(x, y, TileMap.OPAQUE, contents.opaque)
+    self.setFlag(x, y, TileMap.CONTENTS, len(contents) > 0)
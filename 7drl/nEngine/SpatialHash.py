@@ -0,0 +1,74 @@
+"""Uniform grid broadphase. Items are bucketed by the cell their position falls
+in, so finding what is near a point only looks at a handful of cells rather
+than at everything."""
+from math import floor
+
+
+class SpatialHash:
+  """Hashes items into square cells of cellSize. Only occupied cells are
+  stored, so the grid is unbounded and costs nothing where nothing is."""
+  
+  def __init__(self, cellSize):
+    self.cellSize = cellSize
+    self._cells = {} # Maps (cx, cy) to a dict of the items in that cell.
+    self._itemCells = {} # Maps item to the cell it is in.
+  
+  def __len__(self):
+    return len(self._itemCells)
+  
+  def cellOf(self, x, y):
+    """Returns the cell coordinates containing (x, y)."""
+    return (floor(x / self.cellSize), floor(y / self.cellSize))
+  
+  def insert(self, item, x, y):
+    """Adds item at position (x, y)."""
+    cell = self.cellOf(x, y)
+    self._itemCells[item] = cell
+    bucket = self._cells.get(cell)
+    if bucket == None:
+      bucket = {}
+      self._cells[cell] = bucket
+    bucket[item] = True
+  
+  def remove(self, item):
+    """Removes item from the hash."""
+    cell = self._itemCells.pop(item)
+    bucket = self._cells[cell]
+    del bucket[item]
+    if len(bucket) == 0:
+      del self._cells[cell]
+  
+  def move(self, item, x, y):
+    """Updates the position of item. Nothing happens unless it changed cell,
+    which for most moves it doesn't. Returns whether it changed cell."""
+    cell = (floor(x / self.cellSize), floor(y / self.cellSize))
+    old = self._itemCells[item]
+    if old == cell:
+      return False
+    # Straight from the old bucket to the new one.
+    bucket = self._cells[old]
+    del bucket[item]
+    if len(bucket) == 0:
+      del self._cells[old]
+    self._itemCells[item] = cell
+    bucket = self._cells.get(cell)
+    if bucket == None:
+      bucket = {}
+      self._cells[cell] = bucket
+    bucket[item] = True
+    return True
+  
+  def query(self, x, y, radius):
+    """Returns a list of the items in the cells overlapping the square of side
+    2*radius centred on (x, y). This is only a broadphase: the items still need
+    an exact test."""
+    (minX, minY) = self.cellOf(x - radius, y - radius)
+    (maxX, maxY) = self.cellOf(x + radius, y + radius)
+    cells = self._cells
+    found = []
+    for cx in range(minX, maxX + 1):
+      for cy in range(minY, maxY + 1):
+        bucket = cells.get((cx, cy))
+        if bucket != None:
+          found.extend(bucket)
+    return found
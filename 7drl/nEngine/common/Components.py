@@ -1,6 +1,10 @@
 from nEngine.Entities import Component
+from nEngine.Columns import Column
 
 class PositionComponent(Component):
+  x = Column()
+  y = Column()
+  
   def __init__(self, entity):
     Component.__init__(self, entity)
     self.x = None
@@ -8,6 +12,10 @@ class PositionComponent(Component):
   
   
 class VelocityComponent(Component):
+  vMax = Column(float("inf"))
+  vx = Column()
+  vy = Column()
+  
   def __init__(self, entity):
     Component.__init__(self, entity)
     self.vMax = None    
@@ -15,13 +23,28 @@ class VelocityComponent(Component):
     self.vy = None
     
     
+class RangeComponent(Component):
+  """For things that disappear after travelling a certain distance, like
+  bullets."""
+  range = Column(float("inf"))
+  distance = Column()
+  
+  def __init__(self, entity):
+    Component.__init__(self, entity)
+    self.range = None
+  
+  def init(self, values):
+    Component.init(self, values)
+    self.distance = 0
+    
+    
 class HPComponent(Component):
   def __init__(self, entity):
     Component.__init__(self, entity)
     self.HP = None
     self.HPMax = None
   
-  def init(self, XMLRoot):
-    Component.init(self, XMLRoot)
+  def init(self, values):
+    Component.init(self, values)
     self.HP = self.HPMax
-  
\ No newline at end of file
+  
@@ -0,0 +1,99 @@
+import numpy
+
+from nEngine.Entities import System
+from nEngine.Columns import Column, ColumnStore
+from nEngine.common.Components import PositionComponent, VelocityComponent, RangeComponent
+
+
+class MovementSystem(System):
+  """Moves everything that has a position and a velocity. Positions and
+  velocities live in NumPy arrays, so the whole lot is integrated in one
+  vectorised step per tick, however many entities there are."""
+  
+  components = (PositionComponent, VelocityComponent)
+  excluded = (RangeComponent,)
+  
+  # Temporaries used by integrate(), kept in the store so ticks don't allocate.
+  scratch = ("speed", "scale", "step")
+  
+  def __init__(self, world):
+    System.__init__(self, world)
+    columns = []
+    for componentClass in self.components:
+      columns.extend(Column.of(componentClass))
+    self._store = ColumnStore(columns, self.scratch)
+  
+  def addEntity(self, entity):
+    System.addEntity(self, entity)
+    self._store.add(entity, [entity.getComponent(componentClass)
+                             for componentClass in self.components])
+  
+  def removeEntity(self, entity):
+    System.removeEntity(self, entity)
+    self._store.remove(entity)
+  
+  def integrate(self, dt):
+    """Clamps velocities to vMax and moves every position along its velocity.
+    Leaves each entity's speed in the speed scratch column."""
+    store = self._store
+    x = store.view("x")
+    y = store.view("y")
+    vx = store.view("vx")
+    vy = store.view("vy")
+    speed = store.view("speed")
+    scale = store.view("scale")
+    step = store.view("step")
+    
+    # Clamp speed to vMax, scaling both components by the same factor. The
+    # tiny floor avoids dividing by zero for things standing still.
+    numpy.hypot(vx, vy, out=speed)
+    numpy.maximum(speed, 1e-12, out=scale)
+    numpy.minimum(speed, store.view("vMax"), out=speed)
+    numpy.divide(speed, scale, out=scale)
+    vx *= scale
+    vy *= scale
+    
+    numpy.multiply(vx, dt, out=step)
+    x += step
+    numpy.multiply(vy, dt, out=step)
+    y += step
+  
+  def tick(self, dt):
+    if len(self._store) > 0:
+      self.integrate(dt)
+  
+  def movedEntities(self):
+    """The entities the last tick actually moved, i.e. those with some speed,
+    for systems that index positions. Those standing still are left out."""
+    store = self._store
+    return [store.entities[i] for i in numpy.flatnonzero(store.view("speed") > 0)]
+
+
+class RangedMovementSystem(MovementSystem):
+  """Moves things with a limited range, like bullets, keeping track of the
+  distance they travelled. Whatever went further than its range is removed
+  from the world, all at once, at the end of the tick."""
+  
+  components = (PositionComponent, VelocityComponent, RangeComponent)
+  excluded = ()
+  
+  def tick(self, dt):
+    store = self._store
+    if len(store) == 0:
+      return
+    self.integrate(dt)
+    
+    distance = store.view("distance")
+    speed = store.view("speed")
+    speed *= dt
+    distance += speed
+    
+    expired = numpy.flatnonzero(distance > store.view("range"))
+    if len(expired) > 0:
+      for entity in [store.entities[i] for i in expired]:
+        self.expire(entity)
+  
+  def expire(self, entity):
+    """Called for each entity that went out of range. Removes it from the
+    world; reimplement for explosions and the like."""
+    self._world.removeEntity(entity)
@@ -1,3 +1,6 @@
+import bisect
+
+import numpy
 from sfml import Drawable, Transformable, Rectangle
 
 import nEngine.graphics.ResourceManager
@@ -7,74 +10,308 @@ class Frame:
     self._rect = rect
     self._duration = duration
     self._centerpoint = centerpoint
-    
+  
   def loadFromXML(self, XMLRoot):
     split = XMLRoot.text.split(",")
     self._duration = float(split[-1])
     split = [int(p) for p in split[:-1]]
     self._rect = Rectangle((split[0], split[1]), (split[2], split[3]))
     self._centerpoint = (split[0], split[1])
-    
+
+
+
+class AnimationClip:
+  """A SpriteAnimation compiled for playing: frame end times, cumulative, and
+  texture rects in flat arrays. The frame showing at any time is found by
+  binary search, or by a division if every frame lasts as long."""
+  
+  def __init__(self, name, texture, rects, durations):
+    if len(durations) == 0:
+      raise ValueError("Animation " + name + " has no frames.")
+    if min(durations) <= 0:
+      raise ValueError("Animation " + name + " has frames lasting no time.")
+    self.name = name
+    self.texture = texture
+    self.size = len(durations)
+    self.ends = numpy.cumsum(numpy.array(durations, numpy.float64))
+    self.duration = float(self.ends[-1])
+    # Rect of each frame, as an array and as Rectangles to give sprites.
+    self.rects = numpy.array(rects, numpy.int32).reshape(self.size, 4)
+    self.rectangles = [Rectangle((x, y), (w, h)) for (x, y, w, h) in rects]
+    if min(durations) == max(durations):
+      self.uniform = float(durations[0])
+    else:
+      self.uniform = None
+    self._endList = self.ends.tolist()
+  
+  def frameAt(self, time, loop = True):
+    """Index of the frame showing time seconds into the clip."""
+    if loop:
+      time = time % self.duration
+    elif time >= self.duration:
+      return self.size - 1
+    if self.uniform != None:
+      return min(int(time // self.uniform), self.size - 1)
+    return min(bisect.bisect_right(self._endList, time), self.size - 1)
+  
+  def framesAt(self, times, loop = True):
+    """Like frameAt, for an array of times."""
+    if loop:
+      times = times % self.duration
+    if self.uniform != None:
+      frames = (times // self.uniform).astype(numpy.int64)
+    else:
+      frames = numpy.searchsorted(self.ends, times, side = "right")
+    return numpy.minimum(frames, self.size - 1)
+
 
 
 class SpriteAnimation:
-  def __init__(self, texture = None, frames = [], name = "SpriteAnimation"):
+  def __init__(self, texture = None, frames = None, name = "SpriteAnimation"):
     self._texture = texture
+    if frames == None:
+      frames = []
     self._frames = frames
     self._name = name
+    self._clip = None
   
   def loadFromXML(self, XMLRoot):
-    self._name = XMLRoot.attributes["name"]
-    self._texture = nEngine.graphics.ResourceManager.ResourceManager.getTexture(XMLRoot.attributes["name"])
+    """Frames are cut from a texture file, or from a sprite packed in an
+    atlas, in which case they are given relative to the sprite."""
+    self._name = XMLRoot.attrib["name"]
+    resources = nEngine.graphics.ResourceManager.ResourceManager
+    (left, top) = (0, 0)
+    if "sprite" in XMLRoot.attrib:
+      (self._texture, (left, top, _, _)) = resources.getRegion(XMLRoot.attrib["sprite"])
+    else:
+      self._texture = resources.getTexture(XMLRoot.attrib["texture"])
     for frameRoot in XMLRoot:
       frame = Frame()
       frame.loadFromXML(frameRoot)
+      if (left, top) != (0, 0):
+        rect = frame._rect
+        frame._rect = Rectangle((rect.left + left, rect.top + top), (rect.width, rect.height))
+        (cx, cy) = frame._centerpoint
+        frame._centerpoint = (cx + left, cy + top)
       self._frames.append(frame)
+    self._clip = None
   
   def addFrame(self, frame):
     self._frames.append(frame)
-    
+    self._clip = None
+  
   def getTexture(self):
     return self._texture
-
+  
   def getFrame(self, n):
     return self._frames[n]
   
   def getSize(self):
     return len(self._frames)
+  
+  def compile(self):
+    """Returns the AnimationClip of this animation, compiling it the first
+    time."""
+    if self._clip == None:
+      rects = []
+      for frame in self._frames:
+        rect = frame._rect
+        rects.append((rect.left, rect.top, rect.width, rect.height))
+      self._clip = AnimationClip(self._name, self._texture, rects,
+                                 [frame._duration for frame in self._frames])
+    return self._clip
 
 
 
 class AnimatedSprite:
-  def __init__(self, animation):
-    self._anim = animation
-    self._frameNum
-    self._timeInFrame = 0
-    
+  """Plays an animation on an sfml.Sprite, setting its texture rect as frames
+  change. Can run on its own, or be added to an AnimationSystem to be run
+  with many others at once."""
+  
+  def __init__(self, animation, sprite = None):
+    self._clip = animation.compile()
+    self._sprite = sprite
+    self._frameNum = 0
+    self._timeInFrame = 0 # Time into the whole clip, despite the name.
+  
+    # Set while in an AnimationSystem, which then keeps the time, with the
+    # row of its arrays this sprite is in (None if synchronised).
+    self._system = None
+    self._row = None
+  
     self.multiplier = 1.0
     self.loop = True
+    if sprite != None:
+      sprite.texture = self._clip.texture
+      sprite.texture_rect = self._clip.rectangles[0]
+  
+  @property
+  def multiplier(self):
+    return self._multiplier
+  
+  @multiplier.setter
+  def multiplier(self, multiplier):
+    """Speed of playback. Synchronised sprites go at their clock's speed."""
+    self._multiplier = multiplier
+    if self._system != None and self._row != None:
+      self._system._players[self._clip].multipliers[self._row] = multiplier
+  
+  @property
+  def loop(self):
+    return self._loop
+  
+  @loop.setter
+  def loop(self, loop):
+    self._loop = loop
+    if self._system != None and self._row != None:
+      self._system._players[self._clip].loops[self._row] = loop
   
   def getFrameInfo(self):
-    self._anim.getFrame(self._frameNum)
+    return (self.getFrameDuration(), self.getFrameRect())
   
   def getFrameDuration(self):
-    self.getFrameInfo[0]
+    clip = self._clip
+    if self._frameNum == 0:
+      return clip.ends[0]
+    return clip.ends[self._frameNum] - clip.ends[self._frameNum - 1]
   
   def getFrameRect(self):
-    self.getFrameInfo[1]
+    return self._clip.rectangles[self._frameNum]
   
-  def toNextFrame(self):
-    self._timeInFrame = self._timeInFrame - self.getFrameDuration()
-    if self._frameNum < self._anim.getSize() - 1:
-      self._frameNum = self._frameNum + 1
-    else:
-      if self.loop:
-        self._frameNum = 0
-      else:
-        pass
+  def getFrameNum(self):
+    return self._frameNum
+  
+  def _setFrame(self, frameNum):
+    self._frameNum = frameNum
+    if self._sprite != None:
+      self._sprite.texture_rect = self._clip.rectangles[frameNum]
   
   def run(self, dt):
+    """Advances the animation by dt seconds, unless it is in an
+    AnimationSystem, which does it already."""
+    if self._system != None:
+      return
     self._timeInFrame = self._timeInFrame + dt * self.multiplier
-    while self._timeInFrame > self.getFrameDuration():
-      self.toNextFrame()
+    frameNum = self._clip.frameAt(self._timeInFrame, self.loop)
+    if frameNum != self._frameNum:
+      self._setFrame(frameNum)
+
+
+
+class _ClipPlayers:
+  """The sprites of an AnimationSystem playing one clip, with their times in
+  arrays. Rows are kept packed: removing a sprite moves the last into its
+  place."""
+  
+  def __init__(self, clip):
+    self.clip = clip
+    self.sprites = []
+    self.times = numpy.zeros(16)
+    self.multipliers = numpy.zeros(16)
+    self.loops = numpy.zeros(16, numpy.bool_)
+    self.frames = numpy.zeros(16, numpy.int64)
+  
+  def add(self, animated):
+    row = len(self.sprites)
+    if row == len(self.times):
+      for name in ("times", "multipliers", "loops", "frames"):
+        array = getattr(self, name)
+        grown = numpy.zeros(2 * len(array), array.dtype)
+        grown[:row] = array
+        setattr(self, name, grown)
+    self.sprites.append(animated)
+    self.times[row] = animated._timeInFrame
+    self.multipliers[row] = animated.multiplier
+    self.loops[row] = animated.loop
+    self.frames[row] = animated._frameNum
+    animated._row = row
+  
+  def remove(self, animated):
+    row = animated._row
+    last = len(self.sprites) - 1
+    animated._timeInFrame = float(self.times[row])
+    if row != last:
+      moved = self.sprites[last]
+      self.sprites[row] = moved
+      moved._row = row
+      for array in (self.times, self.multipliers, self.loops, self.frames):
+        array[row] = array[last]
+    self.sprites.pop()
+  
+  def run(self, dt):
+    n = len(self.sprites)
+    if n == 0:
+      return 0
+    times = self.times[:n]
+    times += dt * self.multipliers[:n]
+    clip = self.clip
+    loops = self.loops[:n]
+    frames = clip.framesAt(times, True)
+    if not loops.all():
+      # Clips that don't loop stay on their last frame once played.
+      frames[~loops & (times >= clip.duration)] = clip.size - 1
+    changed = numpy.nonzero(frames != self.frames[:n])[0]
+    self.frames[:n] = frames
+    for row in changed.tolist():
+      self.sprites[row]._setFrame(int(frames[row]))
+    return len(changed)
 
+
+
+class AnimationSystem:
+  """Advances any number of AnimatedSprites together. Sprites playing the
+  same clip have their times kept in arrays and are advanced in one go; only
+  those whose frame actually changed get their texture rect set.
+  
+  Sprites added as synchronised share their clip's clock instead, e.g. so all
+  the windmills turn together; their frame is then worked out once for all of
+  them."""
+  
+  def __init__(self):
+    self._players = {} # Maps clip to its _ClipPlayers.
+    # Maps clip to [time, frame, list of synchronised AnimatedSprites].
+    self._clocks = {}
+    self.frameChanges = 0
+  
+  def add(self, animated, synchronised = False):
+    clip = animated._clip
+    animated._system = self
+    if synchronised:
+      clock = self._clocks.get(clip)
+      if clock == None:
+        clock = [0.0, 0, []]
+        self._clocks[clip] = clock
+      clock[2].append(animated)
+      animated._setFrame(clock[1])
+      animated._row = None
+    else:
+      players = self._players.get(clip)
+      if players == None:
+        players = _ClipPlayers(clip)
+        self._players[clip] = players
+      players.add(animated)
+  
+  def remove(self, animated):
+    clip = animated._clip
+    if animated._row == None:
+      self._clocks[clip][2].remove(animated)
+    else:
+      self._players[clip].remove(animated)
+    animated._system = None
+    animated._row = None
+  
+  def run(self, dt):
+    """Advances every sprite by dt seconds. Returns how many changed frame."""
+    changes = 0
+    for players in self._players.values():
+      changes = changes + players.run(dt)
+    for clip, clock in self._clocks.items():
+      clock[0] = clock[0] + dt
+      frameNum = clip.frameAt(clock[0])
+      if frameNum != clock[1]:
+        clock[1] = frameNum
+        for animated in clock[2]:
+          animated._setFrame(frameNum)
+        changes = changes + len(clock[2])
+    self.frameChanges = changes
+    return changes
@@ -0,0 +1,79 @@
+import sfml
+
+"""Texture atlases. Many small images packed into one texture, so everything
+drawn from them can go through the sprite batch in a single draw call. Parts
+of the atlas are looked up by the name of the image they came from."""
+
+
+def packShelves(sizes, maxSize = 4096, padding = 1):
+  """Packs rectangles into the smallest power-of-two square that holds them,
+  in rows (shelves) of decreasing height. sizes maps names to (w, h). Returns
+  (side, positions), positions mapping names to (x, y). Raises ValueError if
+  they don't fit in maxSize."""
+  order = sorted(sizes, key = lambda name: (-sizes[name][1], -sizes[name][0]))
+  area = 0
+  widest = 0
+  for (w, h) in sizes.values():
+    area = area + (w + padding) * (h + padding)
+    widest = max(widest, w + padding, h + padding)
+  side = 1
+  while side * side < area or side < widest:
+    side = side * 2
+  
+  while side <= maxSize:
+    positions = {}
+    x = 0
+    y = 0
+    shelfHeight = 0
+    for name in order:
+      (w, h) = sizes[name]
+      if x + w + padding > side:
+        # Next shelf.
+        x = 0
+        y = y + shelfHeight
+        shelfHeight = 0
+      if y + h + padding > side:
+        break
+      positions[name] = (x, y)
+      x = x + w + padding
+      shelfHeight = max(shelfHeight, h + padding)
+    if len(positions) == len(order):
+      return (side, positions)
+    side = side * 2
+  raise ValueError("Images do not fit in a %dx%d atlas." % (maxSize, maxSize))
+
+
+class TextureAtlas:
+  """A texture with named regions."""
+  
+  def __init__(self, name, texture, regions):
+    self.name = name
+    self.texture = texture
+    self._regions = regions # Maps name to (x, y, w, h).
+  
+  @staticmethod
+  def build(name, images, maxSize = 4096):
+    """Packs images, a dict of name to sfml.Image, into a new atlas."""
+    sizes = {}
+    for imageName, image in images.items():
+      (w, h) = image.size
+      sizes[imageName] = (int(w), int(h))
+    (side, positions) = packShelves(sizes, maxSize)
+    sheet = sfml.Image.create(side, side, sfml.Color.TRANSPARENT)
+    regions = {}
+    for imageName, (x, y) in positions.items():
+      sheet.blit(images[imageName], (x, y))
+      (w, h) = sizes[imageName]
+      regions[imageName] = (x, y, w, h)
+    return TextureAtlas(name, sfml.Texture.from_image(sheet), regions)
+  
+  def hasRegion(self, name):
+    return name in self._regions
+  
+  def getRegion(self, name):
+    """Returns the (x, y, w, h) part of the texture the named image is in."""
+    return self._regions[name]
+  
+  def getSprite(self, name):
+    (x, y, w, h) = self._regions[name]
+    return sfml.Sprite(self.texture, sfml.Rectangle((x, y), (w, h)))
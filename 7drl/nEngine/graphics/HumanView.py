@@ -6,15 +6,14 @@ from nEngine.Utility import Utility
 from nEngine.Input import Input
 from nEngine.graphics.nGUI import NGUIPane
 from nEngine.graphics.TextManager import TextManager
+from nEngine.graphics.SpriteBatch import SpriteBatch
+from nEngine.graphics.ResourceManager import ResourceManager
 
 """This is the View in the MVC paradigm. It is a singleton that handles all
 drawing and all sorts of things."""
 
 class HumanView():
 
-  # Stores all images using an identifier
-  _textures = {}
-
 
   def init(self, title, graphicsFile):
     """Given the graphics element of the configuration file, parses the
@@ -30,19 +29,22 @@ class HumanView():
     self._window = sfml.RenderWindow(sfml.VideoMode(self.WINDOW_WIDTH, self.WINDOW_HEIGHT), title)
     self._pane = NGUIPane(0, 0, self.WINDOW_WIDTH, self.WINDOW_HEIGHT)
     self._pane.name = "HumanView"
+    # The root composites the layers of its children every frame.
+    self._pane.retained = False
     self.mouseFocus = None
+    self._batch = SpriteBatch(self._window)
+    # Targets drawn to before the layers being redrawn, innermost last.
+    self._targets = []
+    self.layerRedraws = 0
   
   def getPane(self):
     return self._pane
-
+  
     
   def getTexture(self, sourcefile):
-    """Gets the spritesheet in ready-to-use format!"""
-    if not sourcefile in self._textures:
-      image = sfml.Texture.from_file(sourcefile)
-      self._textures[sourcefile] = image
-    
-    return self._textures[sourcefile]
+    """Gets the spritesheet in ready-to-use format! Textures are kept by the
+    ResourceManager."""
+    return ResourceManager.getTexture(sourcefile)
   
   
   def scaleToWindow(self, sprite):
@@ -61,22 +63,53 @@ class HumanView():
   
   
   def draw(self):
+    # Textures decoded in the background since last frame get uploaded.
+    ResourceManager.update()
     self.clear()
-    self._pane.draw(self)
+    self._batch.begin()
+    self.layerRedraws = 0
+    # Whatever moved since last frame is laid out in one go.
+    self._pane.layout()
+    self._pane.render(self)
+    self._batch.end()
+    self._batch.stats["layerRedraws"] = self.layerRedraws
     self._window.display()
-
+  
+  def getDrawStats(self):
+    """Returns the draw-call, vertex and layer counters of the last frame."""
+    return self._batch.stats
+  
+  def beginLayer(self, layer, x, y, w, h):
+    """Sends drawing to a GUI element's layer, a render texture showing the
+    (x, y, w, h) area of the screen, until endLayer."""
+    self._targets.append(self._batch.getTarget())
+    layer.view = sfml.View(sfml.Rectangle((x, y), (w, h)))
+    layer.clear(sfml.Color.TRANSPARENT)
+    self._batch.setTarget(layer)
+    self.layerRedraws = self.layerRedraws + 1
+  
+  def endLayer(self):
+    layer = self._batch.getTarget()
+    self._batch.setTarget(self._targets.pop())
+    layer.display()
+  
   def drawSprite(self, sprite):
     """Draws a surface on the screen. Should probably not be used directly."""
-    self._window.draw(sprite)
+    self._batch.drawSprite(sprite)
+  
+  def drawQuad(self, texture, dest, source, colour = sfml.Color.WHITE):
+    """Draws the source (x, y, w, h) part of a texture, e.g. a spritesheet
+    frame, onto dest (x, y, w, h) of the screen."""
+    self._batch.drawQuad(texture, dest, source, colour)
+  
+  def drawRect(self, colour, x, y, w, h):
+    self._batch.drawRect(colour, x, y, w, h)
+  
+  def drawOutline(self, colour, x, y, w, h, thickness = 1):
+    self._batch.drawOutline(colour, x, y, w, h, thickness)
   
   def drawLine(self, colour, startPos, endPos, width=1):
-    #TODO: Line width not implemented yet
-    lines = sfml.VertexArray(sfml.PrimitiveType.LINES_STRIP, 2)
-    lines[0].position = startPos
-    lines[0].color = colour
-    lines[1].position = endPos
-    lines[1].color = colour
-    self._window.draw(lines)
+    self._batch.drawLine(colour, startPos, endPos, width)
     
   def clear(self, colour = sfml.Color.BLACK):
     self._window.clear(colour)
@@ -86,23 +119,46 @@ class HumanView():
   def onKeyboardEvent(self, event):
     pass
   
+  def onResizeEvent(self, size):
+    """Shows the window at its new size, unstretched, and lays the GUI out
+    again for it."""
+    (w, h) = size
+    self._window.view = sfml.View(sfml.Rectangle((0, 0), (w, h)))
+    self._pane.setSize(w, h)
+  
   def onMouseEvent(self, event):
     print("[WARNING] HumanView.onMouseEvent called. This has never happened before!")
   
+  def _getFocused(self):
+    """The element with mouse focus, if it is still on screen."""
+    if self.mouseFocus == None or self.mouseFocus.getRoot() is not self._pane:
+      return None
+    return self.mouseFocus
+  
+  # Only the element with mouse focus takes wheel and button events, so they
+  # go straight to it rather than down the tree.
+  
   def onMouseWheelEvent(self, event):
-    self._pane._onMouseWheelEvent(event)
+    focused = self._getFocused()
+    if focused != None:
+      focused._onMouseWheelEvent(event)
   
   def onMouseButtonEvent(self, event):
-    self._pane._onMouseButtonEvent(event)
+    focused = self._getFocused()
+    if focused != None:
+      focused._onMouseButtonEvent(event)
   
   def onMouseMoveEvent(self, event):
-    self._pane._onMouseMoveEvent(event)
-    newFocus = self._pane._getMouseFocus(event.position)
+    # Only elements under the mouse, before or after, hear about it.
+    for element in self._pane.getHitGrid().moved(event):
+      element._onMouseMoveEvent(event)
+    newFocus = self._pane.getHitGrid().topmost(event.position)
     if newFocus != self.mouseFocus:
       if self.mouseFocus != None:
         self.mouseFocus._onMouseDefocusEvent(event)
       self.mouseFocus = newFocus
-      self.mouseFocus._onMouseFocusEvent(event)
+      if newFocus != None:
+        newFocus._onMouseFocusEvent(event)
     
   
   
\ No newline at end of file
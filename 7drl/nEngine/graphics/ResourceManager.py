@@ -1,33 +1,256 @@
 import sfml
+import xml.etree.ElementTree as ElementTree
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
 from nEngine.graphics.Animation import Frame, SpriteAnimation
+from nEngine.graphics.Atlas import TextureAtlas
 
 
-class ResourceManager:
+def _decode(sourcefile):
+  """Reads and decodes an image file. Runs on the loader threads."""
+  start = perf_counter()
+  image = sfml.Image.from_file(sourcefile)
+  return (image, perf_counter() - start)
 
+
+class ResourceManager:
+  """Owns every texture, so each file is loaded once whoever asks for it.
+  
+  Files can be decoded ahead of time, on a pool of background threads, from a
+  manifest or a list. Turning decoded images into textures has to happen on
+  the thread drawing, so update() does it a few at a time, once per frame.
+  Asking for a texture that is still on its way only waits for that one
+  file."""
+  
   # Stores all images using an identifier
   _textures = {}
   _animations = {}
   
+  # Decoding in the background: futures of (sfml.Image, seconds) by file,
+  # then decoded images waiting to become textures.
+  _pending = {}
+  _decoded = {}
+  _executor = None
+  WORKERS = 4
+  
+  # Atlases by name, and which atlas each sprite name is in. Atlases still
+  # waiting for images map their name to the list of files they need.
+  _atlases = {}
+  _regions = {}
+  _atlasFiles = {}
+  
+  # Maps file to (seconds decoding, seconds uploading).
+  timings = {}
+  # Maps file to the error decoding it in the background raised.
+  failed = {}
+  
   @staticmethod
-  def preload(sourcefile):
-    """Preloads sourcefile so it's ready before it's asked for."""
-    if not sourcefile in ResourceManager._textures:
-      image = sfml.Texture.from_file(sourcefile)
-      ResourceManager._textures[sourcefile] = image
+  def _getExecutor():
+    if ResourceManager._executor == None:
+      ResourceManager._executor = ThreadPoolExecutor(ResourceManager.WORKERS)
+    return ResourceManager._executor
+  
+  @staticmethod
+  def preloadAsync(sourcefiles):
+    """Starts decoding files in the background."""
+    for sourcefile in sourcefiles:
+      if (sourcefile in ResourceManager._textures or
+          sourcefile in ResourceManager._pending or
+          sourcefile in ResourceManager._decoded):
+        continue
+      ResourceManager._pending[sourcefile] = ResourceManager._getExecutor().submit(_decode, sourcefile)
   
+  @staticmethod
+  def _takeImage(sourcefile, wait):
+    """Returns the decoded image of a file preloaded in the background,
+    waiting for it if wait, or None if it isn't ready."""
+    image = ResourceManager._decoded.pop(sourcefile, None)
+    if image != None:
+      return image
+    future = ResourceManager._pending.get(sourcefile)
+    if future == None or (not wait and not future.done()):
+      return None
+    del ResourceManager._pending[sourcefile]
+    (image, seconds) = future.result()
+    ResourceManager.timings[sourcefile] = (seconds, 0.0)
+    return image
+  
+  @staticmethod
+  def _upload(sourcefile, image):
+    start = perf_counter()
+    texture = sfml.Texture.from_image(image)
+    ResourceManager._textures[sourcefile] = texture
+    (decoding, _) = ResourceManager.timings.get(sourcefile, (0.0, 0.0))
+    ResourceManager.timings[sourcefile] = (decoding, perf_counter() - start)
+    return texture
+  
+  @staticmethod
+  def update(budget = 0.004):
+    """Turns images decoded in the background into textures, and builds the
+    atlases whose images are all in, for up to budget seconds. Call once a
+    frame from the drawing thread."""
+    start = perf_counter()
+    for sourcefile, future in list(ResourceManager._pending.items()):
+      if future.done():
+        try:
+          ResourceManager._decoded[sourcefile] = ResourceManager._takeImage(sourcefile, True)
+        except Exception as error:
+          # Dropped: asking for the file again decodes it again, and raises.
+          print("[ERROR] Could not load " + sourcefile + ": " + str(error))
+          ResourceManager.failed[sourcefile] = error
+  
+    for name, files in list(ResourceManager._atlasFiles.items()):
+      if perf_counter() - start > budget:
+        return
+      if any([sourcefile in ResourceManager.failed for (_, sourcefile) in files]):
+        # It can never be built, so stop waiting for it.
+        print("[ERROR] Atlas " + name + " is missing images.")
+        del ResourceManager._atlasFiles[name]
+        continue
+      if all([sourcefile in ResourceManager._decoded for (_, sourcefile) in files]):
+        ResourceManager._buildAtlas(name)
+  
+    atlasFiles = set()
+    for files in ResourceManager._atlasFiles.values():
+      atlasFiles.update([sourcefile for (_, sourcefile) in files])
+    for sourcefile in list(ResourceManager._decoded):
+      if perf_counter() - start > budget:
+        return
+      if sourcefile not in atlasFiles:
+        ResourceManager._upload(sourcefile, ResourceManager._decoded.pop(sourcefile))
   
+  @staticmethod
+  def isLoaded(sourcefile):
+    return sourcefile in ResourceManager._textures
+  
+  @staticmethod
+  def pendingCount():
+    """Number of files decoding or waiting to become textures."""
+    return len(ResourceManager._pending) + len(ResourceManager._decoded)
+  
+  @staticmethod
+  def preload(sourcefile):
+    """Preloads sourcefile so it's ready before it's asked for."""
+    if sourcefile in ResourceManager._textures:
+      return
+    image = ResourceManager._takeImage(sourcefile, True)
+    if image == None:
+      (image, seconds) = _decode(sourcefile)
+      ResourceManager.timings[sourcefile] = (seconds, 0.0)
+    ResourceManager._upload(sourcefile, image)
+
+
   @staticmethod
   def getTexture(sourcefile):
     """Gets the spritesheet in ready-to-use format!"""
-    ResourceManager.preload(sourcefile)
-    
-    return ResourceManager._textures[sourcefile]
+    texture = ResourceManager._textures.get(sourcefile)
+    if texture == None:
+      ResourceManager.preload(sourcefile)
+      texture = ResourceManager._textures[sourcefile]
+    return texture
+  
+  # ATLASES
+  
+  @staticmethod
+  def addAtlas(name, sprites):
+    """Packs images into an atlas once they are decoded. sprites is a list of
+    (sprite name, file)."""
+    ResourceManager._atlasFiles[name] = list(sprites)
+    ResourceManager.preloadAsync([sourcefile for (_, sourcefile) in sprites])
+  
+  @staticmethod
+  def _buildAtlas(name):
+    start = perf_counter()
+    images = {}
+    for (spriteName, sourcefile) in ResourceManager._atlasFiles.pop(name):
+      image = ResourceManager._takeImage(sourcefile, True)
+      if image == None:
+        (image, seconds) = _decode(sourcefile)
+        ResourceManager.timings[sourcefile] = (seconds, 0.0)
+      images[spriteName] = image
+    atlas = TextureAtlas.build(name, images)
+    ResourceManager._atlases[name] = atlas
+    for spriteName in images:
+      ResourceManager._regions[spriteName] = atlas
+    ResourceManager.timings["atlas:" + name] = (0.0, perf_counter() - start)
+  
+  @staticmethod
+  def getAtlas(name):
+    """Returns the named atlas, waiting for its images if need be."""
+    if name in ResourceManager._atlasFiles:
+      ResourceManager._buildAtlas(name)
+    return ResourceManager._atlases[name]
+  
+  @staticmethod
+  def _getAtlasOf(spriteName):
+    atlas = ResourceManager._regions.get(spriteName)
+    if atlas == None:
+      for name, files in list(ResourceManager._atlasFiles.items()):
+        if spriteName in [sprite for (sprite, _) in files]:
+          return ResourceManager.getAtlas(name)
+      raise KeyError(spriteName)
+    return atlas
+  
+  @staticmethod
+  def getRegion(spriteName):
+    """Returns (texture, (x, y, w, h)) of a sprite packed in an atlas."""
+    atlas = ResourceManager._getAtlasOf(spriteName)
+    return (atlas.texture, atlas.getRegion(spriteName))
+  
+  @staticmethod
+  def getSprite(spriteName):
+    return ResourceManager._getAtlasOf(spriteName).getSprite(spriteName)
+  
+  # MANIFESTS
   
   @staticmethod
-  def loadAnimations(self, XMLRoot):
+  def loadManifest(file):
+    """Starts loading everything a manifest lists, in the background:
+    <resources>
+      <texture>path/to/sheet.png</texture>
+      <atlas name="ui">
+        <sprite name="button">path/to/button.png</sprite>
+      </atlas>
+    </resources>"""
+    XMLroot = ElementTree.parse(file).getroot()
+    textures = [node.text.strip() for node in XMLroot.findall("texture")]
+    ResourceManager.preloadAsync(textures)
+    for atlasNode in XMLroot.findall("atlas"):
+      sprites = [(node.attrib["name"], node.text.strip())
+                 for node in atlasNode.findall("sprite")]
+      ResourceManager.addAtlas(atlasNode.attrib["name"], sprites)
+  
+  @staticmethod
+  def getLoadStats():
+    """Returns how many textures are loaded and pending, and the total
+    seconds spent decoding (in the background) and uploading (on the drawing
+    thread)."""
+    decoding = sum([timing[0] for timing in ResourceManager.timings.values()])
+    uploading = sum([timing[1] for timing in ResourceManager.timings.values()])
+    return {"textures": len(ResourceManager._textures),
+            "atlases": len(ResourceManager._atlases),
+            "pending": ResourceManager.pendingCount(),
+            "failed": len(ResourceManager.failed),
+            "decodeSeconds": decoding,
+            "uploadSeconds": uploading}
+  
+  # ANIMATIONS
+  
+  @staticmethod
+  def loadAnimations(XMLRoot):
+    """Loads the <animation> elements under XMLRoot, compiling each into the
+    clip AnimatedSprites play."""
     for animationRoot in XMLRoot:
       animation = SpriteAnimation()
       animation.loadFromXML(animationRoot)
-      self._animations[animation._name] = animation
-      
-      
\ No newline at end of file
+      animation.compile()
+      ResourceManager._animations[animation._name] = animation
+  
+  @staticmethod
+  def loadAnimationFile(file):
+    ResourceManager.loadAnimations(ElementTree.parse(file).getroot())
+  
+  @staticmethod
+  def getAnimation(name):
+    return ResourceManager._animations[name]
@@ -0,0 +1,160 @@
+import math
+
+import sfml
+
+"""Batched drawing. Instead of one draw call per sprite, rectangle and line,
+quads are collected into vertex arrays, one per run of quads sharing a texture,
+and each run is drawn in a single call. The arrays are kept from one frame to
+the next at the biggest size they ever needed, and vertices are written into
+them in place, so drawing doesn't allocate once they have grown big enough."""
+
+
+class SpriteBatch:
+  """Collects quads for a render target during a frame. Painter's order is
+  kept: a quad with a different texture than the previous one starts a new
+  run, and anything that can't be batched (text, shapes, rotated sprites)
+  flushes the runs so far before being drawn directly. Untextured quads, which
+  rectangles and lines are made of, form runs of their own.
+  
+  Counters for the last frame drawn are kept in stats, for profiling."""
+  
+  def __init__(self, target):
+    self._target = target
+    # Vertex arrays for runs, reused from frame to frame.
+    self._arrays = []
+    self._textures = [] # Texture of each run, None if untextured.
+    self._counts = []   # Vertices used in each run.
+    # Vertices of each array that may still hold a quad from before. Past
+    # them, quads are collapsed to a point, so they draw nothing.
+    self._live = []
+    self._used = 0      # Runs used since the last flush.
+  
+    self.drawCalls = 0
+    self.vertices = 0
+    self.directDraws = 0
+    self.stats = {"drawCalls": 0, "vertices": 0, "directDraws": 0}
+  
+  def setTarget(self, target):
+    """Draws what was batched so far, then batches for another target, e.g. a
+    render texture."""
+    self.flush()
+    self._target = target
+  
+  def getTarget(self):
+    return self._target
+  
+  def begin(self):
+    self._used = 0
+    self.drawCalls = 0
+    self.vertices = 0
+    self.directDraws = 0
+  
+  def end(self):
+    """Draws whatever is left and records this frame's counters."""
+    self.flush()
+    self.stats = {"drawCalls": self.drawCalls, "vertices": self.vertices,
+                  "directDraws": self.directDraws}
+  
+  def _startRun(self, texture):
+    if self._used == len(self._arrays):
+      self._arrays.append(sfml.VertexArray(sfml.PrimitiveType.QUADS, 0))
+      self._textures.append(None)
+      self._counts.append(0)
+      self._live.append(0)
+    self._textures[self._used] = texture
+    self._counts[self._used] = 0
+    self._used = self._used + 1
+  
+  def _addQuad(self, texture, corners, texCorners, colour):
+    """Appends a quad to the current run, starting a new run if the texture
+    differs. corners and texCorners are four (x, y), clockwise from the
+    top-left."""
+    if self._used == 0 or self._textures[self._used - 1] is not texture:
+      self._startRun(texture)
+    run = self._used - 1
+    array = self._arrays[run]
+    n = self._counts[run]
+    if n + 4 > len(array):
+      # New vertices are all at the origin, i.e. collapsed.
+      array.resize(max(64, len(array) * 2))
+    for i in range(4):
+      vertex = array[n + i]
+      vertex.position = corners[i]
+      vertex.color = colour
+      vertex.tex_coords = texCorners[i]
+    self._counts[run] = n + 4
+  
+  def flush(self):
+    """Draws the runs collected so far, one call each."""
+    for run in range(self._used):
+      array = self._arrays[run]
+      count = self._counts[run]
+      # The array keeps its size; what the run didn't fill this time is
+      # collapsed, which only costs anything when the run got shorter.
+      for i in range(count, self._live[run]):
+        array[i].position = (0, 0)
+      self._live[run] = count
+      texture = self._textures[run]
+      if texture == None:
+        self._target.draw(array)
+      else:
+        self._target.draw(array, sfml.RenderStates(texture = texture))
+      self.drawCalls = self.drawCalls + 1
+      self.vertices = self.vertices + count
+    self._used = 0
+  
+  # DRAWING
+  
+  def drawQuad(self, texture, dest, source, colour = sfml.Color.WHITE):
+    """Draws the source (x, y, w, h) rectangle of texture onto the dest
+    (x, y, w, h) rectangle."""
+    (x, y, w, h) = dest
+    (tx, ty, tw, th) = source
+    self._addQuad(texture,
+                  ((x, y), (x + w, y), (x + w, y + h), (x, y + h)),
+                  ((tx, ty), (tx + tw, ty), (tx + tw, ty + th), (tx, ty + th)),
+                  colour)
+  
+  def drawRect(self, colour, x, y, w, h):
+    """Draws a filled, untextured rectangle."""
+    self._addQuad(None, ((x, y), (x + w, y), (x + w, y + h), (x, y + h)),
+                  ((0, 0), (0, 0), (0, 0), (0, 0)), colour)
+  
+  def drawLine(self, colour, startPos, endPos, width = 1):
+    """Draws a line as a thin quad, so it batches with rectangles."""
+    (x0, y0) = startPos
+    (x1, y1) = endPos
+    length = math.hypot(x1 - x0, y1 - y0)
+    if length == 0:
+      return
+    # Half the width, across the line.
+    nx = -(y1 - y0) / length * width / 2
+    ny = (x1 - x0) / length * width / 2
+    self._addQuad(None,
+                  ((x0 + nx, y0 + ny), (x1 + nx, y1 + ny),
+                   (x1 - nx, y1 - ny), (x0 - nx, y0 - ny)),
+                  ((0, 0), (0, 0), (0, 0), (0, 0)), colour)
+  
+  def drawOutline(self, colour, x, y, w, h, thickness = 1):
+    """Draws the outline of a rectangle, inside its bounds."""
+    self.drawRect(colour, x, y, w, thickness)
+    self.drawRect(colour, x, y + h - thickness, w, thickness)
+    self.drawRect(colour, x, y + thickness, thickness, h - 2 * thickness)
+    self.drawRect(colour, x + w - thickness, y + thickness, thickness, h - 2 * thickness)
+  
+  def drawSprite(self, sprite):
+    """Batches plain sprites as quads of their texture. Anything else is
+    drawn straight away, after what was batched before it."""
+    if (isinstance(sprite, sfml.Sprite) and sprite.texture != None and
+        sprite.rotation == 0):
+      bounds = sprite.global_bounds
+      rect = sprite.texture_rect
+      self.drawQuad(sprite.texture,
+                    (bounds.left, bounds.top, bounds.width, bounds.height),
+                    (rect.left, rect.top, rect.width, rect.height),
+                    sprite.color)
+    else:
+      self.flush()
+      self._target.draw(sprite)
+      self.drawCalls = self.drawCalls + 1
+      self.directDraws = self.directDraws + 1
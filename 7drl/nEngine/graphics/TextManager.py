@@ -1,7 +1,55 @@
+from bisect import bisect_right
+from collections import OrderedDict
+
 import sfml
 
 import xml.etree.ElementTree as ElementTree
 
+
+class GlyphTable:
+  """Advances and kerning of a font at one size, looked up from the font once
+  per character (or pair) and then kept, so measuring text is additions."""
+  
+  def __init__(self, font, size, bold):
+    self._font = font
+    self._size = size
+    self._bold = bold
+    self._advances = {}
+    self._kerning = {}
+  
+  def advance(self, char):
+    advance = self._advances.get(char)
+    if advance == None:
+      advance = self._font.get_glyph(ord(char), self._size, self._bold).advance
+      self._advances[char] = advance
+    return advance
+  
+  def kerning(self, first, second):
+    pair = first + second
+    kerning = self._kerning.get(pair)
+    if kerning == None:
+      kerning = self._font.get_kerning(ord(first), ord(second), self._size)
+      self._kerning[pair] = kerning
+    return kerning
+  
+  def prefixWidths(self, text):
+    """Returns the widths of every prefix of text, from the empty one to the
+    whole of it, in a single pass."""
+    widths = [0]
+    total = 0
+    previous = None
+    for char in text:
+      if previous != None:
+        total = total + self.kerning(previous, char)
+      total = total + self.advance(char)
+      widths.append(total)
+      previous = char
+    return widths
+  
+  def width(self, text):
+    return self.prefixWidths(text)[-1]
+
+
 class TextStyle:
   """Contains all the styles that can be used to customise text rendering."""
   
@@ -12,6 +60,8 @@ class TextStyle:
     self.size = int(XMLroot.find("size").text)
     self.parseStyle(XMLroot.find("style").text)
     self.parseColour(XMLroot.find("colour").text)
+    self.glyphs = TextManager.getGlyphTable(self.font, self.size,
+                                            bool(self.style & sfml.Text.BOLD))
   
   def parseStyle(self, text):
     """Parse and save styles."""
@@ -50,11 +100,46 @@ class TextManager:
   """This class contains all functions related to font loading, styles and
   text handling in general."""
   
+  # How many laid out strings and Text objects are kept around.
+  MAX_CACHED = 1024
+  
   @staticmethod
   def init():
     """Initialises the font and style maps."""
     TextManager._styleMap = {}
     TextManager._fontMap = {}
+    # Maps (font, size, bold) to its GlyphTable.
+    TextManager._glyphTables = {}
+    # Maps (style name, string) to its sfml.Text, least recently used first.
+    TextManager._textCache = OrderedDict()
+    # Maps (style name, string, width) to its wrapped lines.
+    TextManager._wrapCache = OrderedDict()
+    # Maps (style name, string) to the widths of its prefixes.
+    TextManager._widthCache = OrderedDict()
+  
+  @staticmethod
+  def getGlyphTable(font, size, bold):
+    """Returns the glyph table shared by every style using the font at that
+    size."""
+    key = (font, size, bold)
+    table = TextManager._glyphTables.get(key)
+    if table == None:
+      table = GlyphTable(font, size, bold)
+      TextManager._glyphTables[key] = table
+    return table
+  
+  @staticmethod
+  def _cached(cache, key):
+    value = cache.get(key)
+    if value != None:
+      cache.move_to_end(key)
+    return value
+  
+  @staticmethod
+  def _store(cache, key, value):
+    cache[key] = value
+    if len(cache) > TextManager.MAX_CACHED:
+      cache.popitem(last = False)
   
   @staticmethod
   def loadFont(XMLroot):
@@ -91,47 +176,107 @@ class TextManager:
   def getStyle(self, styleName):
     return TextManager._styleMap[styleName]  
   
-    
+  @staticmethod
+  def measureText(text, styleName):
+    """Returns the width text takes in the style, without rendering it."""
+    return TextManager._styleMap[styleName].glyphs.width(text)
+  
+  @staticmethod
+  def _prefixWidths(text, styleName):
+    """Widths of every prefix of text in the style, measured once and then
+    cached, as the same labels get fitted frame after frame."""
+    key = (styleName, text)
+    widths = TextManager._cached(TextManager._widthCache, key)
+    if widths == None:
+      widths = TextManager._styleMap[styleName].glyphs.prefixWidths(text)
+      TextManager._store(TextManager._widthCache, key, widths)
+    return widths
+  
+  @staticmethod
+  def fitText(text, styleName, maxWidth, lineEnd = "..."):
+    """Returns the string to show for text in maxWidth: the text itself if it
+    fits, or else the longest start of it that fits followed by lineEnd,
+    found by binary search on the prefix widths."""
+    widths = TextManager._prefixWidths(text, styleName)
+    if widths[-1] <= maxWidth:
+      return text
+    room = maxWidth - TextManager._prefixWidths(lineEnd, styleName)[-1]
+    # Prefixes only get wider, so the longest that fits is where room goes.
+    length = max(bisect_right(widths, room) - 1, 0)
+    return text[:length] + lineEnd
+  
   @staticmethod
   def renderLimitedText(text, styleName, maxWidth, lineEnd = "..."):
     """If the rendered text is longer than width, it returns a new string which
     fits in the required width, with ellipsis (...), by default, at the end."""
-    #TODO: Linear, can probably be made faster.
-    style = TextManager._styleMap[styleName]
-    # create a text
-    textSprite = style.getTextSprite(text)
-    
-    # If it's too large, add line ender
-    if textSprite.local_bounds.width > maxWidth:
-      textSprite.string = textSprite.string + lineEnd
-    
-    # While the text, with line ender, is too large, remove one character
-    while textSprite.local_bounds.width > maxWidth:
-      textSprite.string = textSprite.string[:(-len(lineEnd)-1)] + lineEnd
-      
-    return textSprite
+    return TextManager.renderText(TextManager.fitText(text, styleName, maxWidth, lineEnd),
+                                  styleName)
   
   @staticmethod
   def renderText(text, styleName):
-    """Returns a surface with the text rendered."""
-    return TextManager._styleMap[styleName].getTextSprite(text)
+    """Returns a surface with the text rendered. Text objects are cached and
+    shared, so set their position right before drawing them."""
+    key = (styleName, text)
+    textSprite = TextManager._cached(TextManager._textCache, key)
+    if textSprite == None:
+      textSprite = TextManager._styleMap[styleName].getTextSprite(text)
+      TextManager._store(TextManager._textCache, key, textSprite)
+    return textSprite
   
   @staticmethod
-  def renderWrappedText(text, styleName, maxWidth):
-    """Renders text but wraps it so it doesn't exceed width. Returns a list of
-    surfaces containing each line of the text."""
+  def wrapText(text, styleName, maxWidth):
+    """Returns the tuple of lines text is broken into to fit in maxWidth.
+    Lines are broken between words where possible, inside a word too long for
+    a line of its own otherwise, and at newlines."""
+    key = (styleName, text, maxWidth)
+    lines = TextManager._cached(TextManager._wrapCache, key)
+    if lines != None:
+      return lines
     
+    glyphs = TextManager._styleMap[styleName].glyphs
     lines = []
+    for paragraph in text.split("\n"):
+      widths = glyphs.prefixWidths(paragraph)
+      start = 0
+      space = -1 # Last space on the current line, where it can break.
+      i = 0
+      while i < len(paragraph):
+        if widths[i + 1] - widths[start] <= maxWidth:
+          if paragraph[i] == " ":
+            space = i
+          i = i + 1
+        elif paragraph[i] == " ":
+          # The line is full right at a space: break there.
+          lines.append(paragraph[start:i])
+          start = i + 1
+          i = start
+          space = -1
+        elif space > start:
+          lines.append(paragraph[start:space])
+          start = space + 1
+          space = -1
+        else:
+          # Not even one word fits: break inside it, keeping at least a
+          # character per line.
+          end = max(i, start + 1)
+          lines.append(paragraph[start:end])
+          start = end
+          i = end
+          space = -1
+      if start < len(paragraph) or len(paragraph) == 0:
+        lines.append(paragraph[start:])
     
-    # While there is still text, render limited text, see how much was consumed
-    # and then remove that string from the front of the to-render text
-    while len(text) > 0:
-      line = TextManager.renderLimitedText(text, styleName, maxWidth, "")
-      lines.append(line)
-      text = text[len(line.string):]
-    
+    # A tuple, as it is cached and handed to every caller.
+    lines = tuple(lines)
+    TextManager._store(TextManager._wrapCache, key, lines)
     return lines
-    
-    
-    
-  
\ No newline at end of file
+  
+  @staticmethod
+  def renderWrappedText(text, styleName, maxWidth):
+    """Renders text but wraps it so it doesn't exceed width. Returns a list of
+    surfaces containing each line of the text. Only the line breaks are
+    cached: the Text objects are new, the caller's own to position and keep,
+    even for lines that repeat."""
+    style = TextManager._styleMap[styleName]
+    return [style.getTextSprite(line)
+            for line in TextManager.wrapText(text, styleName, maxWidth)]
@@ -1,12 +1,31 @@
 #TODO : Deal with event.consumed and whether listeners return false...
 
-from sfml import Color, RectangleShape
+import bisect
+import math
+
+from sfml import Color, RenderTexture
 from nEngine.Options import Options
 from nEngine.graphics.TextManager import TextManager
 
 
 class NGUIBase:
-  """A basic area that can receive mouse/keyboard inputs."""
+  """A basic area that can receive mouse/keyboard inputs.
+  
+  Positions are relative to the parent, and to the anchor: (0, 0) puts the
+  element at its parent's top-left corner, (1, 1) its bottom-right corner at
+  the parent's, (0.5, 0.5) centres it. Absolute positions are worked out by
+  layout(), once a frame, and only for elements that were moved, resized or
+  reparented, and whatever moved with them.
+  
+  Elements are retained: what they draw is kept in a layer, a render texture
+  of their own, and only drawn again once invalidate() has been called, e.g.
+  because their focus or text changed. Otherwise the layer is simply pasted
+  back. Elements whose look changes all the time should not be retained."""
+  
+  retained = True
+  # How many pixels outside its bounds the element draws, e.g. for outlines.
+  _bleed = 0
+  
   def __init__(self, x, y, w, h):
     # THe name can be used for debugging purposes.
     self.name = "Theodore"
@@ -20,10 +39,26 @@ class NGUIBase:
     # Absolute x and y positions. These are calculated based on the parent!
     self._ax = x
     self._ay = y
-
+    self._anchor = (0, 0)
+    # The size the children were last laid out in.
+    self._laidSize = (w, h)
+    # Whether the absolute position is out of date, and whether some
+    # descendant's is.
+    self._layoutDirty = True
+    self._childLayoutDirty = False
+  
     # Sprites
     self._sprites = []
     
+    # Hit testing. Roots keep a grid of everything under them, built when
+    # first needed and then kept up to date element by element.
+    self._hitGrid = None
+    
+    # Retained drawing
+    self._dirty = True
+    self._layer = None
+    self._layerSize = None
+    
     # Input
     self._mouseFocus = False  # Is the mouse right on top of this
     self._mouseWithin = False # Is the mouse within the area
@@ -35,9 +70,118 @@ class NGUIBase:
   def setParent(self, parent):
     """Set parent and update absolute position."""
     self._parent = parent
-    if parent != None: # TODO This should go to a recalculate function that can be called from more places.
-      self._ax = parent._ax + self._x
-      self._ay = parent._ay + self._y
+    self._hitGrid = None
+    if parent != None:
+      self.requestLayout()
+      self.invalidate()
+    else:
+      # Not shown anymore, so let the texture go.
+      self._layer = None
+      self._layerSize = None
+      self._dirty = True
+  
+  def invalidate(self):
+    """Marks the element as needing to be drawn again, along with its
+    ancestors, whose layers hold what it drew. New elements start dirty
+    before they have a parent, so the element being dirty already says
+    nothing about its ancestors; theirs does."""
+    self._dirty = True
+    element = self._parent
+    while element != None and not element._dirty:
+      element._dirty = True
+      element = element._parent
+  
+  # LAYOUT
+  
+  def setPosition(self, x, y):
+    """Moves the element, relative to its parent and anchor."""
+    if (x, y) != (self._x, self._y):
+      self._x = x
+      self._y = y
+      self.requestLayout()
+  
+  def setSize(self, w, h):
+    if (w, h) != (self._w, self._h):
+      self._w = w
+      self._h = h
+      self.requestLayout()
+  
+  def setAnchor(self, horizontal, vertical):
+    """Where in the parent the position is measured from, as fractions of
+    the room left around the element."""
+    if (horizontal, vertical) != self._anchor:
+      self._anchor = (horizontal, vertical)
+      self.requestLayout()
+  
+  def requestLayout(self):
+    """Marks the absolute position as out of date, for the next layout()."""
+    self._layoutDirty = True
+    element = self._parent
+    while element != None and not element._childLayoutDirty:
+      element._childLayoutDirty = True
+      element = element._parent
+  
+  def _getChildren(self):
+    return ()
+  
+  def _place(self):
+    """Works out the absolute position. Returns whether the bounds changed."""
+    parent = self._parent
+    if parent == None:
+      ax = self._x
+      ay = self._y
+    else:
+      (horizontal, vertical) = self._anchor
+      ax = parent._ax + self._x
+      ay = parent._ay + self._y
+      if horizontal != 0:
+        ax = ax + horizontal * (parent._w - self._w)
+      if vertical != 0:
+        ay = ay + vertical * (parent._h - self._h)
+    if (ax, ay) == (self._ax, self._ay) and (self._w, self._h) == self._laidSize:
+      return False
+    self._ax = ax
+    self._ay = ay
+    self._laidSize = (self._w, self._h)
+    self.boundsChanged()
+    self.invalidate()
+    return True
+  
+  def layout(self):
+    """Brings absolute positions up to date under this element. Goes down
+    only the branches that asked for it, and past an element only if its
+    bounds actually changed. Called on the root once a frame."""
+    if self._layoutDirty:
+      self._layoutDirty = False
+      if self._place():
+        for child in self._getChildren():
+          child._layoutDirty = True
+        self._childLayoutDirty = True
+    if self._childLayoutDirty:
+      self._childLayoutDirty = False
+      for child in self._getChildren():
+        child.layout()
+  
+  def boundsChanged(self):
+    """Call after moving or resizing the element, so mouse hits are tested
+    against where it is now. Only its own cells of the grid are updated."""
+    grid = self.getRoot()._hitGrid
+    if grid != None:
+      grid.move(self)
+  
+  def getHitGrid(self):
+    """The grid of everything under this element, for finding what is under
+    the mouse. Only roots are asked for one."""
+    # Anything moved since is put where it belongs first, updating the grid.
+    self.layout()
+    if self._hitGrid == None:
+      self._hitGrid = NGUIHitGrid(self)
+    return self._hitGrid
+  
+  def _walk(self):
+    """Yields the element and everything under it, parents before children,
+    bottom to top as they are drawn."""
+    yield self
   
   def getRoot(self):
     if self._parent == None:
@@ -115,9 +259,11 @@ class NGUIBase:
     # Consumed!
     return False
   
-
+  
   def _onMouseEnterEvent(self, event):
     self._mouseWithin = True
+    if Options.DEBUG:
+      self.invalidate()
     for listener in self._listeners:
       try:
         listener.onMouseEnterEvent(event)
@@ -126,6 +272,8 @@ class NGUIBase:
   
   def _onMouseExitEvent(self, event):
     self._mouseWithin = False
+    if Options.DEBUG:
+      self.invalidate()
     #self._removeMouseFocus()
     for listener in self._listeners:
       try:
@@ -144,6 +292,7 @@ class NGUIBase:
     
   def _onMouseFocusEvent(self, event):
     self._mouseFocus = True
+    self.invalidate()
     for listener in self._listeners:
       try:
         listener.onMouseFocusEvent(event)
@@ -152,24 +301,48 @@ class NGUIBase:
   
   def _onMouseDefocusEvent(self, event):
     self._mouseFocus = False
+    self.invalidate()
     for listener in self._listeners:
       try:
         listener.onMouseDefocusEvent(event)
       except AttributeError:
         pass
     
-  # EVENT CALLBACKS
-
+  # DRAWING
+  
+  def render(self, view):
+    """Draws the element where it belongs: through its layer if retained,
+    redrawing the layer only if invalidated."""
+    if not self.retained:
+      self.draw(view)
+      # Drawn afresh every frame, so whatever holds it must be too.
+      self._dirty = False
+      self.invalidate()
+      return
+    
+    bleed = self._bleed
+    x = self._ax - bleed
+    y = self._ay - bleed
+    w = int(math.ceil(self._w)) + 2 * bleed
+    h = int(math.ceil(self._h)) + 2 * bleed
+    if w <= 0 or h <= 0:
+      return
+    if self._layerSize != (w, h):
+      self._layer = RenderTexture(w, h)
+      self._layerSize = (w, h)
+      self._dirty = True
+    if self._dirty:
+      view.beginLayer(self._layer, x, y, w, h)
+      self.draw(view)
+      view.endLayer()
+      self._dirty = False
+    view.drawQuad(self._layer.texture, (x, y, w, h), (0, 0, w, h))
+  
   def draw(self, view):
+    """Draws the element itself, in absolute coordinates."""
     if Options.DEBUG:
       if self._mouseWithin == True:
-        r = RectangleShape()
-        r.outline_color = Color.RED
-        r.outline_thickness = 3
-        r.fill_color = Color.TRANSPARENT
-        r.position = (self._ax, self._ay)
-        r.size = (self._w, self._h)
-        view.drawSprite(r)
+        view.drawOutline(Color.RED, self._ax, self._ay, self._w, self._h, 3)
       if self._mouseFocus:
         view.drawLine(Color.RED, (self._ax, self._ay),
                                  (self._ax + self._w, self._ay + self._h))
@@ -188,13 +361,7 @@ class NGUIPane(NGUIBase):
   def __init__(self, x, y, w, h, backgroundColour = None):
     NGUIBase.__init__(self, x, y, w, h)
     self._children = []
-    if backgroundColour == None:
-      self._background = None
-    else:
-      self._background = RectangleShape()
-      self._background.fill_color = backgroundColour
-      self._background.position = (self._ax, self._ay)
-      self._background.size = (self._w, self._h)
+    self._background = backgroundColour
   
   
   def _checkMouseOnChild(self, position):
@@ -207,6 +374,8 @@ class NGUIPane(NGUIBase):
   
   # Events: these must be passed on to its contents. They only apply here
   # if they were not consumed by the children. THE CHILDREEEEN!
+  # Mouse events aren't: HumanView finds the elements under the mouse in the
+  # hit grid and hands the events to each of them directly.
   
   def _onKeyboardEvent(self, event):
     for child in reversed(self._children):
@@ -214,27 +383,6 @@ class NGUIPane(NGUIBase):
         return True
     return False
   
-  def _onMouseWheelEvent(self, event):
-    for child in reversed(self._children):
-      if child._onMouseWheelEvent(event):
-        return True
-    
-    return NGUIBase._onMouseWheelEvent(self, event)
-  
-  def _onMouseButtonEvent(self, event):
-    for child in reversed(self._children):
-      if child._onMouseButtonEvent(event):
-        return True
-    
-    return NGUIBase._onMouseButtonEvent(self, event)
-  
-  def _onMouseMoveEvent(self, event):
-    for child in reversed(self._children):
-      if child._onMouseMoveEvent(event):
-        return True
-    
-    return NGUIBase._onMouseMoveEvent(self, event)
-  
   # MOUSE FOCUS
   
   def _getMouseFocus(self, position):
@@ -253,31 +401,55 @@ class NGUIPane(NGUIBase):
   
   # HIERARCHY
   
+  def _getChildren(self):
+    return self._children
+  
+  def _walk(self):
+    yield self
+    for child in self._children:
+      for element in child._walk():
+        yield element
+  
   def addChild(self, child):
     child.setParent(self)
     self._children.append(child)
+    grid = self.getRoot()._hitGrid
+    if grid != None:
+      grid.add(child)
   
   def removeChild(self, child):
+    grid = self.getRoot()._hitGrid
+    if grid != None:
+      grid.remove(child)
     child.setParent(None)
     self._children.remove(child)
+    self.invalidate()
  
   def clear(self):
+    grid = self.getRoot()._hitGrid
+    for child in self._children:
+      if grid != None:
+        grid.remove(child)
+      child.setParent(None)
     self._children = []
+    self.invalidate()
   
   # DRAWING
   
   def draw(self, view):
     if self._background != None:
-      self._background.position = (self._ax, self._ay)
-      view.drawSprite(self._background)
+      view.drawRect(self._background, self._ax, self._ay, self._w, self._h)
     for child in self._children:
-      child.draw(view)
+      child.render(view)
     NGUIBase.draw(self, view)
     
 
 
 
 class NGUIFrame(NGUIPane):
+  # The right and bottom edges are drawn on the bounds.
+  _bleed = 1
+  
   def __init__(self, x, y, w, h, backgroundColour = Color.BLACK, frameColour = Color.WHITE, thickness=1, title = None, style = "default"):
     NGUIPane.__init__(self, x, y, w, h, backgroundColour)
     self._title = title
@@ -298,6 +470,8 @@ class NGUIFrame(NGUIPane):
 
 
 class NGUIBasicButton(NGUIBase):
+  _bleed = 1
+  
   def __init__(self, x, y, w, h, text):
     NGUIPane.__init__(self, x, y, w, h)
     self._primed = False
@@ -325,18 +499,30 @@ class NGUIBasicButton(NGUIBase):
     self._margin = margin
     textSprite = TextManager.renderText(self.text, self.style)
     rect = textSprite.local_bounds
-    self._w = rect.width + self._margin*2
-    self._h = rect.height + self._margin*2
+    self.setSize(rect.width + self._margin*2, rect.height + self._margin*2)
+    self.invalidate()
+  
+  @property
+  def text(self):
+    return self._text
+  
+  @text.setter
+  def text(self, text):
+    self._text = text
+    self.invalidate()
   
   
   def onMouseDownEvent(self, event):
     self._primed = True
+    self.invalidate()
     
   def onMouseUpEvent(self, event):
     self._primed = False
+    self.invalidate()
   
   def onMouseDefocusEvent(self, event):
     self._primed = False
+    self.invalidate()
   
   
   def draw(self, view):
@@ -348,13 +534,9 @@ class NGUIBasicButton(NGUIBase):
       self.drawButton(view, self.backgroundColour, self.outlineColour, self.style)
   
   def drawButton(self, view, bacgroundColour, outlineColour, style):
-    r = RectangleShape()
-    r.outline_color = outlineColour
-    r.outline_thickness = 1
-    r.fill_color = bacgroundColour
-    r.position = (self._ax, self._ay)
-    r.size = (self._w, self._h)
-    view.drawSprite(r)
+    # The outline goes just outside the button, as RectangleShape's did.
+    view.drawRect(bacgroundColour, self._ax, self._ay, self._w, self._h)
+    view.drawOutline(outlineColour, self._ax - 1, self._ay - 1, self._w + 2, self._h + 2)
     
     textSprite = TextManager.renderText(self.text, style)
     rect = textSprite.local_bounds
@@ -362,7 +544,7 @@ class NGUIBasicButton(NGUIBase):
     # Something to do with text alignment, perhaps? :)
     textSprite.position = (self._ax + self._w // 2 - (rect.width // 2) - rect.left,
                            self._ay + self._h // 2 - (rect.height // 2) - rect.top)
-
+  
     view.drawSprite(textSprite)
     
 
@@ -380,6 +562,122 @@ class NGUIImage(NGUIBase):
 
 
 
+class NGUIHitGrid:
+  """Finds the elements under a point without going through the whole tree.
+  The screen is cut into square cells, each listing the elements overlapping
+  it, so only the few in the point's cell are tested.
+  
+  Elements are ranked in drawing order, so the topmost hit is the last one
+  drawn; that is the one _getMouseFocus would have found. A rank is the path
+  of sequence numbers from the root, and children are only ever appended, so
+  ranks stay in order as elements come and go. Adding, removing or moving an
+  element only touches the cells it covers."""
+  
+  CELL = 64
+  
+  def __init__(self, root):
+    self._cells = {}  # Maps (cx, cy) to (rank, element) pairs, bottom to top.
+    self._rank = {}   # Maps element to its rank.
+    self._bounds = {} # Maps element to the (left, top, right, bottom) cells it covers.
+    self._counter = 0
+    self._rank[root] = ()
+    self._place(root)
+    for child in root._getChildren():
+      self.add(child)
+  
+  def add(self, element):
+    """Takes in an element just added to the tree, and everything under it."""
+    for descendant in element._walk():
+      self._counter = self._counter + 1
+      self._rank[descendant] = self._rank[descendant._parent] + (self._counter,)
+      self._place(descendant)
+  
+  def remove(self, element):
+    """Forgets an element about to leave the tree, and everything under it."""
+    for descendant in element._walk():
+      if descendant in self._rank:
+        self._unplace(descendant)
+        del self._rank[descendant]
+  
+  def move(self, element):
+    """Puts an element in the cells it covers now."""
+    if element not in self._rank:
+      return
+    if self._cellsOf(element) != self._bounds[element]:
+      self._unplace(element)
+      self._place(element)
+  
+  def _cellsOf(self, element):
+    """The (left, top, right, bottom) cells the element covers."""
+    cell = NGUIHitGrid.CELL
+    return (int(math.floor(element._ax / cell)),
+            int(math.floor(element._ay / cell)),
+            int(math.floor((element._ax + element._w) / cell)),
+            int(math.floor((element._ay + element._h) / cell)))
+  
+  def _place(self, element):
+    bounds = self._cellsOf(element)
+    self._bounds[element] = bounds
+    entry = (self._rank[element], element)
+    (left, top, right, bottom) = bounds
+    for cx in range(left, right + 1):
+      for cy in range(top, bottom + 1):
+        entries = self._cells.setdefault((cx, cy), [])
+        # Ranks are unique, so elements themselves are never compared.
+        if len(entries) == 0 or entries[-1][0] < entry[0]:
+          entries.append(entry)
+        else:
+          bisect.insort(entries, entry)
+  
+  def _unplace(self, element):
+    entry = (self._rank[element], element)
+    (left, top, right, bottom) = self._bounds.pop(element)
+    for cx in range(left, right + 1):
+      for cy in range(top, bottom + 1):
+        entries = self._cells[(cx, cy)]
+        del entries[bisect.bisect_left(entries, entry)]
+        if len(entries) == 0:
+          del self._cells[(cx, cy)]
+  
+  def _candidates(self, position):
+    """The elements in the position's cell, bottom to top."""
+    (mx, my) = position
+    cell = NGUIHitGrid.CELL
+    entries = self._cells.get((int(math.floor(mx / cell)), int(math.floor(my / cell))), ())
+    return [element for (_, element) in entries]
+  
+  def topmost(self, position):
+    """The topmost element under position, or None."""
+    for element in reversed(self._candidates(position)):
+      if element._checkMousePosition(position):
+        return element
+    return None
+  
+  def hits(self, position):
+    """Every element under position, top to bottom."""
+    return [element for element in reversed(self._candidates(position))
+            if element._checkMousePosition(position)]
+  
+  def moved(self, event):
+    """Every element under the mouse before or after it moved, top to bottom,
+    the order they used to hear about it in."""
+    before = self._candidates(event.oldPosition)
+    after = self._candidates(event.position)
+    if before == after:
+      candidates = before
+    else:
+      # Both cells' elements, merged back into drawing order.
+      candidates = dict([(element, True) for element in before])
+      for element in after:
+        candidates[element] = True
+      candidates = sorted(candidates, key = self._rank.get)
+    return [element for element in reversed(candidates)
+            if element._checkMousePosition(event.position) or
+               element._checkMousePosition(event.oldPosition)]
+
+
+
+
 class DebugEventListener:
   def __init__(self, base):
     self._base = base 
@@ -8,15 +8,6 @@ class DamageComponent(Component):
 class BulletCollisionComponent(Component):
   pass
   
-class RangeComponent(Component):
-  def __init__(self, entity):
-    Component.__init__(self, entity)
-    self.range = None
-  
-  def init(self, XMLRoot):
-    Component.init(self, XMLRoot)
-    self.distance = 0
-
 class ShootingComponent(Component):
   def __init__(self, entity):
     Component.__init__(self, entity)
@@ -26,8 +17,16 @@ class ShootingComponent(Component):
 class WeaponComponent(Component):
   def __init__(self, entity):
     Component.__init__(self, entity)
+    self.weapon = None
     
-  def init(self, XMLRoot):
-    Component.init(self, XMLRoot)
-    self.weapon = EntityFactory.getSingleton().produce(self._entity.world, self.weaponName)
+  def init(self, values):
+    Component.init(self, values)
+    self.weapon = EntityFactory.getSingleton().produce(self._entity._world, self.weaponName)
+  
+  def onRemove(self):
+    """The weapon goes with its owner, back to the pool if there is one, so a
+    reused owner gets a reused weapon instead of leaking the old one."""
+    if self.weapon != None:
+      self._entity._world.removeEntity(self.weapon)
+      self.weapon = None
   
\ No newline at end of file
@@ -1,6 +1,8 @@
 from nEngine.Game import GameManager
 from nEngine.graphics.TextManager import TextManager
 from nEngine.graphics.HumanView import HumanView
+from nEngine.graphics.ResourceManager import ResourceManager
+from nEngine.Entities import EntityFactory
 
 from planet5521.States import MainMenuState
 
@@ -12,6 +14,9 @@ class Planet5521(GameManager):
     self.humanView = HumanView()
     self.humanView.init("Planet 5521", "planet5521/data/graphics.xml")
     TextManager.loadFromFile("planet5521/data/fonts.xml")
+    # Decoded in the background while the window comes up.
+    ResourceManager.loadManifest("planet5521/data/resources.xml")
+    EntityFactory.getSingleton().readFile("planet5521/data/entities.xml")
     
     self._currentState = MainMenuState(self.humanView)
 
@@ -3,6 +3,8 @@ from nEngine.Input import Input
 
 
 class HumanViewProcess(Process):
+  """Feeds input to the human view every simulation step. Drawing is left to
+  the state's render(), which runs at its own rate."""
   def __init__(self, humanView):
     Process.__init__(self)
     self._humanView = humanView
@@ -10,7 +12,16 @@ class HumanViewProcess(Process):
     
   def run(self, dt):
     Input.processInput()
-    self._humanView.draw()
+
+
+class WorldProcess(Process):
+  """Ticks an entity world every simulation step, so its systems run."""
+  def __init__(self, world):
+    Process.__init__(self)
+    self._world = world
+  
+  def run(self, dt):
+    self._world.tick(dt)
   
 
 
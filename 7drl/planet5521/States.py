@@ -1,7 +1,11 @@
 from nEngine.Game import GameState
-from planet5521.Processes import HumanViewProcess
+from nEngine.Entities import EntityFactory, EntityPool, World
+from nEngine.common.Systems import MovementSystem, RangedMovementSystem
+from planet5521.Processes import HumanViewProcess, WorldProcess
+from planet5521.Systems import TargetSystem, BulletCollisionSystem
 from nEngine.graphics.ResourceManager import ResourceManager
 from nEngine.graphics.nGUI import NGUIImage, NGUIBasicButton
+from nEngine.common.Components import PositionComponent
 from sfml import Sprite, Color
 
 class MainMenuState(GameState):
@@ -29,16 +33,72 @@ class MainMenuState(GameState):
     self._startButton.backgroundColourFocus = self._exitButton.backgroundColourFocus = Color(80, 25, 25, 200)
     self._startButton.backgroundColourPrimed = self._exitButton.backgroundColourPrimed = Color(80, 25, 25, 255)
     
+    self._startButton.addListener(self)
+    
     self._humanView.getPane().addChild(self._startButton)
     self._humanView.getPane().addChild(self._exitButton)
     
-    # Make humanview visible
+    # Feed input to the humanview; render() draws it
     self._pm.processList.append(HumanViewProcess(self._humanView)) 
   
+  def onMouseUpEvent(self, event):
+    """The start button was clicked."""
+    self._nextState = BattleState(self._humanView)
+    self.done = True
+  
+  def render(self, alpha):
+    self._humanView.draw()
+  
   def terminate(self):
     """Does final computation on this game state before it is removed."""
     self._humanView.getPane().clear()
     
   def nextState(self):
     """By default returns no next state."""
-    return self._nextState
\ No newline at end of file
+    return self._nextState
+
+
+def createWorld():
+  """Returns a world with the systems that simulate a battle, in the order
+  they must tick: things move, units are rehashed, then bullets hit."""
+  world = World()
+  world.pool = EntityPool()
+  movement = MovementSystem(world)
+  world.addSystem(movement)
+  world.addSystem(RangedMovementSystem(world))
+  targets = TargetSystem(world)
+  # Bullets have no HP, so only units moved by the MovementSystem need
+  # rehashing.
+  targets.watch(movement)
+  world.addSystem(targets)
+  world.addSystem(BulletCollisionSystem(world))
+  return world
+
+
+class BattleState(GameState):
+  """Two squads facing each other across the field."""
+  def __init__(self, humanView):
+    GameState.__init__(self)
+    self._humanView = humanView
+    
+  def initialise(self):
+    self.world = createWorld()
+    targets = self.world.getSystem(TargetSystem)
+    
+    factory = EntityFactory.getSingleton()
+    for i in range(5):
+      for (name, x) in [("XCC Grunt", 200), ("YTR Grunt", 1000)]:
+        unit = factory.produce(self.world, name)
+        position = unit.getComponent(PositionComponent)
+        position.x = x
+        position.y = 200 + i * 80
+        targets.positionChanged(unit)
+    
+    self._pm.processList.append(HumanViewProcess(self._humanView))
+    self._pm.processList.append(WorldProcess(self.world))
+  
+  def render(self, alpha):
+    self._humanView.draw()
+  
+  def terminate(self):
+    self._humanView.getPane().clear()
\ No newline at end of file
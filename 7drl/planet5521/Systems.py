@@ -0,0 +1,149 @@
+from math import floor
+
+from nEngine.Entities import System
+from nEngine.SpatialHash import SpatialHash
+from nEngine.common.Components import PositionComponent, HPComponent
+from planet5521.Components import DamageComponent, BulletCollisionComponent
+
+
+class TargetSystem(System):
+  """Keeps everything that can be shot, i.e. has HP, in a spatial hash so
+  bullets can find what they hit without looking at every unit. Must tick after
+  movement and before BulletCollisionSystem."""
+  
+  components = (PositionComponent, HPComponent)
+  
+  # Units are treated as circles of this radius when testing for hits.
+  radius = 8
+  
+  def __init__(self, world):
+    System.__init__(self, world)
+    # Cells of twice the radius mean a hit test never looks at more than 4.
+    self.index = SpatialHash(self.radius * 2)
+    self._positions = {} # Maps entity to its PositionComponent.
+    self._cells = {} # Maps entity to the cell it was last hashed in.
+    # Units whose position may have changed since the last tick. A dict used
+    # as an ordered set.
+    self._dirty = {}
+    # Systems whose movedEntities() say which units moved, e.g. a
+    # MovementSystem.
+    self._movers = []
+    self.moved = 0
+  
+  def watch(self, system):
+    """Rebuckets whatever system reports as moved on each tick. It must tick
+    before this one."""
+    self._movers.append(system)
+  
+  def positionChanged(self, entity):
+    """Call after setting a unit's position by hand, e.g. teleporting it, so
+    it is rebucketed on the next tick."""
+    if entity in self._cells:
+      self._dirty[entity] = True
+  
+  def addEntity(self, entity):
+    System.addEntity(self, entity)
+    position = entity.getComponent(PositionComponent)
+    self._positions[entity] = position
+    self.index.insert(entity, position.x or 0, position.y or 0)
+    self._cells[entity] = self.index.cellOf(position.x or 0, position.y or 0)
+  
+  def removeEntity(self, entity):
+    System.removeEntity(self, entity)
+    del self._positions[entity]
+    del self._cells[entity]
+    self._dirty.pop(entity, None)
+    self.index.remove(entity)
+  
+  def tick(self, dt):
+    """Moves units between cells. Only units that moved are looked at, and
+    only those that crossed a cell boundary are taken out of their bucket and
+    put in the new one. Units standing still cost nothing."""
+    cells = self._cells
+    dirty = self._dirty
+    for system in self._movers:
+      for entity in system.movedEntities():
+        if entity in cells:
+          dirty[entity] = True
+    
+    cellSize = self.index.cellSize
+    positions = self._positions
+    move = self.index.move
+    moved = 0
+    for entity in dirty:
+      position = positions[entity]
+      x = position.x
+      y = position.y
+      cell = (floor(x / cellSize), floor(y / cellSize))
+      if cell != cells[entity]:
+        move(entity, x, y)
+        cells[entity] = cell
+        moved = moved + 1
+    self._dirty = {}
+    # How many units changed cell on the last tick.
+    self.moved = moved
+  
+  def hitTest(self, x, y):
+    """Returns a unit overlapping point (x, y), or None."""
+    radiusSquared = self.radius * self.radius
+    for entity in self.index.query(x, y, self.radius):
+      position = self._positions[entity]
+      dx = position.x - x
+      dy = position.y - y
+      if dx * dx + dy * dy <= radiusSquared:
+        return entity
+    return None
+
+
+class BulletCollisionSystem(System):
+  """Checks every bullet against the TargetSystem's hash, then applies all the
+  damage in one batch: bullets that hit are removed, and so are the units they
+  killed."""
+  
+  components = (PositionComponent, DamageComponent, BulletCollisionComponent)
+  
+  def __init__(self, world):
+    System.__init__(self, world)
+    self._bullets = {} # Maps entity to (PositionComponent, DamageComponent).
+  
+  def addEntity(self, entity):
+    System.addEntity(self, entity)
+    self._bullets[entity] = (entity.getComponent(PositionComponent),
+                             entity.getComponent(DamageComponent))
+  
+  def removeEntity(self, entity):
+    System.removeEntity(self, entity)
+    del self._bullets[entity]
+  
+  def findHits(self):
+    """Returns a list of (bullet, damage, target) for every bullet touching a
+    unit."""
+    targets = self._world.getSystem(TargetSystem)
+    hitTest = targets.hitTest
+    hits = []
+    for bullet, (position, damage) in self._bullets.items():
+      target = hitTest(position.x, position.y)
+      if target != None:
+        hits.append((bullet, damage.damage, target))
+    return hits
+  
+  def tick(self, dt):
+    hits = self.findHits()
+    if len(hits) == 0:
+      return
+    
+    dead = {}
+    for bullet, damage, target in hits:
+      hp = target.getComponent(HPComponent)
+      hp.HP = hp.HP - damage
+      if hp.HP <= 0:
+        dead[target] = True
+    
+    for bullet, _, _ in hits:
+      self._world.removeEntity(bullet)
+    for target in dead:
+      self.kill(target)
+  
+  def kill(self, entity):
+    """Called for each unit whose HP dropped to 0. Reimplement for corpses."""
+    self._world.removeEntity(entity)
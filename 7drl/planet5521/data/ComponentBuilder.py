@@ -7,7 +7,7 @@ componentBuilder = {
   "HPComponent": nEngine.common.Components.HPComponent,
   "DamageComponent": planet5521.Components.DamageComponent,
   "BulletCollisionComponent": planet5521.Components.BulletCollisionComponent,
-  "RangeComponent": planet5521.Components.RangeComponent,
+  "RangeComponent": nEngine.common.Components.RangeComponent,
   "ShootingComponent": planet5521.Components.ShootingComponent,
   "WeaponComponent": planet5521.Components.WeaponComponent
 }
\ No newline at end of file
@@ -40,7 +40,7 @@ frame1.addListener(PriorityListener(frame1))
 frame2.addListener(PriorityListener(frame2))
 button.addListener(PriorityListener(button))
 
-Input.init(ElementTree.parse('NausicaaRL/data/keys.xml').getroot(), h)
+Input.init(h, ElementTree.parse('NausicaaRL/data/keys.xml').getroot())
 
 while True:
   Input.processInput()
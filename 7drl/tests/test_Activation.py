@@ -0,0 +1,40 @@
+from nEngine.Activation import Timeline
+
+
+def test_due_activations_run_in_order():
+  timeline = Timeline()
+  calls = []
+  timeline.schedule(5, calls.append, ["late"])
+  timeline.schedule(2, calls.append, ["early"])
+  timeline.schedule(2, calls.append, ["early, second"])
+  timeline.run(3)
+  assert calls == ["early", "early, second"]
+  assert timeline.now == 3
+  timeline.run(2)
+  assert calls == ["early", "early, second", "late"]
+  assert len(timeline) == 0
+
+
+def test_returned_delay_reschedules():
+  timeline = Timeline()
+  turns = []
+  def act():
+    turns.append(timeline.now)
+    return 3
+  timeline.schedule(1, act)
+  timeline.runUntil(10)
+  assert turns == [1, 4, 7, 10]
+  assert len(timeline) == 1
+
+
+def test_cancelled_activations_are_skipped():
+  timeline = Timeline()
+  calls = []
+  activations = [timeline.schedule(i, calls.append, [i]) for i in range(100)]
+  for activation in activations[:90]:
+    timeline.cancel(activation)
+  assert len(timeline) == 10
+  moved = timeline.reschedule(activations[95], 200)
+  timeline.run(150)
+  assert calls == [90, 91, 92, 93, 94, 96, 97, 98, 99]
+  assert timeline.peek() is moved
@@ -0,0 +1,87 @@
+import numpy
+import pytest
+
+pytest.importorskip("sfml")
+# Before Animation, which it imports from.
+from nEngine.graphics.ResourceManager import ResourceManager
+from nEngine.graphics.Animation import AnimationClip, AnimatedSprite, AnimationSystem, Frame, SpriteAnimation
+from sfml import Rectangle
+
+
+def animation(durations):
+  frames = [Frame(Rectangle((i * 10, 0), (10, 10)), duration)
+            for i, duration in enumerate(durations)]
+  return SpriteAnimation("texture", frames, "test")
+
+def clip(durations):
+  return AnimationClip("test", "texture", [(i, 0, 1, 1) for i in range(len(durations))], durations)
+
+
+def test_uniform_frame_lookup():
+  uniform = clip([0.25, 0.25, 0.25, 0.25])
+  assert uniform.uniform == 0.25
+  assert [uniform.frameAt(t) for t in [0, 0.24, 0.25, 0.9, 1.0, 1.3]] == [0, 0, 1, 3, 0, 1]
+  assert uniform.framesAt(numpy.array([0.24, 0.5, 1.3])).tolist() == [0, 2, 1]
+
+def test_bisect_frame_lookup():
+  uneven = clip([3, 1])
+  assert uneven.uniform == None
+  assert [uneven.frameAt(t) for t in [0, 2.9, 3, 3.9, 4, 7.5]] == [0, 0, 1, 1, 0, 1]
+  assert uneven.framesAt(numpy.array([2.9, 3.1, 4.1])).tolist() == [0, 1, 0]
+
+def test_looping_and_clamped_playback():
+  uneven = clip([3, 1])
+  assert uneven.frameAt(4.5, True) == 0
+  assert uneven.frameAt(4.5, False) == 1
+  assert uneven.frameAt(100, False) == 1
+  
+  system = AnimationSystem()
+  looping = AnimatedSprite(animation([3, 1]))
+  clamped = AnimatedSprite(animation([3, 1]))
+  clamped.loop = False
+  system.add(looping)
+  system.add(clamped)
+  system.run(4.5)
+  assert looping.getFrameNum() == 0
+  assert clamped.getFrameNum() == 1
+
+def test_durations_must_be_positive():
+  with pytest.raises(ValueError):
+    clip([0, 0])
+  with pytest.raises(ValueError):
+    clip([0.5, -1])
+  with pytest.raises(ValueError):
+    clip([])
+
+def test_sprites_in_a_system_only_advance_once():
+  system = AnimationSystem()
+  sprite = AnimatedSprite(animation([1, 1]))
+  system.add(sprite)
+  sprite.run(0.6)
+  system.run(0.6)
+  assert sprite.getFrameNum() == 0
+  system.run(0.6)
+  assert sprite.getFrameNum() == 1
+
+def test_changes_after_adding_reach_the_system():
+  system = AnimationSystem()
+  sprite = AnimatedSprite(animation([1, 1]))
+  system.add(sprite)
+  sprite.multiplier = 2.0
+  system.run(0.6)
+  assert sprite.getFrameNum() == 1
+  sprite.loop = False
+  system.run(10)
+  assert sprite.getFrameNum() == 1
+
+def test_synchronised_sprites_share_a_clock():
+  system = AnimationSystem()
+  windmills = animation([1, 1, 1])
+  first = AnimatedSprite(windmills)
+  system.add(first, True)
+  system.run(1.5)
+  second = AnimatedSprite(windmills)
+  system.add(second, True)
+  assert second.getFrameNum() == 1
+  assert system.run(1.0) == 2
+  assert first.getFrameNum() == second.getFrameNum() == 2
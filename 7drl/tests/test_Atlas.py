@@ -0,0 +1,33 @@
+import xml.etree.ElementTree as ElementTree
+
+import pytest
+
+pytest.importorskip("sfml")
+# Before Animation, which it imports from.
+from nEngine.graphics.ResourceManager import ResourceManager
+from nEngine.graphics.Animation import SpriteAnimation
+from nEngine.graphics.Atlas import TextureAtlas, packShelves
+
+
+def test_shelves_do_not_overlap():
+  sizes = {"a": (30, 20), "b": (30, 10), "c": (10, 10), "d": (60, 5)}
+  (side, positions) = packShelves(sizes)
+  assert side == 64
+  rects = [(x, y, x + sizes[name][0], y + sizes[name][1])
+           for name, (x, y) in positions.items()]
+  for i, (left, top, right, bottom) in enumerate(rects):
+    assert right <= side and bottom <= side
+    for (otherLeft, otherTop, otherRight, otherBottom) in rects[i + 1:]:
+      assert (right <= otherLeft or otherRight <= left or
+              bottom <= otherTop or otherBottom <= top)
+
+
+def test_animation_frames_are_cut_from_the_atlas(monkeypatch):
+  atlas = TextureAtlas("units", "atlas texture", {"sprites": (64, 32, 100, 50)})
+  monkeypatch.setattr(ResourceManager, "_regions", {"sprites": atlas})
+  animation = SpriteAnimation()
+  animation.loadFromXML(ElementTree.fromstring(
+    '<animation name="walk" sprite="sprites"><frame>5,4,9,16,0.25</frame></animation>'))
+  clip = animation.compile()
+  assert clip.texture == "atlas texture"
+  assert clip.rects.tolist() == [[69, 36, 9, 16]]
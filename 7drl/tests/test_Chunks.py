@@ -0,0 +1,58 @@
+from random import Random
+
+import numpy
+
+from nEngine.RLEngine.Chunks import ChunkedGenerator, chunkSeed
+from nEngine.RLEngine.FreeSpace import FreeSpace
+from NausicaaRL.VillageChunks import generateChunk
+
+
+def test_same_seed_gives_same_chunks():
+  first = ChunkedGenerator(generateChunk, 100, 70, 32, 1234).generate(1)
+  again = ChunkedGenerator(generateChunk, 100, 70, 32, 1234).generate(1)
+  assert len(first) == 4 * 3
+  for ((chunk, terrain, placements), (_, terrainAgain, placementsAgain)) in zip(first, again):
+    assert (terrain == terrainAgain).all()
+    assert placements == placementsAgain
+    for (name, x, y, w, h) in placements:
+      assert chunk.x <= x and x + w <= chunk.x + chunk.w
+      assert chunk.y <= y and y + h <= chunk.y + chunk.h
+
+
+def test_regenerated_chunk_matches_and_seeds_differ():
+  generator = ChunkedGenerator(generateChunk, 100, 70, 32, 1234)
+  (_, _, placements) = generator.generate(1)[1 * 4 + 1]
+  assert generator.regenerate(1, 1)[2] == placements
+  assert chunkSeed(1234, 1, 1) != chunkSeed(1234, 1, 0)
+  assert chunkSeed(1234, 1, 1) != chunkSeed(1235, 1, 1)
+
+
+def test_scatter_density_does_not_depend_on_chunk_size():
+  for chunkSize in [32, 64]:
+    counts = {}
+    spots = {}
+    for (_, _, placements) in ChunkedGenerator(generateChunk, 128, 128, chunkSize, 7).generate(1):
+      for (name, x, y, w, h) in placements:
+        counts[name] = counts.get(name, 0) + 1
+        spots.setdefault(name, set()).add((x, y))
+    assert counts == {"rock": 80, "pebble": 480, "windmill": 160}
+    # Pebbles come in pairs.
+    assert len(spots["pebble"]) == 240
+
+
+def test_free_space_reset_updates_footprints():
+  free = numpy.ones((6, 6), numpy.bool_)
+  space = FreeSpace(free)
+  assert space.count(2, 2) == 25
+  space.occupy(0, 0, 6, 6)
+  assert space.count(2, 2) == 0
+  assert space.sample(Random(1), 2, 2) == None
+
+  area = numpy.zeros((3, 3), numpy.bool_)
+  area[1:, 1:] = True
+  space.reset(2, 2, area)
+  assert space.count(1, 1) == 4
+  assert space.count(2, 2) == 1
+  assert space.sample(Random(1), 2, 2) == (3, 3)
+  assert space.isFree(3, 3, 2, 2)
+  assert not space.isFree(2, 2, 2, 2)
@@ -0,0 +1,67 @@
+import pytest
+
+from nEngine.RLEngine.Contents import TileContents, blueprintName
+
+
+class Blueprint:
+  def __init__(self, name):
+    self.name = name
+
+
+class OldEntity:
+  """An RLEngine entity: blueprint in bp, properties on itself."""
+  def __init__(self, name, **properties):
+    self.bp = Blueprint(name)
+    for key, value in properties.items():
+      setattr(self, key, value)
+
+
+def test_old_entities_are_indexed_by_name_and_capability():
+  contents = TileContents()
+  rock = OldEntity("rock", passable = False)
+  sword = OldEntity("ceramic sword", pickup = True)
+  contents[rock] = True
+  contents.add(sword)
+  assert blueprintName(rock) == "rock"
+  assert contents.getEntity("rock") is rock
+  assert contents.withCapability("pickable") == [sword]
+  assert not contents.passable
+  del contents[rock]
+  assert contents.passable
+  assert contents.getEntity("rock") == None
+
+
+def test_reindex_follows_changed_capabilities():
+  contents = TileContents()
+  gate = OldEntity("fence gate", openable = True, isOpen = False, passable = False)
+  contents.add(gate)
+  assert contents.withCapability("openable") == [gate]
+  gate.isOpen = True
+  gate.passable = True
+  contents.reindex(gate)
+  assert contents.withCapability("closable") == [gate]
+  assert contents.passable
+
+
+def test_engine_entities_use_blueprint_and_components():
+  pytest.importorskip("sfml")
+  from nEngine.Entities import Component, Entity, World
+
+  class CarriedComponent(Component):
+    capabilities = ("pickable",)
+
+  class SolidComponent(Component):
+    def __init__(self, entity):
+      Component.__init__(self, entity)
+      self.passable = False
+
+  world = World()
+  entity = Entity(world)
+  entity.blueprint = Blueprint("crate")
+  entity.addComponents([CarriedComponent(entity), SolidComponent(entity)])
+
+  contents = TileContents()
+  contents.add(entity)
+  assert contents.getEntity("crate") is entity
+  assert contents.withCapability("pickable") == [entity]
+  assert contents.withCapability("blocking") == [entity]
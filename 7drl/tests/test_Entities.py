@@ -0,0 +1,66 @@
+import xml.etree.ElementTree as ElementTree
+
+import pytest
+
+pytest.importorskip("sfml")
+from nEngine.Entities import Component, EntityFactory, EntityPool, World
+from planet5521.Components import WeaponComponent
+
+ENTITIES = """<entities>
+  <entity name="soldier">
+    <HPComponent><HPMax>10</HPMax></HPComponent>
+    <WeaponComponent><weaponName>rifle</weaponName></WeaponComponent>
+  </entity>
+  <entity name="rifle">
+    <HPComponent><HPMax>1</HPMax></HPComponent>
+  </entity>
+</entities>"""
+
+
+class HPComponent(Component):
+  pass
+
+
+@pytest.fixture
+def factory(monkeypatch):
+  factory = EntityFactory()
+  factory._componentBuilder = {"HPComponent": HPComponent,
+                               "WeaponComponent": WeaponComponent}
+  factory.readFromXML(ElementTree.fromstring(ENTITIES))
+  monkeypatch.setattr(EntityFactory, "_singleton", factory)
+  return factory
+
+
+def makeWorld():
+  world = World()
+  world.pool = EntityPool()
+  return world
+
+
+def test_handles_of_reused_entities_go_stale(factory):
+  world = makeWorld()
+  rifle = factory.produce(world, "rifle")
+  handle = rifle.handle()
+  assert world.getEntity(handle) is rifle
+  world.removeEntity(rifle)
+  assert world.getEntity(handle) == None
+
+  again = factory.produce(world, "rifle")
+  assert again is rifle
+  assert world.getEntity(handle) == None
+  assert world.getEntity(again.handle()) is again
+  assert world.pool.hits == 1
+
+
+def test_reused_owner_does_not_leak_its_weapon(factory):
+  world = makeWorld()
+  soldier = factory.produce(world, "soldier")
+  rifle = soldier.getComponent(WeaponComponent).weapon
+  world.removeEntity(soldier)
+  assert world.getEntity(rifle.handle()) == None
+
+  for _ in range(3):
+    soldier = factory.produce(world, "soldier")
+    assert soldier.getComponent(WeaponComponent).weapon is rifle
+    world.removeEntity(soldier)
+  assert len(world._entities) == 0
@@ -0,0 +1,91 @@
+from nEngine.RLEngine.Contents import TileContents
+from nEngine.RLEngine.FOV import FieldOfView
+from nEngine.RLEngine.TileMap import TileMap
+
+
+def makeMap():
+  smap = TileMap(60, 20, None)
+  smap.defineTerrain("grass", True)
+  smap.defineTerrain("wall", False)
+  smap.fill("grass")
+  return smap
+
+
+def test_walls_block_sight():
+  smap = makeMap()
+  smap.fill("wall", 5, 0, 1, 20)
+  fov = FieldOfView(smap)
+  visible = fov.compute(2, 10, 6)
+  assert (5, 10) in visible
+  assert (6, 10) not in visible
+  assert fov.isVisible(2, 10, 4, 12, 6)
+  assert not fov.isVisible(2, 10, 2, 17, 6)
+
+
+def test_changes_only_drop_nearby_results():
+  smap = makeMap()
+  fov = FieldOfView(smap)
+  near = fov.compute(5, 10, 4)
+  far = fov.compute(50, 10, 4)
+  assert fov.compute(5, 10, 4) is near
+  assert fov.hits == 1
+
+  smap.setFlag(7, 10, TileMap.OPAQUE)
+  assert fov.compute(50, 10, 4) is far
+  blocked = fov.compute(5, 10, 4)
+  assert blocked is not near
+  assert (8, 10) in near and (8, 10) not in blocked
+
+  # Contents that don't block sight change nothing, even if they block
+  # movement.
+  smap.setFlag(6, 10, TileMap.CONTENTS | TileMap.BLOCKED)
+  assert fov.compute(5, 10, 4) is blocked
+  smap.setFlag(7, 10, TileMap.OPAQUE, False)
+  assert fov.compute(5, 10, 4) == near
+
+
+def test_many_viewers_see_what_each_would_alone():
+  smap = makeMap()
+  smap.fill("wall", 10, 5, 1, 10)
+  fov = FieldOfView(smap)
+  origins = [(8, 8), (12, 9), (9, 14), (8, 8)]
+  together = fov.computeMany(origins, 5)
+  fov.clear()
+  for origin in origins:
+    assert together[origin] == fov.compute(origin[0], origin[1], 5)
+
+
+class Tile:
+  def __init__(self):
+    self.contents = TileContents()
+
+
+class Thing:
+  def __init__(self, **properties):
+    self.__dict__.update(properties)
+
+
+def test_opaque_contents_block_sight():
+  smap = TileMap(20, 20, lambda name, x, y: Tile())
+  smap.defineTerrain("grass", True)
+  smap.fill("grass")
+  fov = FieldOfView(smap)
+  smap.getTile(6, 10).contents.add(Thing(passable = False))
+  smap.getTile(10, 6).contents.add(Thing(passable = False, opaque = False))
+  smap.refresh(6, 10)
+  smap.refresh(10, 6)
+  assert smap.hasFlag(6, 10, TileMap.OPAQUE)
+  assert not smap.hasFlag(10, 6, TileMap.OPAQUE)
+  visible = fov.compute(10, 10, 6)
+  assert (5, 10) not in visible
+  assert (10, 5) in visible
+  
+  gate = Thing(passable = False)
+  tile = smap.getTile(12, 10)
+  tile.contents.add(gate)
+  smap.refresh(12, 10)
+  assert (13, 10) not in fov.compute(10, 10, 6)
+  gate.passable = True
+  tile.contents.reindex(gate)
+  smap.refresh(12, 10)
+  assert (13, 10) in fov.compute(10, 10, 6)
@@ -0,0 +1,78 @@
+import xml.etree.ElementTree as ElementTree
+
+import pytest
+
+pytest.importorskip("sfml")
+import nEngine.Input
+from nEngine.Input import Input, Events, GameEvent
+
+
+class WindowEvent:
+  """Compares equal to its sfml event class, as sfml's events do."""
+  def __init__(self, kind, **attributes):
+    self.kind = kind
+    self.__dict__.update(attributes)
+  
+  def __eq__(self, other):
+    return other is self.kind
+
+class View:
+  def __init__(self, events):
+    self._window = self
+    self.events = events
+    self.received = []
+  
+  def onMouseMoveEvent(self, event):
+    self.received.append(("move", event.oldPosition, event.position))
+  
+  def onKeyboardEvent(self, event):
+    self.received.append(("key", event))
+
+class Keyboard:
+  A = 0
+  B = 1
+  UP = 73
+
+KEYS = """<keyconfig>
+  <event><name>OPEN</name><keys>A</keys></event>
+  <event><name>CLOSE</name><keys>A,B</keys><type>DOORS</type></event>
+  <event><name>MOVE_UP</name><keys>UP</keys><type>MOVEMENT</type></event>
+</keyconfig>"""
+
+
+def move(x, y):
+  return WindowEvent(nEngine.Input.MouseMoveEvent, position=(x, y))
+
+def key(code):
+  return WindowEvent(nEngine.Input.KeyEvent, code=code)
+
+
+def test_mouse_moves_collapse_to_the_last():
+  view = View([move(1, 1), move(2, 2), move(3, 3)])
+  Input.init(view)
+  Input.processInput()
+  assert view.received == [("move", (0, 0), (3, 3))]
+  assert Input.stats == {"events": 3, "mouseMoves": 3, "mouseMovesSent": 1}
+
+def test_mouse_moves_are_sent_before_what_follows(monkeypatch):
+  monkeypatch.setattr(nEngine.Input, "Keyboard", Keyboard)
+  view = View([move(1, 1), move(2, 2), key(Keyboard.B), move(5, 5)])
+  Input.init(view, ElementTree.fromstring(KEYS))
+  Input.processInput()
+  assert [event[0] for event in view.received] == ["move", "key", "move"]
+  assert view.received[0] == ("move", (0, 0), (2, 2))
+  assert view.received[2] == ("move", (2, 2), (5, 5))
+
+def test_events_are_found_in_the_bitmask(monkeypatch):
+  monkeypatch.setattr(nEngine.Input, "Keyboard", Keyboard)
+  Input.init(View([]), ElementTree.fromstring(KEYS))
+  gameEvent = Input.generateGameEvent(Keyboard.A)
+  assert Events.OPEN in gameEvent and Events.CLOSE in gameEvent
+  assert not Events.MOVE_UP in gameEvent
+  assert gameEvent.mask == (1 << Events.OPEN) | (1 << Events.CLOSE)
+  assert Input.containsEventOfType(gameEvent, "DOORS") == Events.CLOSE
+  assert Input.containsEventOfType(gameEvent, "MOVEMENT") == None
+  assert not Input.isEvent(Keyboard.UP + 1)
+  
+  built = GameEvent([Events.MOVE_UP])
+  assert Events.MOVE_UP in built and not Events.OPEN in built
@@ -0,0 +1,61 @@
+import numpy
+
+from nEngine.RLEngine.Pathfinding import Pathfinder
+from nEngine.RLEngine.TileMap import TileMap
+from NausicaaRL.VillageChunks import TERRAINS
+
+
+def makeMap():
+  smap = TileMap(12, 8, None)
+  for (name, passable, roughness) in TERRAINS:
+    smap.defineTerrain(name, passable, roughness)
+  smap.fill("grass")
+  return smap
+
+
+def distances(paths):
+  """The distances of the "goal" map, brought up to date."""
+  dijkstraMap = paths.getMap("goal")
+  dijkstraMap.distance(0, 0)
+  return dijkstraMap.dist.copy()
+
+
+def fresh(smap, goals):
+  """Distances computed from scratch on the map as it is now."""
+  paths = Pathfinder(smap)
+  paths.setGoals("goal", goals)
+  return distances(paths)
+
+
+def test_terrain_roughness_comes_from_the_tile_blueprints():
+  roughness = dict([(name, roughness) for (name, _, roughness) in TERRAINS])
+  assert roughness["dirt road"] < roughness["grass"]
+  assert not dict([(name, passable) for (name, passable, _) in TERRAINS])["wall"]
+
+
+def test_dijkstra_map_follows_cost_changes():
+  smap = makeMap()
+  paths = Pathfinder(smap)
+  paths.setGoals("goal", [(0, 0)])
+  assert paths.distance("goal", 11, 0) == 11
+
+  # A road makes the way cheaper.
+  smap.fill("dirt road", 1, 0, 11, 1)
+  # Ten road cells at 0.5, then the grass of the goal.
+  assert paths.distance("goal", 11, 0) == 6
+  assert (distances(paths) == fresh(smap, [(0, 0)])).all()
+
+  # A wall across the road makes it dearer, and the way goes around it.
+  smap.fill("wall", 5, 0, 1, 7)
+  assert (distances(paths) == fresh(smap, [(0, 0)])).all()
+  assert paths.step("goal", 6, 0) == (0, 1)
+  smap.fill("wall", 5, 7, 1, 1)
+  assert paths.distance("goal", 11, 0) == numpy.inf
+  assert paths.step("goal", 11, 0) == (0, 0)
+
+  # Blocked contents count too, through the flags.
+  smap.fill("grass", 5, 7, 1, 1)
+  smap.setFlag(5, 7, TileMap.BLOCKED)
+  assert paths.distance("goal", 11, 0) == numpy.inf
+  smap.setFlag(5, 7, TileMap.BLOCKED, False)
+  assert (distances(paths) == fresh(smap, [(0, 0)])).all()
@@ -0,0 +1,25 @@
+import pytest
+
+pytest.importorskip("sfml")
+import nEngine.graphics.ResourceManager as resources
+from nEngine.graphics.ResourceManager import ResourceManager
+
+
+def test_files_failing_to_decode_are_dropped(monkeypatch):
+  def decode(sourcefile):
+    raise IOError("bad " + sourcefile)
+  monkeypatch.setattr(resources, "_decode", decode)
+  for name in ["_textures", "_pending", "_decoded", "_atlasFiles", "failed", "timings"]:
+    monkeypatch.setattr(ResourceManager, name, {})
+  
+  ResourceManager.preloadAsync(["broken.png"])
+  ResourceManager.addAtlas("ui", [("button", "broken button.png")])
+  ResourceManager._pending["broken.png"].exception()
+  ResourceManager._pending["broken button.png"].exception()
+  ResourceManager.update()
+  ResourceManager.update()
+  assert sorted(ResourceManager.failed) == ["broken button.png", "broken.png"]
+  assert ResourceManager.pendingCount() == 0
+  assert ResourceManager._atlasFiles == {}
+  with pytest.raises(IOError):
+    ResourceManager.getTexture("broken.png")
@@ -0,0 +1,19 @@
+from nEngine.SpatialHash import SpatialHash
+
+
+def test_move_only_rebuckets_on_cell_change():
+  index = SpatialHash(16)
+  index.insert("a", 1, 1)
+  index.insert("b", 2, 2)
+  assert not index.move("a", 15, 15)
+  assert index.move("a", 17, 1)
+  assert index.cellOf(17, 1) == (1, 0)
+  assert index.query(1, 1, 0) == ["b"]
+  assert index.query(20, 1, 0) == ["a"]
+  index.move("b", -1, 2)
+  assert index.query(1, 1, 0) == []
+  assert sorted(index.query(0, 0, 16)) == ["a", "b"]
+  index.remove("a")
+  index.remove("b")
+  assert len(index) == 0
+  assert index._cells == {}
@@ -0,0 +1,53 @@
+import pytest
+
+sfml = pytest.importorskip("sfml")
+from nEngine.graphics.SpriteBatch import SpriteBatch
+
+
+class Target:
+  def __init__(self):
+    self.draws = []
+
+  def draw(self, drawable, states = None):
+    self.draws.append(drawable)
+
+
+def positions(array):
+  return [tuple(array[i].position) for i in range(len(array))]
+
+
+def test_arrays_keep_their_size_and_collapse_what_is_left_over():
+  target = Target()
+  batch = SpriteBatch(target)
+  batch.begin()
+  for i in range(20):
+    batch.drawRect(sfml.Color.WHITE, i, 0, 1, 1)
+  batch.end()
+  array = batch._arrays[0]
+  size = len(array)
+  assert size >= 80
+  assert batch.stats["vertices"] == 80
+  assert target.draws == [array]
+
+  batch.begin()
+  batch.drawRect(sfml.Color.WHITE, 5, 5, 2, 2)
+  batch.end()
+  assert batch._arrays[0] is array
+  assert len(array) == size
+  assert batch.stats == {"drawCalls": 1, "vertices": 4, "directDraws": 0}
+  assert positions(array)[:4] == [(5, 5), (7, 5), (7, 7), (5, 7)]
+  assert set(positions(array)[4:]) == set([(0, 0)])
+
+
+def test_texture_changes_start_runs(monkeypatch):
+  # Stand-ins for textures, which need a graphics context.
+  monkeypatch.setattr(sfml, "RenderStates", lambda texture: texture)
+  batch = SpriteBatch(Target())
+  batch.begin()
+  batch.drawQuad("a", (0, 0, 1, 1), (0, 0, 1, 1))
+  batch.drawQuad("a", (1, 0, 1, 1), (0, 0, 1, 1))
+  batch.drawQuad("b", (2, 0, 1, 1), (0, 0, 1, 1))
+  batch.drawRect(sfml.Color.WHITE, 0, 0, 1, 1)
+  batch.end()
+  assert batch.stats["drawCalls"] == 3
+  assert batch._counts[:3] == [8, 4, 4]
@@ -0,0 +1,98 @@
+import os
+
+import numpy
+
+from nEngine.RLEngine.Contents import TileContents, blueprintName
+from nEngine.RLEngine.Streaming import StreamingMap, entityState, restoreEntityState
+from nEngine.RLEngine.TileMap import TileMap
+
+TERRAINS = [("grass", True, 1.0), ("wall", False, 1.0)]
+
+
+class Blueprint:
+  def __init__(self, name):
+    self.name = name
+
+
+class Item:
+  def __init__(self, name):
+    self.bp = Blueprint(name)
+    self.growth = 0
+    self.parent = None
+
+
+class Tile:
+  def __init__(self, x, y):
+    self.x = x
+    self.y = y
+    self.contents = TileContents()
+
+
+def generator(chunk):
+  terrain = numpy.zeros((chunk.h, chunk.w), numpy.uint8)
+  return (chunk, terrain, [("cereal", chunk.x + 1, chunk.y + 1, 1, 1)])
+
+
+class Listener:
+  """Does what StreamingVillage does, without an entity manager."""
+  def __init__(self):
+    self.destroyed = []
+
+  def populateChunk(self, chunk, placements):
+    for (name, x, y, w, h) in placements:
+      self.smap.getTile(x, y).contents.add(Item(name))
+
+  def saveTile(self, tile):
+    return [(blueprintName(item), entityState(item)) for item in tile.contents]
+
+  def loadTile(self, x, y, data):
+    tile = self.smap.getTile(x, y)
+    for (name, state) in data:
+      item = Item(name)
+      restoreEntityState(item, state)
+      tile.contents.add(item)
+
+  def unloadTile(self, tile):
+    self.destroyed.extend(tile.contents)
+
+
+def makeMap(cacheDir):
+  listener = Listener()
+  smap = StreamingMap(8, 1234, generator, TERRAINS, lambda name, x, y: Tile(x, y),
+                      listener, cacheDir, radius = 0, maxChunks = 1)
+  listener.smap = smap
+  return (smap, listener)
+
+
+def test_evicted_chunk_comes_back_as_it_was_left(tmp_path):
+  (smap, listener) = makeMap(str(tmp_path))
+  smap.streamAround(0, 0)
+  crop = smap.getTile(1, 1).contents.getEntity("cereal")
+  crop.growth = 5
+  smap.setFlag(3, 3, 1)
+  # Actors aren't saved with the chunk.
+  smap.setFlag(4, 4, TileMap.ACTOR)
+
+  # Far enough away that the first chunk gets evicted.
+  smap.streamAround(100, 100)
+  assert not smap.isLoaded(0, 0)
+  assert crop in listener.destroyed
+
+  smap.streamAround(0, 0)
+  assert smap.loads == 1
+  reloaded = smap.getTile(1, 1).contents.getEntity("cereal")
+  assert reloaded is not crop
+  assert reloaded.growth == 5
+  assert smap.hasFlag(3, 3, 1)
+  assert not smap.hasFlag(4, 4, TileMap.ACTOR)
+
+
+def test_close_removes_cache(tmp_path):
+  cacheDir = os.path.join(str(tmp_path), "cache")
+  (smap, listener) = makeMap(cacheDir)
+  smap.streamAround(0, 0)
+  smap.streamAround(100, 100)
+  assert len(os.listdir(cacheDir)) == 1
+  smap.close(True)
+  assert not os.path.exists(cacheDir)
+  assert len(listener.destroyed) == 2
@@ -0,0 +1,75 @@
+from nEngine.Entities import Entity, World
+from nEngine.common.Components import PositionComponent, VelocityComponent, HPComponent
+from nEngine.common.Systems import MovementSystem
+from planet5521.Components import DamageComponent, BulletCollisionComponent
+from planet5521.Systems import TargetSystem, BulletCollisionSystem
+
+
+def setUp():
+  world = World()
+  movement = MovementSystem(world)
+  world.addSystem(movement)
+  targets = TargetSystem(world)
+  targets.watch(movement)
+  world.addSystem(targets)
+  world.addSystem(BulletCollisionSystem(world))
+  return world
+
+def unit(world, x, y, HP, vx=0):
+  entity = Entity(world)
+  position = PositionComponent(entity)
+  position.x = x
+  position.y = y
+  velocity = VelocityComponent(entity)
+  velocity.vx = vx
+  velocity.vy = 0
+  hp = HPComponent(entity)
+  hp.HP = HP
+  entity.addComponents([position, velocity, hp])
+  return entity
+
+def bullet(world, x, y, damage):
+  entity = Entity(world)
+  position = PositionComponent(entity)
+  position.x = x
+  position.y = y
+  damageComponent = DamageComponent(entity)
+  damageComponent.damage = damage
+  entity.addComponents([position, damageComponent, BulletCollisionComponent(entity)])
+  return entity
+
+
+def test_bullets_damage_and_kill():
+  world = setUp()
+  tough = unit(world, 0, 0, 10)
+  weak = unit(world, 100, 100, 5)
+  hit = bullet(world, 2, 2, 3)
+  kill = bullet(world, 101, 99, 5)
+  miss = bullet(world, 50, 50, 5)
+  world.tick(0)
+  assert tough.getComponent(HPComponent).HP == 7
+  assert not hit.id in world._entities
+  assert not kill.id in world._entities
+  assert not weak.id in world._entities
+  assert miss.id in world._entities
+  assert tough.id in world._entities
+  assert world.getSystem(TargetSystem).hitTest(100, 100) == None
+
+def test_only_moved_units_are_rehashed():
+  world = setUp()
+  targets = world.getSystem(TargetSystem)
+  still = unit(world, 0, 0, 10)
+  walker = unit(world, 8, 0, 10, vx=100)
+  world.tick(0.1)
+  assert list(targets._dirty) == []
+  assert targets.moved == 1
+  assert targets.hitTest(18, 0) is walker
+  assert targets.hitTest(0, 0) is still
+  
+  # Teleporting isn't seen by the MovementSystem, so it must be reported.
+  position = still.getComponent(PositionComponent)
+  position.x = 200
+  targets.positionChanged(still)
+  world.tick(0)
+  assert targets.moved == 1
+  assert targets.hitTest(200, 0) is still
@@ -0,0 +1,68 @@
+import pytest
+
+pytest.importorskip("sfml")
+from nEngine.graphics.TextManager import GlyphTable, TextManager
+
+
+class Glyph:
+  def __init__(self, advance):
+    self.advance = advance
+
+
+class Font:
+  """Every character is 10 wide, but "AV" kerns together by 2."""
+  def __init__(self):
+    self.lookups = 0
+
+  def get_glyph(self, code, size, bold):
+    self.lookups = self.lookups + 1
+    return Glyph(10)
+
+  def get_kerning(self, first, second, size):
+    if (chr(first), chr(second)) == ("A", "V"):
+      return -2
+    return 0
+
+
+class Style:
+  def __init__(self):
+    self.glyphs = GlyphTable(Font(), 12, False)
+
+  def getTextSprite(self, text):
+    return [text]
+
+
+@pytest.fixture(autouse = True)
+def style():
+  TextManager.init()
+  style = Style()
+  TextManager._styleMap["plain"] = style
+  return style
+
+
+def test_glyphs_are_looked_up_once(style):
+  assert TextManager.measureText("AVA", "plain") == 28
+  assert TextManager.measureText("AAAA", "plain") == 40
+  assert style.glyphs._font.lookups == 2
+
+
+def test_fit_text():
+  assert TextManager.fitText("short", "plain", 50) == "short"
+  assert TextManager.fitText("much longer", "plain", 70) == "much..."
+  assert TextManager.fitText("much longer", "plain", 25) == "..."
+  assert TextManager.fitText("AVAVAV", "plain", 50) == "AV..."
+  # Measured once, then fitted to any width from the cached prefix widths.
+  assert ("plain", "much longer") in TextManager._widthCache
+  assert TextManager.fitText("much longer", "plain", 80) == "much ..."
+
+
+def test_wrapped_lines_are_separate_objects():
+  lines = TextManager.renderWrappedText("same same same", "plain", 40)
+  assert lines == [["same"], ["same"], ["same"]]
+  assert lines[0] is not lines[1]
+  again = TextManager.renderWrappedText("same same same", "plain", 40)
+  assert again[0] is not lines[0]
+  assert TextManager.wrapText("same same same", "plain", 40) is \
+         TextManager.wrapText("same same same", "plain", 40)
+  # Shared by every caller, so it can't be changed under the cache.
+  assert TextManager.wrapText("same same same", "plain", 40) == ("same", "same", "same")
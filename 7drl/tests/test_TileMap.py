@@ -0,0 +1,109 @@
+import numpy
+
+from nEngine.RLEngine.Contents import TileContents
+from nEngine.RLEngine.TileMap import TileMap
+
+
+class Tile:
+  def __init__(self, name, x, y):
+    self.name = name
+    self.x = x
+    self.y = y
+    self.contents = TileContents()
+
+
+class Rock:
+  passable = False
+
+
+class Listener:
+  def __init__(self):
+    self.changes = []
+
+  def cellsChanged(self, x, y, w = 1, h = 1, sight = True):
+    self.changes.append((x, y, w, h, sight))
+
+
+def makeMap():
+  built = []
+  def build(name, x, y):
+    built.append((x, y))
+    return Tile(name, x, y)
+  smap = TileMap(8, 6, build)
+  assert smap.defineTerrain("grass") == 0
+  assert smap.defineTerrain("mud", True, 3.0) == 1
+  assert smap.defineTerrain("wall", False) == 2
+  return (smap, built)
+
+
+def test_fill_sets_terrain_passability_and_roughness():
+  (smap, _) = makeMap()
+  listener = Listener()
+  smap.listeners.append(listener)
+  smap.fill("grass")
+  smap.fill("mud", 2, 1, 3, 2)
+  smap.setTerrain(7, 5, "wall")
+  assert listener.changes == [(0, 0, 8, 6, True), (2, 1, 3, 2, True), (7, 5, 1, 1, True)]
+  assert smap.getTerrainName(2, 1) == "mud"
+  assert smap.getTerrainName(5, 1) == "grass"
+  assert (smap.roughness[1:3, 2:5] == 3.0).all()
+  assert smap.roughness.sum() == 8 * 6 + 6 * 2.0
+  assert not smap.canPass(7, 5)
+  assert smap.passabilityMap().sum() == 8 * 6 - 1
+
+  smap.setTerrainIDs(0, 4, numpy.array([[2, 2], [1, 0]], numpy.uint8))
+  assert smap.getTerrainName(1, 4) == "wall"
+  assert smap.getTerrainName(0, 5) == "mud"
+  assert not smap.canPassArea(0, 4, 2, 2)
+  assert smap.canPassArea(0, 5, 2, 1)
+
+def test_flags():
+  (smap, _) = makeMap()
+  smap.fill("grass")
+  listener = Listener()
+  smap.listeners.append(listener)
+  smap.setFlag(3, 3, TileMap.CONTENTS)
+  assert smap.hasFlag(3, 3, TileMap.CONTENTS)
+  assert smap.canPass(3, 3)
+  # Only what can be walked or seen through concerns listeners.
+  assert listener.changes == []
+
+  smap.setFlag(3, 3, TileMap.BLOCKED)
+  assert not smap.canPass(3, 3)
+  assert not smap.blocksSight(3, 3)
+  smap.setFlag(3, 3, TileMap.OPAQUE)
+  assert smap.blocksSight(3, 3)
+  assert listener.changes == [(3, 3, 1, 1, False), (3, 3, 1, 1, True)]
+
+  smap.setFlag(3, 3, TileMap.BLOCKED, False)
+  assert smap.canPass(3, 3)
+  assert smap.hasFlag(3, 3, TileMap.CONTENTS | TileMap.OPAQUE)
+  smap.clearFlags(0, 0, 8, 6, TileMap.CONTENTS | TileMap.OPAQUE)
+  assert smap.flags.sum() == 0
+
+def test_tiles_are_built_on_demand():
+  (smap, built) = makeMap()
+  smap.fill("grass")
+  smap.fill("mud", 4, 4, 1, 1)
+  assert built == []
+  assert not smap.hasTile(4, 4)
+
+  tile = smap.getTile(4, 4)
+  assert tile.name == "mud" and (tile.x, tile.y) == (4, 4)
+  assert smap.getTile(4, 4) is tile
+  assert built == [(4, 4)]
+  assert list(smap.getTiles()) == [(4, 4)]
+
+  tile.contents.add(Rock())
+  smap.refresh(4, 4)
+  assert smap.hasFlag(4, 4, TileMap.BLOCKED | TileMap.CONTENTS | TileMap.OPAQUE)
+  assert not smap.canPass(4, 4)
+
+  # Released, the cell's flags go with its tile, and a new one is built if
+  # asked for.
+  smap.releaseTile(4, 4)
+  smap.refresh(4, 4)
+  assert not smap.hasTile(4, 4)
+  assert smap.flags[4, 4] == 0
+  assert smap.getTile(4, 4) is not tile
+  assert built == [(4, 4), (4, 4)]
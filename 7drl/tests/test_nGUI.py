@@ -0,0 +1,193 @@
+import pytest
+
+pytest.importorskip("sfml")
+
+from nEngine.Options import Options
+from nEngine.graphics import nGUI
+from nEngine.graphics.nGUI import NGUIBase, NGUIPane
+
+
+class FakeLayer:
+  def __init__(self, w, h):
+    self.texture = object()
+
+
+class FakeView:
+  """Records what gets drawn, and into which layers."""
+  def __init__(self):
+    self.rects = []
+    self.layers = 0
+
+  def beginLayer(self, layer, x, y, w, h):
+    self.layers = self.layers + 1
+
+  def endLayer(self):
+    pass
+
+  def drawQuad(self, texture, dest, source, colour = None):
+    pass
+
+  def drawRect(self, colour, x, y, w, h):
+    self.rects.append((x, y, w, h))
+
+  def drawOutline(self, colour, x, y, w, h, thickness = 1):
+    pass
+
+  def drawLine(self, colour, startPos, endPos, width = 1):
+    pass
+
+
+@pytest.fixture(autouse = True)
+def noDebug(monkeypatch):
+  monkeypatch.setattr(Options, "DEBUG", False)
+  monkeypatch.setattr(nGUI, "RenderTexture", FakeLayer)
+
+
+def drawFrame(root, view):
+  root.layout()
+  root.render(view)
+
+
+def test_child_added_after_render_is_drawn():
+  root = NGUIPane(0, 0, 800, 500)
+  root.retained = False
+  frame = NGUIPane(50, 50, 200, 100, "frame")
+  root.addChild(frame)
+  drawFrame(root, FakeView())
+  assert not frame._dirty
+
+  frame.addChild(NGUIPane(10, 10, 20, 20, "child"))
+  assert frame._dirty
+  view = FakeView()
+  drawFrame(root, view)
+  assert (60, 60, 20, 20) in view.rects
+
+
+def test_clean_frame_is_not_redrawn():
+  root = NGUIPane(0, 0, 800, 500)
+  root.retained = False
+  frame = NGUIPane(50, 50, 200, 100, "frame")
+  root.addChild(frame)
+  drawFrame(root, FakeView())
+  view = FakeView()
+  drawFrame(root, view)
+  assert view.layers == 0
+
+
+def test_moving_parent_moves_children():
+  root = NGUIPane(0, 0, 800, 500)
+  frame = NGUIPane(50, 50, 200, 100)
+  child = NGUIBase(10, 10, 20, 20)
+  frame.addChild(child)
+  root.addChild(frame)
+  root.layout()
+  frame.setPosition(100, 0)
+  root.layout()
+  assert (child._ax, child._ay) == (110, 10)
+
+
+def test_layout_only_places_what_changed(monkeypatch):
+  root = NGUIPane(0, 0, 800, 500)
+  left = NGUIPane(0, 0, 100, 100)
+  right = NGUIPane(0, 0, 100, 100)
+  right.setAnchor(1, 1)
+  corner = NGUIBase(0, 0, 10, 10)
+  right.addChild(corner)
+  root.addChild(left)
+  root.addChild(right)
+  root.layout()
+  assert (corner._ax, corner._ay) == (700, 400)
+
+  placed = []
+  place = NGUIBase._place
+  def recordPlace(element):
+    placed.append(element)
+    return place(element)
+  monkeypatch.setattr(NGUIBase, "_place", recordPlace)
+  root.layout()
+  assert placed == []
+
+  # Resizing the window moves what is anchored to it, and only that.
+  left.setPosition(5, 5)
+  root.setSize(1000, 600)
+  root.layout()
+  assert (corner._ax, corner._ay) == (900, 500)
+  assert (left._ax, left._ay) == (5, 5)
+  assert placed == [root, left, right, corner]
+  placed[:] = []
+  left.setPosition(6, 6)
+  root.layout()
+  assert placed == [left]
+
+
+def test_hit_grid_finds_topmost():
+  root = NGUIPane(0, 0, 800, 500)
+  bottom = NGUIBase(0, 0, 100, 100)
+  top = NGUIBase(50, 50, 100, 100)
+  root.addChild(bottom)
+  root.addChild(top)
+  grid = root.getHitGrid()
+  assert grid.topmost((75, 75)) is top
+  assert grid.topmost((25, 25)) is bottom
+  assert grid.topmost((900, 900)) is None
+
+
+def test_hit_grid_follows_changes_without_rebuilding():
+  root = NGUIPane(0, 0, 800, 500)
+  frame = NGUIPane(0, 0, 300, 300)
+  root.addChild(frame)
+  grid = root.getHitGrid()
+
+  # Added to a pane drawn below a later sibling: still below it.
+  cover = NGUIBase(0, 0, 300, 300)
+  root.addChild(cover)
+  button = NGUIBase(10, 10, 20, 20)
+  frame.addChild(button)
+  assert root.getHitGrid() is grid
+  assert grid.topmost((15, 15)) is cover
+  root.removeChild(cover)
+  assert grid.topmost((15, 15)) is button
+
+  frame.setPosition(400, 100)
+  assert root.getHitGrid() is grid
+  assert grid.topmost((415, 115)) is button
+  assert grid.topmost((15, 15)) is root
+  assert grid.hits((415, 115)) == [button, frame, root]
+
+  frame.clear()
+  assert grid.topmost((415, 115)) is frame
+  assert button not in grid._rank
+
+
+def test_human_view_calls_element_handlers():
+  from nEngine.graphics.HumanView import HumanView
+
+  class Button(NGUIBase):
+    def __init__(self, x, y, w, h):
+      NGUIBase.__init__(self, x, y, w, h)
+      self.events = []
+    def _onMouseMoveEvent(self, event):
+      self.events.append("move")
+      return NGUIBase._onMouseMoveEvent(self, event)
+    def _onMouseButtonEvent(self, event):
+      self.events.append("button")
+      return True
+
+  class Event:
+    def __init__(self, oldPosition, position):
+      self.oldPosition = oldPosition
+      self.position = position
+
+  class View:
+    pass
+
+  view = View()
+  view._pane = NGUIPane(0, 0, 800, 500)
+  view.mouseFocus = None
+  button = Button(10, 10, 20, 20)
+  view._pane.addChild(button)
+  HumanView.onMouseMoveEvent(view, Event((0, 0), (15, 15)))
+  assert view.mouseFocus is button
+  view._getFocused = lambda: HumanView._getFocused(view)
+  HumanView.onMouseButtonEvent(view, Event((15, 15), (15, 15)))
+  assert button.events == ["move", "button"]